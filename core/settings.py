@@ -86,6 +86,12 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Scan subtasks may write at the same time: take the write lock when a
+        # transaction starts and wait for it instead of failing with "database is locked"
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
@@ -139,6 +145,32 @@ LOGIN_REDIRECT_URL = '/'
 
 CELERY_BROKER_URL = 'redis://localhost:6379/0'
 CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
+# Warming the next track has its own queue and worker (see rundev), so it
+# never waits behind a library scan
+CELERY_TASK_ROUTES = {'player.tasks.prefetch_song': {'queue': 'playback'}}
+# Redis used to push task progress to the browser (pub/sub, nothing is stored)
+PROGRESS_REDIS_URL = env('PROGRESS_REDIS_URL', default=CELERY_BROKER_URL)
+
+# Seconds without a checkpoint after which a scan still marked as running is
+# taken for dead (e.g. its worker was restarted): it can then be resumed, and
+# a new request for the same kind of scan no longer waits for it
+SCAN_STALE_SECONDS = env.int('SCAN_STALE_SECONDS', default=60 * 60)
+
+# Local disk cache for streamed audio (set the budget to 0 to disable it)
+AUDIO_CACHE_DIR = env('AUDIO_CACHE_DIR', default=str(BASE_DIR / 'cache' / 'audio'))
+AUDIO_CACHE_MAX_BYTES = env.int('AUDIO_CACHE_MAX_BYTES', default=2 * 1024 * 1024 * 1024)
+
+# Stream songs from Drive with the async view. Enable it only when served by an
+# ASGI server (core.asgi); under WSGI, such as runserver, keep the threaded view
+ASYNC_AUDIO_STREAMING = env.bool('ASYNC_AUDIO_STREAMING', default=False)
+
+# Resized album covers fetched once from Drive and served from local disk
+COVER_CACHE_DIR = env('COVER_CACHE_DIR', default=str(BASE_DIR / 'cache' / 'covers'))
+
+# Concurrent Drive API requests made by the library scanner, and the request
+# rate they share; every call inside a batch request counts against the rate
+DRIVE_MAX_CONCURRENCY = env.int('DRIVE_MAX_CONCURRENCY', default=8)
+DRIVE_REQUESTS_PER_SECOND = env.float('DRIVE_REQUESTS_PER_SECOND', default=10.0)
 
 USE_CLOUDFLARE = env.bool('USE_CLOUDFLARE', default=False)
 
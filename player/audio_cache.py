@@ -0,0 +1,246 @@
+import os
+import re
+import time
+import tempfile
+from django.conf import settings
+
+# Google Drive file IDs only contain URL-safe characters
+SAFE_FILE_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]+$')
+# Prefix for files that are still being downloaded
+PARTIAL_PREFIX = '.partial-'
+# Partial downloads older than this were abandoned by a dead worker
+STALE_PARTIAL_SECONDS = 60 * 60
+
+
+def is_cache_enabled():
+    """Return True if the audio cache has a positive size budget."""
+    return settings.AUDIO_CACHE_MAX_BYTES > 0
+
+
+def get_cache_path(file_id):
+    """
+    Build the on-disk path for a cached Google Drive file
+
+    Args:
+        file_id (str): Google Drive file ID (Song.google_file_id)
+
+    Returns:
+        str: Absolute path inside the cache directory, or None for unsafe IDs
+    """
+    if not SAFE_FILE_ID_PATTERN.match(file_id):
+        return None
+    return os.path.join(settings.AUDIO_CACHE_DIR, file_id)
+
+
+def is_cached(file_id):
+    """Return True if a complete copy of the file is in the cache."""
+    if not is_cache_enabled():
+        return False
+    path = get_cache_path(file_id)
+    return path is not None and os.path.exists(path)
+
+
+def open_cached_file(file_id):
+    """
+    Open a cached audio file and mark it as recently used
+
+    The file is returned already opened so that a concurrent eviction
+    cannot remove it between the lookup and the response being served.
+
+    Args:
+        file_id (str): Google Drive file ID
+
+    Returns:
+        file: Binary file object, or None on a cache miss
+    """
+    if not is_cache_enabled():
+        return None
+
+    path = get_cache_path(file_id)
+    if path is None:
+        return None
+
+    try:
+        file_handle = open(path, 'rb')
+    except FileNotFoundError:
+        return None
+
+    # Modification time doubles as the LRU timestamp
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return file_handle
+
+
+class CacheWriter:
+    """
+    Writes a file into the cache while its chunks are streamed elsewhere
+    The file is only added to the cache once every byte has been received,
+    so interrupted or failed downloads never produce truncated entries.
+    Caching is best effort: write errors stop caching, never the stream.
+    """
+
+    def __init__(self, file_id, expected_size):
+        """
+        Args:
+            file_id (str): Google Drive file ID
+            expected_size (int): Total file size reported by Google Drive
+        """
+        self.file_id = file_id
+        self.expected_size = expected_size
+        self.bytes_written = 0
+        self.temp_file = None
+        self.path = get_cache_path(file_id)
+        if not is_cache_enabled() or self.path is None or expected_size > settings.AUDIO_CACHE_MAX_BYTES:
+            return
+
+        try:
+            os.makedirs(settings.AUDIO_CACHE_DIR, exist_ok=True)
+            self.temp_file = tempfile.NamedTemporaryFile(
+                dir=settings.AUDIO_CACHE_DIR, prefix=PARTIAL_PREFIX, delete=False
+            )
+        except OSError as e:
+            print(f"Error creando archivo de caché para {file_id}: {e}")
+
+    def write(self, chunk):
+        """Append the next chunk of the file."""
+        if self.temp_file is None:
+            return
+        try:
+            self.temp_file.write(chunk)
+            self.bytes_written += len(chunk)
+        except OSError as e:
+            print(f"Error escribiendo caché para {self.file_id}: {e}")
+            self.temp_file.close()
+            _remove_quietly(self.temp_file.name)
+            self.temp_file = None
+
+    def finish(self, completed):
+        """
+        Add the file to the cache, or drop it if the download did not complete
+
+        Args:
+            completed (bool): True if the stream ended without errors
+        """
+        if self.temp_file is None:
+            return
+        self.temp_file.close()
+        if completed and self.bytes_written == self.expected_size:
+            os.replace(self.temp_file.name, self.path)
+            evict_least_recently_used()
+        else:
+            _remove_quietly(self.temp_file.name)
+        self.temp_file = None
+
+
+def stream_into_cache(file_id, chunks, expected_size):
+    """
+    Pass chunks through while writing them to the cache
+
+    Args:
+        file_id (str): Google Drive file ID
+        chunks (iterable): Chunks of the complete file, in order
+        expected_size (int): Total file size reported by Google Drive
+
+    Yields:
+        bytes: The same chunks received from upstream
+    """
+    writer = CacheWriter(file_id, expected_size)
+    completed = False
+    try:
+        for chunk in chunks:
+            writer.write(chunk)
+            yield chunk
+        completed = True
+    finally:
+        writer.finish(completed)
+
+
+async def astream_into_cache(file_id, chunks, expected_size):
+    """
+    Async counterpart of stream_into_cache for async chunk generators
+
+    Args:
+        file_id (str): Google Drive file ID
+        chunks: Async iterable of the chunks of the complete file, in order
+        expected_size (int): Total file size reported by Google Drive
+
+    Yields:
+        bytes: The same chunks received from upstream
+    """
+    writer = CacheWriter(file_id, expected_size)
+    completed = False
+    try:
+        async for chunk in chunks:
+            writer.write(chunk)
+            yield chunk
+        completed = True
+    finally:
+        writer.finish(completed)
+
+
+def discard(file_id):
+    """Remove the cached copy of a file, e.g. after its content changed on Drive."""
+    path = get_cache_path(file_id)
+    if path is not None:
+        _remove_quietly(path)
+
+
+def evict_least_recently_used(max_bytes=None):
+    """
+    Delete the least recently used files until the cache fits its budget
+    Also cleans up partial downloads abandoned by crashed workers.
+
+    Args:
+        max_bytes (int): Size budget, defaults to settings.AUDIO_CACHE_MAX_BYTES
+
+    Returns:
+        int: Number of cached files removed
+    """
+    if max_bytes is None:
+        max_bytes = settings.AUDIO_CACHE_MAX_BYTES
+
+    entries = []
+    total_size = 0
+    now = time.time()
+
+    try:
+        with os.scandir(settings.AUDIO_CACHE_DIR) as directory:
+            for entry in directory:
+                try:
+                    if not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+
+                if entry.name.startswith(PARTIAL_PREFIX):
+                    if now - stat.st_mtime > STALE_PARTIAL_SECONDS:
+                        _remove_quietly(entry.path)
+                    continue
+
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total_size += stat.st_size
+    except FileNotFoundError:
+        return 0
+
+    # Oldest access first
+    entries.sort()
+    removed_count = 0
+    for _, size, path in entries:
+        if total_size <= max_bytes:
+            break
+        _remove_quietly(path)
+        total_size -= size
+        removed_count += 1
+
+    return removed_count
+
+
+def _remove_quietly(path):
+    """Remove a file, ignoring the case where it is already gone."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,180 @@
+import os
+import re
+import hashlib
+import tempfile
+from django.conf import settings
+from .streaming import UPSTREAM_TIMEOUT
+
+# Square sizes (px) stored for every album cover, and the one used by default
+COVER_SIZES = (64, 256, 512)
+DEFAULT_COVER_SIZE = 256
+
+# Google Drive file IDs only contain URL-safe characters
+SAFE_FILE_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]+$')
+# Size suffix of Drive thumbnail links, e.g. "...=s220"
+THUMBNAIL_SIZE_PATTERN = re.compile(r'=s\d+$')
+# Stored variant file name: "<size>-<etag>.<extension>"
+VARIANT_NAME_PATTERN = re.compile(r'^(\d+)-([0-9a-f]+)\.(jpg|png|webp|gif)$')
+
+# File extensions detected from the first bytes of an image
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF8', 'gif'),
+)
+CONTENT_TYPES = {'jpg': 'image/jpeg', 'png': 'image/png', 'gif': 'image/gif', 'webp': 'image/webp'}
+
+
+def normalize_size(size_text):
+    """
+    Map a requested size to the closest stored variant at least as large
+
+    Args:
+        size_text (str): Value of the ?size= parameter, or None
+
+    Returns:
+        int: One of COVER_SIZES
+    """
+    try:
+        requested = int(size_text)
+    except (TypeError, ValueError):
+        return DEFAULT_COVER_SIZE
+    return next((size for size in COVER_SIZES if size >= requested), COVER_SIZES[-1])
+
+
+def get_cover_dir(cover_image_id):
+    """Directory holding the variants of one cover, or None for unsafe IDs."""
+    if not SAFE_FILE_ID_PATTERN.match(cover_image_id):
+        return None
+    return os.path.join(settings.COVER_CACHE_DIR, cover_image_id)
+
+
+def get_cover(cover_image_id, size):
+    """
+    Look up a stored cover variant
+
+    Args:
+        cover_image_id (str): Google Drive file ID of the cover image
+        size (int): One of COVER_SIZES
+
+    Returns:
+        tuple: (path, etag, content_type), or None if the variant is not stored
+    """
+    cover_dir = get_cover_dir(cover_image_id)
+    if cover_dir is None:
+        return None
+
+    try:
+        with os.scandir(cover_dir) as directory:
+            for entry in directory:
+                match = VARIANT_NAME_PATTERN.match(entry.name)
+                if match and int(match.group(1)) == size:
+                    return entry.path, match.group(2), CONTENT_TYPES[match.group(3)]
+    except FileNotFoundError:
+        pass
+    return None
+
+
+def open_cover(cover_image_id, size):
+    """
+    Open a stored cover variant for reading
+    A concurrent fetch can replace the variant between the lookup and the
+    open, so a variant that vanished is looked up once more.
+
+    Args:
+        cover_image_id (str): Google Drive file ID of the cover image
+        size (int): One of COVER_SIZES
+
+    Returns:
+        tuple: (open binary file, etag, content_type), or None if the variant is not stored
+    """
+    for _ in range(2):
+        cover = get_cover(cover_image_id, size)
+        if cover is None:
+            return None
+        path, etag, content_type = cover
+        try:
+            return open(path, 'rb'), etag, content_type
+        except FileNotFoundError:
+            continue
+    return None
+
+
+def fetch_cover(drive_client, cover_image_id):
+    """
+    Download every size variant of a cover from Drive and store it on disk
+    Drive's thumbnail service does the resizing. Images without a thumbnail
+    are not stored, since the original can weigh megabytes; they are tried
+    again on a later request, once Drive may have generated one.
+
+    Args:
+        drive_client (DriveClient): Pooled client of the album owner
+        cover_image_id (str): Google Drive file ID of the cover image
+
+    Returns:
+        bool: True if the variants were stored, False if Drive has no thumbnail
+
+    Raises:
+        Exception: If Drive cannot provide the image
+    """
+    cover_dir = get_cover_dir(cover_image_id)
+    if cover_dir is None:
+        return False
+
+    metadata = drive_client.service.files().get(fileId=cover_image_id, fields='thumbnailLink').execute()
+    thumbnail_link = metadata.get('thumbnailLink')
+    if not thumbnail_link:
+        return False
+
+    os.makedirs(cover_dir, exist_ok=True)
+    for size in COVER_SIZES:
+        sized_link = THUMBNAIL_SIZE_PATTERN.sub('', thumbnail_link) + f'=s{size}'
+        response = drive_client.session.get(sized_link, timeout=UPSTREAM_TIMEOUT)
+        response.raise_for_status()
+        store_variant(cover_dir, size, response.content)
+    return True
+
+
+def store_variant(cover_dir, size, data):
+    """
+    Write one variant atomically, named after a hash of its content
+
+    Args:
+        cover_dir (str): Directory of the cover
+        size (int): One of COVER_SIZES
+        data (bytes): Image content
+
+    Returns:
+        str: ETag of the stored variant
+    """
+    etag = hashlib.sha256(data).hexdigest()[:32]
+    extension = detect_image_type(data)
+
+    # Drop an older variant of the same size before adding the new one
+    for entry in os.scandir(cover_dir):
+        match = VARIANT_NAME_PATTERN.match(entry.name)
+        if match and int(match.group(1)) == size and match.group(2) != etag:
+            _remove_quietly(entry.path)
+
+    with tempfile.NamedTemporaryFile(dir=cover_dir, prefix='.partial-', delete=False) as temp_file:
+        temp_file.write(data)
+    os.replace(temp_file.name, os.path.join(cover_dir, f'{size}-{etag}.{extension}'))
+    return etag
+
+
+def detect_image_type(data):
+    """Return the file extension matching the image's signature, JPEG by default."""
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'webp'
+    for signature, extension in IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return extension
+    return 'jpg'
+
+
+def _remove_quietly(path):
+    """Remove a file, ignoring the case where it is already gone."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,432 @@
+import json
+import time
+import httplib2
+import requests
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from cachetools import LRUCache
+from django.conf import settings
+from google.auth.transport.requests import AuthorizedSession, Request
+from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from googleapiclient.http import build_http
+from .models import GoogleCredential
+from .streaming import UPSTREAM_TIMEOUT, UPSTREAM_READ_SIZE, get_response_file_size
+
+# Maximum number of users whose built Drive client is kept alive in this process
+DRIVE_CLIENT_POOL_SIZE = 256
+# Idle keep-alive HTTP connections kept per client for API calls
+DRIVE_IDLE_CONNECTIONS = 8
+
+# 403 reasons Drive uses when a request should be retried more slowly
+RATE_LIMIT_REASONS = ('userRateLimitExceeded', 'rateLimitExceeded')
+# Retries for rate-limited or failed requests, and the cap on a single wait
+DRIVE_MAX_RETRIES = 5
+DRIVE_MAX_BACKOFF_SECONDS = 32
+# Network failures worth another attempt: dropped connections, timeouts, DNS
+# hiccups, as raised by httplib2 (API calls) and requests (media downloads)
+DRIVE_NETWORK_ERRORS = (
+    ConnectionError, TimeoutError, httplib2.ServerNotFoundError,
+    requests.ConnectionError, requests.Timeout,
+)
+# Maximum number of calls Drive accepts in one batch request
+DRIVE_BATCH_SIZE = 100
+
+# Built clients keyed by user id, shared by every thread of the process.
+# Each client is thread-safe, so request threads that come and go (runserver,
+# threaded gunicorn) still reuse the same client and its open connections.
+_client_pool = LRUCache(maxsize=DRIVE_CLIENT_POOL_SIZE)
+_client_pool_lock = threading.Lock()
+
+
+class SharedHttp:
+    """
+    Thread-safe stand-in for httplib2.Http
+    httplib2 connections cannot be used by two threads at once, so each call
+    borrows an idle Http (building one if none is free) and hands it back
+    afterwards. Keep-alive connections thus outlive the thread that opened them.
+    """
+
+    def __init__(self, max_idle=DRIVE_IDLE_CONNECTIONS):
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+        # Settings such as timeout and redirect_codes are read from this one
+        self._template = build_http()
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self._template, name)
+
+    def request(self, *args, **kwargs):
+        with self._lock:
+            http = self._idle.pop() if self._idle else None
+        if http is None:
+            http = build_http()
+        try:
+            return http.request(*args, **kwargs)
+        finally:
+            with self._lock:
+                if len(self._idle) < self.max_idle:
+                    self._idle.append(http)
+                    http = None
+            if http is not None:
+                http.close()
+
+    def close(self):
+        """Close the idle connections; borrowed ones are closed when they come back."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self.max_idle = 0
+        for http in idle:
+            http.close()
+
+
+class DriveClient:
+    """
+    Google Drive API client built once and reused across requests
+    Keeps the discovery-built service and an HTTP session alive so repeated
+    calls reuse the same keep-alive connections and refreshed access token.
+    Safe to share between threads: API calls borrow connections from a
+    SharedHttp, and media downloads go through the session's urllib3 pool.
+    """
+
+    def __init__(self, user_id, token_json):
+        self.user_id = user_id
+        # Token JSON this client was built from, or last wrote to the database
+        self.token_json = token_json
+        self.credentials = Credentials.from_authorized_user_info(json.loads(token_json))
+        self.http = SharedHttp()
+        self.service = build(
+            'drive', 'v3', http=AuthorizedHttp(self.credentials, http=self.http), cache_discovery=False
+        )
+        # AuthorizedSession sharing these credentials, for raw media downloads
+        self.session = AuthorizedSession(self.credentials)
+        self._saved_token = self.credentials.token
+        self._refresh_lock = threading.Lock()
+
+    def close(self):
+        """Close the client's idle connections."""
+        self.http.close()
+        self.session.close()
+
+    def refresh_if_needed(self):
+        """
+        Refresh the access token if it is expired or about to expire
+        Stores any refreshed token back in GoogleCredential, including tokens
+        refreshed transparently by the HTTP layer during earlier requests.
+        """
+        # Threads sharing the client refresh and save the token only once
+        with self._refresh_lock:
+            if not self.credentials.valid and self.credentials.refresh_token:
+                self.credentials.refresh(Request())
+
+            if self.credentials.token != self._saved_token:
+                token_json = self.credentials.to_json()
+                GoogleCredential.objects.filter(user_id=self.user_id).update(token_json=token_json)
+                self.token_json = token_json
+                self._saved_token = self.credentials.token
+
+
+def get_drive_client(user):
+    """
+    Get a ready-to-use Drive client for a user from the process-wide pool
+
+    Args:
+        user: Django User instance owning the Google credentials
+
+    Returns:
+        DriveClient: Client with a valid access token
+
+    Raises:
+        GoogleCredential.DoesNotExist: If the user has not linked Google Drive
+    """
+    creds_model = GoogleCredential.objects.get(user=user)
+
+    with _client_pool_lock:
+        client = _client_pool.get(user.id)
+
+    # Rebuild when the stored token changed elsewhere (re-link or another worker)
+    if client is None or client.token_json != creds_model.token_json:
+        client = DriveClient(user.id, creds_model.token_json)
+        with _client_pool_lock:
+            _client_pool[user.id] = client
+
+    client.refresh_if_needed()
+    return client
+
+
+def get_drive_service(user):
+    """
+    Shortcut returning the pooled googleapiclient Drive v3 service for a user
+
+    Raises:
+        GoogleCredential.DoesNotExist: If the user has not linked Google Drive
+    """
+    return get_drive_client(user).service
+
+
+def discard_drive_clients(user):
+    """
+    Drop the pooled client belonging to a user
+    Used when the user unlinks Google Drive so old tokens are not reused.
+    """
+    with _client_pool_lock:
+        client = _client_pool.pop(user.id, None)
+    if client is not None:
+        client.close()
+
+
+def is_rate_limit_error(error):
+    """Return True if a Drive HttpError asks the caller to slow down."""
+    if error.resp.status == 429:
+        return True
+    if error.resp.status == 403:
+        details = error.error_details if isinstance(error.error_details, list) else []
+        return any(detail.get('reason') in RATE_LIMIT_REASONS for detail in details if isinstance(detail, dict))
+    return False
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by every worker of a DriveFetcher
+    Tokens refill at a fixed rate up to a small burst, and a rate-limit
+    response pauses all workers at once instead of only the one that hit it.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, cost=1):
+        """
+        Block until a request may be sent
+        A cost above the available tokens leaves the bucket in debt, so
+        batch requests delay the calls that follow instead of never fitting.
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now >= self.updated_at:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                    self.updated_at = now
+                    if self.tokens >= 1:
+                        self.tokens -= cost
+                        return
+                    wait = (1 - self.tokens) / self.rate
+                else:
+                    # Paused after a rate-limit response
+                    wait = self.updated_at - now
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Empty the bucket and stop handing out tokens for the given time."""
+        with self.lock:
+            self.tokens = 0
+            self.updated_at = max(self.updated_at, time.monotonic() + seconds)
+
+
+class DriveFetcher:
+    """
+    Runs Drive API requests concurrently from a bounded thread pool
+    Requests are built from a shared service but executed over one HTTP
+    connection per worker thread, since httplib2 is not thread-safe.
+    Only Drive I/O runs in the workers; database writes stay with the caller.
+    """
+
+    def __init__(self, credentials, max_workers=None, requests_per_second=None):
+        self.credentials = credentials
+        self.max_workers = max_workers or settings.DRIVE_MAX_CONCURRENCY
+        self.rate_limiter = TokenBucket(requests_per_second or settings.DRIVE_REQUESTS_PER_SECOND)
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='drive-fetch')
+        self._local = threading.local()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Stop the worker threads, dropping requests that never started."""
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    def _get_http(self):
+        """Authorized HTTP connection owned by the calling thread."""
+        http = getattr(self._local, 'http', None)
+        if http is None:
+            http = AuthorizedHttp(self.credentials, http=build_http())
+            self._local.http = http
+        return http
+
+    def _get_session(self):
+        """AuthorizedSession owned by the calling thread, for raw media downloads."""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = AuthorizedSession(self.credentials)
+            self._local.session = session
+        return session
+
+    def execute(self, request, cost=1):
+        """
+        Execute a googleapiclient request within the rate limit
+        Retries 429, 403 rate-limit and 5xx responses, as well as network
+        errors, with exponential backoff plus jitter; rate-limit responses
+        also pause the other workers.
+
+        Args:
+            request: HttpRequest built from a Drive service, e.g. service.files().list(...)
+            cost (int): Number of Drive calls the request counts as (batch size)
+
+        Returns:
+            dict: Decoded response body
+
+        Raises:
+            HttpError: If the request fails for another reason or keeps failing
+            ConnectionError: If the network keeps failing (or another of DRIVE_NETWORK_ERRORS)
+        """
+        for attempt in range(DRIVE_MAX_RETRIES + 1):
+            self.rate_limiter.acquire(cost)
+            try:
+                return request.execute(http=self._get_http())
+            except HttpError as e:
+                rate_limited = is_rate_limit_error(e)
+                if attempt == DRIVE_MAX_RETRIES or not (rate_limited or e.resp.status >= 500):
+                    raise
+                self._back_off(attempt, rate_limited)
+            except DRIVE_NETWORK_ERRORS:
+                if attempt == DRIVE_MAX_RETRIES:
+                    raise
+                self._back_off(attempt, False)
+
+    def download_range(self, request, start, end):
+        """
+        Download part of a file within the rate limit, retrying like execute()
+        Only the requested bytes are read from the socket, even if Drive
+        ignores the range and starts sending the whole file.
+
+        Args:
+            request: Media request from files().get_media(fileId=...)
+            start (int): First byte to fetch (inclusive)
+            end (int): Last byte to fetch (inclusive)
+
+        Returns:
+            tuple: (bytes received, total file size or None if Drive did not say)
+
+        Raises:
+            requests.HTTPError: If the download fails for another reason or keeps failing
+            requests.ConnectionError: If the network keeps failing (or another of DRIVE_NETWORK_ERRORS)
+        """
+        length = end - start + 1
+        for attempt in range(DRIVE_MAX_RETRIES + 1):
+            self.rate_limiter.acquire()
+            try:
+                response = self._get_session().get(
+                    request.uri, headers={'Range': f'bytes={start}-{end}'}, stream=True, timeout=UPSTREAM_TIMEOUT
+                )
+                try:
+                    rate_limited = response.status_code == 429 or (
+                        response.status_code == 403 and any(reason in response.text for reason in RATE_LIMIT_REASONS)
+                    )
+                    if attempt < DRIVE_MAX_RETRIES and (rate_limited or response.status_code >= 500):
+                        self._back_off(attempt, rate_limited)
+                        continue
+                    response.raise_for_status()
+                    if response.status_code != 206 and start > 0:
+                        raise requests.HTTPError(f"Drive ignoró el rango solicitado ({response.status_code})", response=response)
+
+                    data = bytearray()
+                    for chunk in response.iter_content(chunk_size=UPSTREAM_READ_SIZE):
+                        data += chunk
+                        if len(data) >= length:
+                            break
+                    return bytes(data[:length]), get_response_file_size(response)
+                finally:
+                    response.close()
+            except DRIVE_NETWORK_ERRORS:
+                if attempt == DRIVE_MAX_RETRIES:
+                    raise
+                self._back_off(attempt, False)
+
+    def _back_off(self, attempt, rate_limited):
+        """Wait before a retry; rate limits pause every worker, not just this one."""
+        delay = min(2 ** attempt + random.random(), DRIVE_MAX_BACKOFF_SECONDS)
+        if rate_limited:
+            self.rate_limiter.pause(delay)
+        else:
+            time.sleep(delay)
+
+    def execute_batch(self, service, batch_requests):
+        """
+        Execute many small requests through Drive batch HTTP calls
+        Up to DRIVE_BATCH_SIZE requests share one round trip. Sub-requests
+        that are rate limited or fail on the server are retried in a later batch.
+
+        Args:
+            service: Drive service the requests were built from
+            batch_requests (dict): Caller key -> HttpRequest
+
+        Returns:
+            dict: Caller key -> decoded response body, or the exception it failed with
+
+        Raises:
+            HttpError: If a whole batch call fails
+        """
+        results = {}
+        pending = dict(batch_requests)
+        for attempt in range(DRIVE_MAX_RETRIES + 1):
+            failed = {}
+            keys = list(pending)
+            for index in range(0, len(keys), DRIVE_BATCH_SIZE):
+                chunk = keys[index:index + DRIVE_BATCH_SIZE]
+
+                def store_result(request_id, response, exception, chunk=chunk):
+                    key = chunk[int(request_id)]
+                    if exception is None:
+                        results[key] = response
+                    else:
+                        failed[key] = exception
+
+                batch = service.new_batch_http_request(callback=store_result)
+                for position, key in enumerate(chunk):
+                    batch.add(pending[key], request_id=str(position))
+                self.execute(batch, cost=len(chunk))
+
+            retryable = {
+                key: error for key, error in failed.items()
+                if isinstance(error, HttpError) and (is_rate_limit_error(error) or error.resp.status >= 500)
+            }
+            results.update({key: error for key, error in failed.items() if key not in retryable})
+            if not retryable or attempt == DRIVE_MAX_RETRIES:
+                results.update(retryable)
+                break
+
+            self._back_off(attempt, any(is_rate_limit_error(error) for error in retryable.values()))
+            pending = {key: batch_requests[key] for key in retryable}
+        return results
+
+    def map(self, function, items):
+        """
+        Run function(item) for every item on the worker threads
+
+        Args:
+            function (callable): Called with a single item, may call self.execute
+            items (iterable): Inputs to process
+
+        Yields:
+            tuple: (item, result, error) in completion order; error is None on
+            success and result is None on failure
+        """
+        futures = {self.executor.submit(function, item): item for item in items}
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result(), None
+            except Exception as e:
+                yield futures[future], None, e
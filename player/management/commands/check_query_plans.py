@@ -0,0 +1,80 @@
+import re
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from player.models import Song, Album, LikedSong, PlaylistSong
+
+# Plan fragments meaning a whole table is read, per database vendor
+FULL_SCAN_MARKERS = {
+    'sqlite': ('SCAN ',),
+    'postgresql': ('Seq Scan',),
+}
+# Plan fragments meaning the rows are sorted after being read
+SORT_MARKERS = ('TEMP B-TREE', 'Sort ')
+
+
+def get_hot_queries():
+    """
+    The lookups run on every page render, play or scan, with placeholder values
+
+    Returns:
+        list: (description, queryset, columns the index must be searched on,
+        whether the index must also give the ordering)
+    """
+    return [
+        ('play_song / toggle_like_song: song by Drive file ID',
+         Song.objects.filter(user_id=1, google_file_id='file-id'), ('user_id', 'google_file_id'), False),
+        ('folder_browser: album tracks in order',
+         Song.objects.filter(album_id=1, user_id=1).order_by('track_number', 'name'), ('album_id', 'user_id'), True),
+        ('scanner: album by name and artist',
+         Album.objects.filter(user_id=1, name='Album', artist_id=1), ('user_id', 'name', 'artist_id'), False),
+        ('liked_songs: most recent likes first',
+         LikedSong.objects.filter(user_id=1).order_by('-created_at'), ('user_id',), True),
+        ('playlist_detail: playlist entries in order',
+         PlaylistSong.objects.filter(playlist_id=1).order_by('order', 'date_added'), ('playlist_id',), True),
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Runs EXPLAIN on the hot library queries and fails if any of them reads a whole table.'
+
+    def handle(self, *args, **options):
+        full_scan_markers = FULL_SCAN_MARKERS.get(connection.vendor)
+        if full_scan_markers is None:
+            raise CommandError(f'Query plan checks are not supported on {connection.vendor}.')
+
+        failures = []
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                # Small tables are cheaper to scan; ask whether the index is usable at all
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+
+            for description, queryset, index_columns, needs_ordered_index in get_hot_queries():
+                plan = queryset.explain()
+                problems = []
+                if any(marker in line and 'INDEX' not in line.upper()
+                       for line in plan.splitlines() for marker in full_scan_markers):
+                    problems.append('full table scan')
+                else:
+                    # An index on user_id alone still reads every song of the user
+                    index_search = ' '.join(
+                        line for line in plan.splitlines() if 'USING' in line.upper() or 'Index Cond' in line
+                    )
+                    missing_columns = [
+                        column for column in index_columns
+                        if not re.search(rf'\b{column}\)?(?:::\w+)?\s*=', index_search)
+                    ]
+                    if missing_columns:
+                        problems.append(f"index not searched on {', '.join(missing_columns)}")
+                if needs_ordered_index and any(marker in plan for marker in SORT_MARKERS):
+                    problems.append('sorted after reading')
+
+                style = self.style.ERROR if problems else self.style.SUCCESS
+                self.stdout.write(style(f"{'FAIL' if problems else 'OK'}: {description}"))
+                self.stdout.write(f'    {plan}'.replace('\n', '\n    '))
+                if problems:
+                    failures.append(f"{description} ({', '.join(problems)})")
+
+        if failures:
+            raise CommandError('Queries without a suitable index: ' + '; '.join(failures))
+        self.stdout.write(self.style.SUCCESS('All hot queries use an index.'))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from player.models import Playlist
+from player.playlists import get_playlist_totals_subqueries, refresh_playlist_totals
+
+class Command(BaseCommand):
+    help = 'Recomputes the stored song count and duration of playlists that are out of sync with their songs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', type=str, help='Only repair the playlists of this user.')
+
+    def handle(self, *args, **options):
+        playlists = Playlist.objects.all()
+        username = options.get('username')
+        if username:
+            try:
+                playlists = playlists.filter(user=User.objects.get(username=username))
+            except User.DoesNotExist:
+                self.stdout.write(self.style.ERROR(f'User "{username}" not found.'))
+                return
+
+        totals = get_playlist_totals_subqueries()
+        stale_ids = [
+            playlist['id']
+            for playlist in playlists.annotate(
+                actual_song_count=totals['song_count'], actual_total_duration=totals['total_duration']
+            ).values('id', 'song_count', 'total_duration', 'actual_song_count', 'actual_total_duration')
+            if (playlist['song_count'], playlist['total_duration'])
+            != (playlist['actual_song_count'], playlist['actual_total_duration'])
+        ]
+
+        repaired_count = refresh_playlist_totals(stale_ids)
+        self.stdout.write(self.style.SUCCESS(f'Repaired {repaired_count} of {playlists.count()} playlists.'))
@@ -17,13 +17,23 @@ class Command(BaseCommand):
             default='8000',
             help='Puerto para el servidor Django (default: 8000)'
         )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Tareas de Celery ejecutadas a la vez, p. ej. carpetas de un escaneo (default: 1)'
+        )
 
     def handle(self, *args, **options):
         port = options['port']
+        workers = max(1, options['workers'])
+        # Con un solo worker se usa el pool solo; con más, hilos (funciona también en Windows)
+        pool_args = ['-P', 'solo'] if workers == 1 else ['-P', 'threads', '-c', str(workers)]
         
         # Variables para controlar los procesos
         self.django_process = None
         self.celery_process = None
+        self.playback_process = None
         
         # Función para ejecutar el servidor Django
         def run_django():
@@ -44,12 +54,26 @@ class Command(BaseCommand):
                 self.celery_process = subprocess.Popen([
                     sys.executable, '-m', 'celery', 
                     '-A', 'core', 'worker', 
-                    '-l', 'info', '-P', 'solo'
+                    '-l', 'info', *pool_args
                 ])
                 self.celery_process.wait()
             except Exception as e:
                 self.stdout.write(self.style.ERROR(f'Error al iniciar Celery: {e}'))
         
+        # Función para ejecutar el worker de reproducción, que precarga la siguiente
+        # canción sin esperar a que termine un escaneo
+        def run_playback_worker():
+            try:
+                self.playback_process = subprocess.Popen([
+                    sys.executable, '-m', 'celery',
+                    '-A', 'core', 'worker',
+                    '-l', 'info', '-Q', 'playback', '-n', 'playback@%h',
+                    '-P', 'threads', '-c', '2'
+                ])
+                self.playback_process.wait()
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f'Error al iniciar el worker de reproducción: {e}'))
+        
         # Función para manejar la señal de interrupción
         def signal_handler(sig, frame):
             self.stdout.write(self.style.WARNING('\n⚠️  Deteniendo servicios...'))
@@ -59,6 +83,8 @@ class Command(BaseCommand):
                 self.django_process.terminate()
             if self.celery_process:
                 self.celery_process.terminate()
+            if self.playback_process:
+                self.playback_process.terminate()
             
             sys.exit(0)
         
@@ -68,17 +94,20 @@ class Command(BaseCommand):
         # Crear threads para ambos procesos
         django_thread = threading.Thread(target=run_django, daemon=True)
         celery_thread = threading.Thread(target=run_celery, daemon=True)
+        playback_thread = threading.Thread(target=run_playback_worker, daemon=True)
         
         try:
             # Iniciar ambos threads
             django_thread.start()
             celery_thread.start()
+            playback_thread.start()
             
             self.stdout.write(
                 self.style.SUCCESS(
                     f'✅ Servicios iniciados:\n'
                     f'   - Django: http://127.0.0.1:{port}\n'
                     f'   - Celery worker ejecutándose\n'
+                    f'   - Worker de reproducción ejecutándose (cola playback)\n'
                     f'   Presiona Ctrl+C para detener ambos servicios\n'
                 )
             )
@@ -98,3 +127,5 @@ class Command(BaseCommand):
                 self.django_process.terminate()
             if self.celery_process:
                 self.celery_process.terminate()
+            if self.playback_process:
+                self.playback_process.terminate()
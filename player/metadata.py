@@ -0,0 +1,224 @@
+import io
+import re
+import mutagen
+from mutagen import MutagenError
+
+# Bytes downloaded per file at most. Tags and stream headers sit at the start
+# of the file (ID3v2, FLAC metadata blocks, RIFF chunks) or in its last bytes (ID3v1)
+METADATA_BYTE_BUDGET = 256 * 1024
+# Bytes fetched at least per Drive request, so small header reads share one round trip
+METADATA_READ_AHEAD = 32 * 1024
+# Bytes downloaded at most for a single read. Larger reads (usually embedded
+# cover art) get zeros past this point, which the tag parsers treat as padding
+METADATA_MAX_READ = 64 * 1024
+
+# Tag keys tried in order: Vorbis comments / easy ID3 names, then raw ID3 frames (WAV)
+TAG_KEYS = {
+    'title': ('title', 'TIT2'),
+    'artist': ('artist', 'albumartist', 'TPE1', 'TPE2'),
+    'album': ('album', 'TALB'),
+    'track_number': ('tracknumber', 'TRCK'),
+    'disc_number': ('discnumber', 'TPOS'),
+    'year': ('date', 'year', 'originaldate', 'TDRC', 'TYER', 'TDOR'),
+}
+YEAR_PATTERN = re.compile(r'\b(\d{4})\b')
+NUMBER_PATTERN = re.compile(r'^\s*(\d+)')
+
+
+class RangedDriveFile(io.RawIOBase):
+    """
+    Read-only, seekable view of a Drive file that downloads only what is read
+    Lets mutagen parse a file in place: each read fetches the missing bytes with
+    a ranged request, until METADATA_BYTE_BUDGET is spent; past that, reads
+    return zeros instead of downloading more.
+    """
+
+    def __init__(self, fetcher, request, name=''):
+        """
+        Args:
+            fetcher: DriveFetcher used for the ranged downloads
+            request: Media request from files().get_media(fileId=...)
+            name (str): File name, used by mutagen to guess the format
+        """
+        super().__init__()
+        self.fetcher = fetcher
+        self.request = request
+        self.name = name
+        self.position = 0
+        self.bytes_downloaded = 0
+        # Failed download of a read, which mutagen reports as a parse error
+        self.download_error = None
+        # Downloaded pieces as start offset -> bytes
+        self.segments = {}
+        # The first request also tells the size of the whole file
+        head, self.size = fetcher.download_range(request, 0, METADATA_READ_AHEAD - 1)
+        if self.size is None:
+            raise MutagenError('Drive no indicó el tamaño del archivo')
+        self._store(0, head)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        if offset < 0:
+            raise OSError('Posición negativa')
+        self.position = offset
+        return self.position
+
+    def read(self, size=-1):
+        end = self.size if size is None or size < 0 else min(self.size, self.position + size)
+        if end <= self.position:
+            return b''
+        data = self._read_range(self.position, end)
+        self.position = end
+        return data
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def _store(self, start, data):
+        if data:
+            self.segments[start] = data
+            self.bytes_downloaded += len(data)
+
+    def _read_range(self, start, end):
+        """Assemble bytes start..end (exclusive) from downloaded pieces, fetching gaps."""
+        data = bytearray()
+        position = start
+        downloaded_for_read = 0
+        while position < end:
+            segment_start = next(
+                (offset for offset, piece in self.segments.items() if offset <= position < offset + len(piece)),
+                None
+            )
+            if segment_start is not None:
+                piece = self.segments[segment_start]
+                piece_end = min(end, segment_start + len(piece))
+                data += piece[position - segment_start:piece_end - segment_start]
+                position = piece_end
+                continue
+
+            # Gap up to the next downloaded piece or the end of the read
+            gap_end = min([offset for offset in self.segments if offset > position] + [end])
+            next_piece = min([offset for offset in self.segments if offset > position] + [self.size])
+            length = min(
+                max(gap_end - position, METADATA_READ_AHEAD),
+                next_piece - position,
+                METADATA_MAX_READ - downloaded_for_read,
+                METADATA_BYTE_BUDGET - self.bytes_downloaded,
+            )
+            fetched = b''
+            if length > 0:
+                try:
+                    fetched, _ = self.fetcher.download_range(self.request, position, position + length - 1)
+                except Exception as e:
+                    self.download_error = e
+                    raise
+                self._store(position, fetched)
+                downloaded_for_read += len(fetched)
+            if not fetched:
+                # Out of budget: the rest of the gap reads as zeros
+                data += bytes(gap_end - position)
+                position = gap_end
+        return bytes(data)
+
+
+def get_tag_text(tags, keys):
+    """
+    First non-empty value among several tag keys, as text
+
+    Args:
+        tags: mutagen tags (Vorbis comments, easy ID3 or raw ID3 frames)
+        keys (tuple): Keys to try, in order
+
+    Returns:
+        str: Tag value, or None if no key has one
+    """
+    for key in keys:
+        try:
+            value = tags.get(key)
+        except (KeyError, ValueError):
+            continue
+        if value is None:
+            continue
+        if hasattr(value, 'text'):
+            value = value.text
+        if isinstance(value, (list, tuple)):
+            value = value[0] if value else None
+        value = str(value).strip() if value is not None else ''
+        if value:
+            return value
+    return None
+
+
+def parse_tag_number(text):
+    """Leading number of a tag such as '3' or '3/12', or None."""
+    match = NUMBER_PATTERN.match(text or '')
+    return int(match.group(1)) if match and int(match.group(1)) > 0 else None
+
+
+def read_audio_metadata(fetcher, service, file_id, file_name=''):
+    """
+    Read tags and stream information of a Drive audio file from its headers
+    Downloads at most METADATA_BYTE_BUDGET bytes, whatever the file size.
+
+    Args:
+        fetcher: DriveFetcher used for the ranged downloads
+        service: Drive service to build the media request from
+        file_id (str): Google Drive file ID
+        file_name (str): File name, helps mutagen recognise the format
+
+    Returns:
+        dict: Found values among title, artist, album, track_number,
+        disc_number, year, duration (seconds) and bitrate (kbps); empty if
+        the format was not recognised
+
+    Raises:
+        requests.RequestException: If the file cannot be downloaded, even
+        when the download fails while mutagen is parsing it
+    """
+    audio_file = None
+    try:
+        # Without a size Drive gives nothing to parse, like an unrecognised format
+        audio_file = RangedDriveFile(fetcher, service.files().get_media(fileId=file_id), file_name)
+        audio = mutagen.File(audio_file, easy=True)
+    except MutagenError as e:
+        if audio_file is not None and audio_file.download_error is not None:
+            raise audio_file.download_error from e
+        print(f"No se pudieron leer las etiquetas de {file_name or file_id}: {e}")
+        return {}
+    if audio is None:
+        return {}
+
+    metadata = {}
+    info = getattr(audio, 'info', None)
+    if info is not None and getattr(info, 'length', 0):
+        metadata['duration'] = int(round(info.length))
+    if info is not None and getattr(info, 'bitrate', 0):
+        metadata['bitrate'] = int(info.bitrate // 1000)
+
+    if audio.tags:
+        for field in ('title', 'artist', 'album'):
+            value = get_tag_text(audio.tags, TAG_KEYS[field])
+            if value:
+                metadata[field] = value[:255]
+        for field in ('track_number', 'disc_number'):
+            number = parse_tag_number(get_tag_text(audio.tags, TAG_KEYS[field]))
+            if number:
+                metadata[field] = number
+        year_match = YEAR_PATTERN.search(get_tag_text(audio.tags, TAG_KEYS['year']) or '')
+        if year_match:
+            metadata['year'] = int(year_match.group(1))
+    return metadata
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-17 00:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('player', '0012_drivefolder'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='drive_changes_token',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Merges songs imported more than once before (user, google_file_id) became unique
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def merge_duplicate_songs(apps, schema_editor):
+    """Keep the oldest copy of each song, moving likes and playlist entries onto it."""
+    Song = apps.get_model('player', 'Song')
+    LikedSong = apps.get_model('player', 'LikedSong')
+    PlaylistSong = apps.get_model('player', 'PlaylistSong')
+
+    duplicates = (
+        Song.objects.values('user_id', 'google_file_id')
+        .annotate(copies=Count('id'), kept_id=Min('id'))
+        .filter(copies__gt=1)
+    )
+    for duplicate in duplicates:
+        kept_id = duplicate['kept_id']
+        extra_ids = list(
+            Song.objects.filter(user_id=duplicate['user_id'], google_file_id=duplicate['google_file_id'])
+            .exclude(id=kept_id)
+            .values_list('id', flat=True)
+        )
+
+        liked_user_ids = set(LikedSong.objects.filter(song_id=kept_id).values_list('user_id', flat=True))
+        for like in LikedSong.objects.filter(song_id__in=extra_ids).order_by('created_at'):
+            if like.user_id not in liked_user_ids:
+                LikedSong.objects.filter(id=like.id).update(song_id=kept_id)
+                liked_user_ids.add(like.user_id)
+
+        playlist_ids = set(PlaylistSong.objects.filter(song_id=kept_id).values_list('playlist_id', flat=True))
+        for entry in PlaylistSong.objects.filter(song_id__in=extra_ids).order_by('order', 'date_added'):
+            if entry.playlist_id not in playlist_ids:
+                PlaylistSong.objects.filter(id=entry.id).update(song_id=kept_id)
+                playlist_ids.add(entry.playlist_id)
+
+        # Remaining likes and playlist entries of the copies go with them
+        Song.objects.filter(id__in=extra_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('player', '0013_userprofile_drive_changes_token'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_songs, migrations.RunPython.noop),
+    ]
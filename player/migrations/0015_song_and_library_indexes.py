@@ -0,0 +1,35 @@
+# Generated by Django 5.2.5 on 2026-10-17 00:43
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('player', '0014_merge_duplicate_songs'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='album',
+            index=models.Index(fields=['user', 'name', 'artist'], name='album_user_name_artist_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='likedsong',
+            index=models.Index(fields=['user', '-created_at'], name='likedsong_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='playlistsong',
+            index=models.Index(fields=['playlist', 'order', 'date_added'], name='playlistsong_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='song',
+            index=models.Index(fields=['album', 'user', 'track_number', 'name'], name='song_album_track_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='song',
+            constraint=models.UniqueConstraint(fields=('user', 'google_file_id'), name='unique_song_file_per_user'),
+        ),
+    ]
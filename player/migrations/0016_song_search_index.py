@@ -0,0 +1,86 @@
+# Full-text search index over songs, kept in sync by SQLite triggers
+from django.db import migrations
+
+# Prefix indexes of 1-3 characters keep type-ahead queries ("bea*") on the index
+CREATE_SEARCH_TABLE = """
+CREATE VIRTUAL TABLE player_song_search USING fts5(
+    title, name, artist, album,
+    user_id UNINDEXED,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '1 2 3'
+)
+"""
+
+# Row for one song, with the names of its artist and album
+SEARCH_ROW_SELECT = """
+SELECT {song}.id, coalesce({song}.title, ''), {song}.name,
+       coalesce((SELECT name FROM player_artist WHERE id = {song}.artist_id), ''),
+       coalesce((SELECT name FROM player_album WHERE id = {song}.album_id), ''),
+       {song}.user_id
+"""
+INSERT_SEARCH_ROW = "INSERT INTO player_song_search (rowid, title, name, artist, album, user_id) "
+
+CREATE_TRIGGERS = [
+    f"""
+    CREATE TRIGGER player_song_search_insert AFTER INSERT ON player_song BEGIN
+        {INSERT_SEARCH_ROW} {SEARCH_ROW_SELECT.format(song='new')};
+    END
+    """,
+    f"""
+    CREATE TRIGGER player_song_search_update AFTER UPDATE OF title, name, artist_id, album_id ON player_song BEGIN
+        DELETE FROM player_song_search WHERE rowid = old.id;
+        {INSERT_SEARCH_ROW} {SEARCH_ROW_SELECT.format(song='new')};
+    END
+    """,
+    """
+    CREATE TRIGGER player_song_search_delete AFTER DELETE ON player_song BEGIN
+        DELETE FROM player_song_search WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER player_artist_search_update AFTER UPDATE OF name ON player_artist BEGIN
+        UPDATE player_song_search SET artist = new.name
+        WHERE rowid IN (SELECT id FROM player_song WHERE artist_id = new.id);
+    END
+    """,
+    """
+    CREATE TRIGGER player_album_search_update AFTER UPDATE OF name ON player_album BEGIN
+        UPDATE player_song_search SET album = new.name
+        WHERE rowid IN (SELECT id FROM player_song WHERE album_id = new.id);
+    END
+    """,
+]
+
+TRIGGER_NAMES = [
+    'player_song_search_insert', 'player_song_search_update', 'player_song_search_delete',
+    'player_artist_search_update', 'player_album_search_update',
+]
+
+
+def create_search_index(apps, schema_editor):
+    """Create and fill the FTS5 table; other databases search without it."""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(CREATE_SEARCH_TABLE)
+    schema_editor.execute(INSERT_SEARCH_ROW + SEARCH_ROW_SELECT.format(song='player_song') + ' FROM player_song')
+    for trigger_sql in CREATE_TRIGGERS:
+        schema_editor.execute(trigger_sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for trigger_name in TRIGGER_NAMES:
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS {trigger_name}')
+    schema_editor.execute('DROP TABLE IF EXISTS player_song_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('player', '0015_song_and_library_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.5 on 2026-10-17 00:54
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_playlist_song_counts(apps, schema_editor):
+    """Count the songs of existing playlists; durations are not known yet."""
+    Playlist = apps.get_model('player', 'Playlist')
+    for playlist_id, song_count in Playlist.objects.annotate(entries=Count('playlistsong')).values_list('id', 'entries'):
+        Playlist.objects.filter(id=playlist_id).update(song_count=song_count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('player', '0016_song_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='playlist',
+            name='song_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='playlist',
+            name='total_duration',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='song',
+            name='duration',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(fill_playlist_song_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:24
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('player', '0020_song_drive_file'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScanRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scan_mode', models.CharField(max_length=20)),
+                ('status', models.CharField(choices=[('running', 'En curso'), ('interrupted', 'Interrumpido'), ('completed', 'Completado')], default='running', max_length=20)),
+                ('task_id', models.CharField(blank=True, max_length=255)),
+                ('root_folder', models.JSONField(blank=True, null=True)),
+                ('pending_folders', models.JSONField(blank=True, null=True)),
+                ('page_token', models.CharField(blank=True, max_length=255, null=True)),
+                ('files_processed', models.PositiveIntegerField(default=0)),
+                ('songs_created', models.PositiveIntegerField(default=0)),
+                ('songs_updated', models.PositiveIntegerField(default=0)),
+                ('songs_removed', models.PositiveIntegerField(default=0)),
+                ('covers_found', models.PositiveIntegerField(default=0)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scan_runs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-started_at'], name='scanrun_user_started_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Rebuild the full-text search index with the song owner as an indexed token,
+# so a user's matches are found and ranked without reading other users' rows
+from importlib import import_module
+from django.db import migrations
+
+previous_index = import_module('player.migrations.0016_song_search_index')
+
+# owner holds 'u<user id>'; search.py matches it but gives it no weight in the ranking
+CREATE_SEARCH_TABLE = """
+CREATE VIRTUAL TABLE player_song_search USING fts5(
+    title, name, artist, album, owner,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '1 2 3'
+)
+"""
+
+# Row for one song, with the names of its artist and album
+SEARCH_ROW_SELECT = """
+SELECT {song}.id, coalesce({song}.title, ''), {song}.name,
+       coalesce((SELECT name FROM player_artist WHERE id = {song}.artist_id), ''),
+       coalesce((SELECT name FROM player_album WHERE id = {song}.album_id), ''),
+       'u' || {song}.user_id
+"""
+INSERT_SEARCH_ROW = "INSERT INTO player_song_search (rowid, title, name, artist, album, owner) "
+
+CREATE_TRIGGERS = [
+    f"""
+    CREATE TRIGGER player_song_search_insert AFTER INSERT ON player_song BEGIN
+        {INSERT_SEARCH_ROW} {SEARCH_ROW_SELECT.format(song='new')};
+    END
+    """,
+    f"""
+    CREATE TRIGGER player_song_search_update AFTER UPDATE OF title, name, artist_id, album_id ON player_song BEGIN
+        DELETE FROM player_song_search WHERE rowid = old.id;
+        {INSERT_SEARCH_ROW} {SEARCH_ROW_SELECT.format(song='new')};
+    END
+    """,
+    *previous_index.CREATE_TRIGGERS[2:],
+]
+
+
+def create_owner_search_index(apps, schema_editor):
+    """Replace the search table and its triggers; other databases search without it."""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    previous_index.drop_search_index(apps, schema_editor)
+    schema_editor.execute(CREATE_SEARCH_TABLE)
+    schema_editor.execute(INSERT_SEARCH_ROW + SEARCH_ROW_SELECT.format(song='player_song') + ' FROM player_song')
+    for trigger_sql in CREATE_TRIGGERS:
+        schema_editor.execute(trigger_sql)
+
+
+def restore_previous_search_index(apps, schema_editor):
+    previous_index.drop_search_index(apps, schema_editor)
+    previous_index.create_search_index(apps, schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('player', '0021_scan_run'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_owner_search_index, restore_previous_search_index),
+    ]
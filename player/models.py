@@ -20,6 +20,8 @@ class UserProfile(models.Model):
     google_drive_root_id = models.CharField(max_length=100, null=True, blank=True)
     # User's avatar image URL
     avatar_url = models.URLField(null=True, blank=True)
+    # Google Drive Changes API page token for incremental library syncs
+    drive_changes_token = models.CharField(max_length=255, null=True, blank=True)
 
     def __str__(self):
         return f"Perfil de {self.user.username}"
@@ -48,9 +50,39 @@ class Album(models.Model):
     # Google Drive file ID for album cover image
     cover_image_id = models.CharField(max_length=100, null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # Scanner lookups of an album by name and artist
+            models.Index(fields=['user', 'name', 'artist'], name='album_user_name_artist_idx'),
+        ]
+
     def __str__(self):
         return f'{self.name} by {self.artist.name}'
 
+# Local mirror of the Google Drive folder tree below the library root
+class DriveFolder(models.Model):
+    # Folder belongs to a specific user (multi-tenancy)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Google Drive folder ID
+    google_folder_id = models.CharField(max_length=100)
+    name = models.CharField(max_length=255)
+    # Parent folder, null for the library root
+    parent = models.ForeignKey('self', on_delete=models.CASCADE, related_name='subfolders', null=True, blank=True)
+    # Distance from the library root (root = 0)
+    depth = models.PositiveIntegerField(default=0)
+    # Whether the folder directly contains audio files
+    has_audio = models.BooleanField(default=False)
+    # Album created from this folder by the scanner, if any
+    album = models.ForeignKey(Album, on_delete=models.SET_NULL, related_name='folders', null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # Each Drive folder is mirrored once per user
+        unique_together = ('user', 'google_folder_id')
+
+    def __str__(self):
+        return self.name
+
 # Main song model representing music files from Google Drive
 class Song(models.Model):
     # Song belongs to a specific user (multi-tenancy)
@@ -62,6 +94,20 @@ class Song(models.Model):
     track_number = models.PositiveIntegerField(null=True, blank=True) # track number
     # MIME type of the audio file (e.g., audio/mpeg)
     mime_type = models.CharField(max_length=100)
+    # Drive file details kept by the scanner, so playback can start without asking Drive
+    size = models.PositiveBigIntegerField(null=True, blank=True) # bytes
+    md5_checksum = models.CharField(max_length=32, null=True, blank=True)
+    drive_modified_at = models.DateTimeField(null=True, blank=True)
+    # Values read from the file's tags and stream headers by the metadata stage
+    duration = models.PositiveIntegerField(null=True, blank=True) # seconds
+    bitrate = models.PositiveIntegerField(null=True, blank=True) # kbps
+    disc_number = models.PositiveIntegerField(null=True, blank=True)
+    year = models.PositiveIntegerField(null=True, blank=True)
+    # Artist and album as tagged; the Artist and Album relations follow the folders
+    tag_artist = models.CharField(max_length=255, null=True, blank=True)
+    tag_album = models.CharField(max_length=255, null=True, blank=True)
+    # When the metadata stage last read the file, null until then
+    metadata_read_at = models.DateTimeField(null=True, blank=True)
     # Optional relationships to artist and album
     artist = models.ForeignKey(Artist, on_delete=models.CASCADE, related_name='songs', null=True, blank=True)
     album = models.ForeignKey(Album, on_delete=models.CASCADE, related_name='songs', null=True, blank=True)
@@ -70,6 +116,16 @@ class Song(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     # Many-to-many relationship for users who liked this song
     liked_by = models.ManyToManyField(User, related_name='liked_songs', through='LikedSong')
+
+    class Meta:
+        constraints = [
+            # Each Drive file is imported once per user; also serves play_song lookups
+            models.UniqueConstraint(fields=['user', 'google_file_id'], name='unique_song_file_per_user'),
+        ]
+        indexes = [
+            # Album track listing, already in display order
+            models.Index(fields=['album', 'user', 'track_number', 'name'], name='song_album_track_idx'),
+        ]
     
 # User-created playlists model
 class Playlist(models.Model):
@@ -81,6 +137,10 @@ class Playlist(models.Model):
     # Optional cover image URL for the playlist
     cover_image_url = models.URLField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Denormalized totals, updated in the same transaction as PlaylistSong writes
+    song_count = models.PositiveIntegerField(default=0)
+    # Sum of the known song durations, in seconds
+    total_duration = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return self.name
@@ -99,6 +159,10 @@ class PlaylistSong(models.Model):
         unique_together = ('playlist', 'song')
         # Default ordering by custom order, then by date added
         ordering = ['order', 'date_added']
+        indexes = [
+            # Playlist contents in their default ordering
+            models.Index(fields=['playlist', 'order', 'date_added'], name='playlistsong_order_idx'),
+        ]
 
     def __str__(self):
         return f"{self.playlist.name} - {self.song.title}"
@@ -116,6 +180,72 @@ class LikedSong(models.Model):
     class Meta:
         # Prevent users from liking the same song multiple times
         unique_together = ('user', 'song')
+        indexes = [
+            # Liked songs list, most recent first
+            models.Index(fields=['user', '-created_at'], name='likedsong_user_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} likes {self.song.title or self.song.name}"
+
+# Songs waiting to be played after the current one, kept on the server
+class QueueEntry(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    song = models.ForeignKey(Song, on_delete=models.CASCADE)
+    # Position in the queue, lowest plays first
+    position = models.PositiveIntegerField()
+    # Set once the song has been sent to the audio cache ahead of playback
+    prefetched = models.BooleanField(default=False)
+
+    class Meta:
+        ordering = ['position']
+        indexes = [
+            # Queue contents in playback order
+            models.Index(fields=['user', 'position'], name='queueentry_user_position_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.position}. {self.song.title or self.song.name}"
+
+
+# Checkpoint of a library scan, so an interrupted scan resumes where it stopped
+class ScanRun(models.Model):
+    STATUS_CHOICES = [
+        ('running', 'En curso'),
+        ('interrupted', 'Interrumpido'),
+        ('completed', 'Completado'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='scan_runs')
+    # 'full', 'quick' or 'sync'
+    scan_mode = models.CharField(max_length=20)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='running')
+    # Celery task following the scan, replaced when the scan is resumed
+    task_id = models.CharField(max_length=255, blank=True)
+    # Drive metadata (id, name) of the library root, for the folder mirror
+    root_folder = models.JSONField(null=True, blank=True)
+    # Top-level folders (id, name, parents) not scanned completely yet; null
+    # until the library root has been listed
+    pending_folders = models.JSONField(null=True, blank=True)
+    # Changes API token: the next page of a sync, or the token a full or quick
+    # scan stores for later syncs once it completes
+    page_token = models.CharField(max_length=255, null=True, blank=True)
+    # Totals so far, kept across resumes
+    files_processed = models.PositiveIntegerField(default=0)
+    songs_created = models.PositiveIntegerField(default=0)
+    songs_updated = models.PositiveIntegerField(default=0)
+    songs_removed = models.PositiveIntegerField(default=0)
+    covers_found = models.PositiveIntegerField(default=0)
+    started_at = models.DateTimeField(auto_now_add=True)
+    # Time of the last checkpoint
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Latest scans of a user, to find one to resume
+            models.Index(fields=['user', '-started_at'], name='scanrun_user_started_idx'),
+        ]
 
     def __str__(self):
-        return f"{self.user.username} likes {self.song.title or self.song.name}"
\ No newline at end of file
+        return f"{self.user.username} - {self.scan_mode} ({self.status})"
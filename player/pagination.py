@@ -0,0 +1,108 @@
+import json
+import base64
+import binascii
+import datetime
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """JSON encoder keeping the microseconds DjangoJSONEncoder rounds away."""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(values):
+    """
+    Encode the sort key of the last row of a page as an opaque URL-safe cursor
+
+    Args:
+        values (list): Values of the keyset fields, in order
+
+    Returns:
+        str: Cursor for the ?cursor= parameter
+    """
+    payload = json.dumps(values, cls=CursorEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(model, fields, cursor):
+    """
+    Decode a cursor produced by encode_cursor back into typed field values
+
+    Args:
+        model: Model class the keyset fields belong to
+        fields (tuple): Keyset field names
+        cursor (str): Value of the ?cursor= parameter
+
+    Returns:
+        list: Field values, or None if the cursor is malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(fields):
+            return None
+        return [model._meta.get_field(field).to_python(value) for field, value in zip(fields, values)]
+    except (ValueError, TypeError, binascii.Error, ValidationError):
+        return None
+
+
+def build_keyset_filter(fields, values, descending=False):
+    """
+    Build the condition selecting rows that sort after a cursor
+    (a > x) OR (a = x AND b > y) OR ... for every prefix of the key
+
+    Args:
+        fields (tuple): Keyset field names, ending with a unique field
+        values (list): Field values of the last row already shown
+        descending (bool): True when the page is sorted in descending order
+
+    Returns:
+        Q: Filter for the next page
+    """
+    lookup = 'lt' if descending else 'gt'
+    condition = Q()
+    for index, field in enumerate(fields):
+        equal_prefix = {prefix_field: value for prefix_field, value in zip(fields[:index], values[:index])}
+        condition |= Q(**equal_prefix, **{f'{field}__{lookup}': values[index]})
+    return condition
+
+
+def paginate_keyset(queryset, fields, cursor, page_size, descending=False):
+    """
+    Fetch one page of a queryset ordered by a keyset
+    Each page costs the same whatever its position, since rows before the
+    cursor are skipped through the index instead of counted with OFFSET.
+
+    Args:
+        queryset: QuerySet to paginate, without ordering
+        fields (tuple): Keyset field names, ending with a unique field (usually id)
+        cursor (str): Cursor of the previous page, or None for the first page
+        page_size (int): Rows per page
+        descending (bool): Sort every keyset field in descending order
+
+    Returns:
+        tuple: (list of rows, cursor of the next page or None on the last page)
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    if cursor:
+        values = decode_cursor(queryset.model, fields, cursor)
+        if values is None:
+            raise ValueError('Cursor de paginación no válido')
+        queryset = queryset.filter(build_keyset_filter(fields, values, descending))
+
+    ordering = [f'-{field}' if descending else field for field in fields]
+    rows = list(queryset.order_by(*ordering)[:page_size + 1])
+    if len(rows) <= page_size:
+        return rows, None
+
+    rows = rows[:page_size]
+    last_row = rows[-1]
+    return rows, encode_cursor([getattr(last_row, field) for field in fields])
@@ -0,0 +1,91 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Max
+from .models import Song, QueueEntry
+
+# The next song is warmed once the current one is this far through...
+PREFETCH_AFTER_FRACTION = 0.5
+# ...or this close to its end, in seconds, whichever comes first
+PREFETCH_SECONDS_BEFORE_END = 30
+
+
+def get_queue(user):
+    """
+    Songs waiting in a user's queue, in playback order
+
+    Returns:
+        list: Dicts with the song's Drive file ID and display name
+    """
+    entries = QueueEntry.objects.filter(user=user).order_by('position').values_list(
+        'song__google_file_id', 'song__title', 'song__name'
+    )
+    return [{'id': file_id, 'name': title or name} for file_id, title, name in entries]
+
+
+def enqueue_songs(user, song_ids):
+    """
+    Add songs to the end of a user's queue with one INSERT
+
+    Args:
+        user: Django User owning the queue
+        song_ids (list): Drive file IDs of the songs, in playback order
+
+    Returns:
+        int: Number of songs queued; unknown IDs are skipped
+    """
+    with transaction.atomic():
+        # Serializes concurrent additions, so each one reads the last position of the other
+        User.objects.select_for_update().filter(id=user.id).exists()
+        songs = dict(Song.objects.filter(user=user, google_file_id__in=song_ids).values_list('google_file_id', 'id'))
+        if not songs:
+            return 0
+        last_position = QueueEntry.objects.filter(user=user).aggregate(max_position=Max('position'))['max_position'] or 0
+        entries = [
+            QueueEntry(user=user, song_id=songs[song_id], position=last_position + index)
+            for index, song_id in enumerate((song_id for song_id in song_ids if song_id in songs), start=1)
+        ]
+        QueueEntry.objects.bulk_create(entries)
+    return len(entries)
+
+
+def pop_next_song(user):
+    """
+    Take the first song off a user's queue
+
+    Returns:
+        dict: The song's Drive file ID and display name, or None if the queue is empty
+    """
+    with transaction.atomic():
+        entry = (
+            QueueEntry.objects.select_for_update()
+            .filter(user=user).order_by('position')
+            .values('id', 'song__google_file_id', 'song__title', 'song__name')
+            .first()
+        )
+        if entry is None:
+            return None
+        QueueEntry.objects.filter(id=entry['id']).delete()
+    return {'id': entry['song__google_file_id'], 'name': entry['song__title'] or entry['song__name']}
+
+
+def should_prefetch(position, duration):
+    """Return True once playback is far enough into a track to warm the next one."""
+    if not duration or duration <= 0:
+        return False
+    return position >= duration * PREFETCH_AFTER_FRACTION or duration - position <= PREFETCH_SECONDS_BEFORE_END
+
+
+def claim_next_prefetch(user):
+    """
+    Mark the first queued song as prefetched, once
+
+    Returns:
+        str: Drive file ID of the song to warm, or None if the queue is empty
+        or the song was already claimed by an earlier progress report
+    """
+    entry = QueueEntry.objects.filter(user=user).order_by('position').values('id', 'song__google_file_id').first()
+    if entry is None:
+        return None
+    if not QueueEntry.objects.filter(id=entry['id'], prefetched=False).update(prefetched=True):
+        return None
+    return entry['song__google_file_id']
@@ -0,0 +1,203 @@
+from django.db import transaction
+from django.db.models import Case, When, Value, F, Q, Max, Sum, Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from .models import Song, Playlist, PlaylistSong
+
+
+def get_playlist_totals_subqueries():
+    """
+    Subqueries computing a playlist's song count and total duration from its entries
+
+    Returns:
+        dict: Expressions for song_count and total_duration, keyed by field name
+    """
+    entries = PlaylistSong.objects.filter(playlist=OuterRef('pk')).order_by().values('playlist')
+    return {
+        'song_count': Coalesce(Subquery(entries.annotate(total=Count('id')).values('total')), 0),
+        'total_duration': Coalesce(Subquery(entries.annotate(total=Sum('song__duration')).values('total')), 0),
+    }
+
+
+def refresh_playlist_totals(playlist_ids):
+    """
+    Recompute the stored song count and duration of some playlists with one UPDATE
+    Used after songs are deleted from the library and by the repair command.
+
+    Args:
+        playlist_ids (iterable): IDs of the playlists to refresh
+
+    Returns:
+        int: Number of playlists updated
+    """
+    playlist_ids = list(playlist_ids)
+    if not playlist_ids:
+        return 0
+    return Playlist.objects.filter(id__in=playlist_ids).update(**get_playlist_totals_subqueries())
+
+
+def delete_songs(songs):
+    """
+    Delete library songs and refresh the totals of the playlists that held them
+
+    Args:
+        songs: QuerySet of the Song rows to delete
+
+    Returns:
+        int: Number of songs deleted
+    """
+    with transaction.atomic():
+        playlist_ids = set(
+            PlaylistSong.objects.filter(song__in=songs).values_list('playlist_id', flat=True)
+        )
+        song_ids = list(songs.values_list('id', flat=True))
+        Song.objects.filter(id__in=song_ids).delete()
+        refresh_playlist_totals(playlist_ids)
+    return len(song_ids)
+
+
+def append_playlist_songs(playlist, song_ids):
+    """
+    Add several songs to the end of a playlist with one INSERT
+    Songs already in the playlist or not in the owner's library are skipped.
+
+    Args:
+        playlist: Playlist the songs are added to
+        song_ids (list): Drive file IDs of the songs, in the order to add them
+
+    Returns:
+        int: Number of songs added
+    """
+    song_ids = list(dict.fromkeys(song_ids))
+    with transaction.atomic():
+        # Serializes concurrent additions, so the checks below see every entry
+        Playlist.objects.select_for_update().filter(id=playlist.id).exists()
+        songs = {
+            google_file_id: (song_id, duration)
+            for google_file_id, song_id, duration in Song.objects.filter(
+                user=playlist.user, google_file_id__in=song_ids
+            ).values_list('google_file_id', 'id', 'duration')
+        }
+        present = set(
+            PlaylistSong.objects.filter(playlist=playlist, song_id__in=[song_id for song_id, _ in songs.values()])
+            .values_list('song_id', flat=True)
+        )
+        new_songs = [songs[song_id] for song_id in song_ids if song_id in songs and songs[song_id][0] not in present]
+        if not new_songs:
+            return 0
+
+        last_order = PlaylistSong.objects.filter(playlist=playlist).aggregate(max_order=Max('order'))['max_order'] or 0
+        PlaylistSong.objects.bulk_create(
+            [
+                PlaylistSong(playlist=playlist, song_id=song_id, order=last_order + position)
+                for position, (song_id, _) in enumerate(new_songs, start=1)
+            ],
+            ignore_conflicts=True,
+        )
+        Playlist.objects.filter(id=playlist.id).update(
+            song_count=F('song_count') + len(new_songs),
+            total_duration=F('total_duration') + sum(duration or 0 for _, duration in new_songs),
+        )
+    return len(new_songs)
+
+
+def reorder_playlist_songs(playlist, song_ids):
+    """
+    Put the given songs of a playlist in a new order with one UPDATE
+    The songs take over the order values they already hold between them, so
+    the rest of the playlist keeps its place even if only part of it is sent.
+
+    Args:
+        playlist: Playlist being reordered
+        song_ids (list): Drive file IDs of the songs, in their new order
+
+    Returns:
+        int: Number of playlist entries updated
+    """
+    song_ids = list(dict.fromkeys(song_ids))
+    with transaction.atomic():
+        entries = {
+            song_id: (entry_id, order)
+            for song_id, entry_id, order in PlaylistSong.objects.select_for_update()
+            .filter(playlist=playlist, song__google_file_id__in=song_ids)
+            .values_list('song__google_file_id', 'id', 'order')
+        }
+        song_ids = [song_id for song_id in song_ids if song_id in entries]
+        if not song_ids:
+            return 0
+
+        slots = sorted(order for _, order in entries.values())
+        new_orders = [When(id=entries[song_id][0], then=Value(slot)) for song_id, slot in zip(song_ids, slots)]
+        return PlaylistSong.objects.filter(id__in=[entry_id for entry_id, _ in entries.values()]).update(
+            order=Case(*new_orders, output_field=IntegerField())
+        )
+
+
+def move_playlist_entry(playlist, song_id, target_song_id):
+    """
+    Move one song of a playlist to the position held by another song
+    Only the entries between both positions are shifted, in a single UPDATE.
+
+    Args:
+        playlist: Playlist being reordered
+        song_id (str): Drive file ID of the song being moved
+        target_song_id (str): Drive file ID of the song whose position it takes
+
+    Returns:
+        bool: True if both songs are in the playlist
+    """
+    with transaction.atomic():
+        entries = {
+            entry_song_id: (entry_id, order)
+            for entry_song_id, entry_id, order in PlaylistSong.objects.select_for_update()
+            .filter(playlist=playlist, song__google_file_id__in=[song_id, target_song_id])
+            .values_list('song__google_file_id', 'id', 'order')
+        }
+        if song_id not in entries or target_song_id not in entries:
+            return False
+
+        entry_id, old_order = entries[song_id]
+        new_order = entries[target_song_id][1]
+        if new_order > old_order:
+            # Moving down: the songs in between move up one place
+            shifted = Q(order__gt=old_order, order__lte=new_order)
+            shifted_order = F('order') - 1
+        elif new_order < old_order:
+            shifted = Q(order__gte=new_order, order__lt=old_order)
+            shifted_order = F('order') + 1
+        else:
+            return True
+
+        PlaylistSong.objects.filter(shifted | Q(id=entry_id), playlist=playlist).update(
+            order=Case(When(id=entry_id, then=Value(new_order)), default=shifted_order, output_field=IntegerField())
+        )
+    return True
+
+
+def remove_playlist_entry(playlist, song_id):
+    """
+    Remove a song from a playlist and close the gap it leaves in the order
+
+    Args:
+        playlist: Playlist the song is removed from
+        song_id (str): Drive file ID of the song
+
+    Returns:
+        bool: True if the song was in the playlist
+    """
+    with transaction.atomic():
+        entry = (
+            PlaylistSong.objects.select_for_update()
+            .filter(playlist=playlist, song__google_file_id=song_id)
+            .values('id', 'order', 'song__duration')
+            .first()
+        )
+        if entry is None:
+            return False
+
+        PlaylistSong.objects.filter(id=entry['id']).delete()
+        PlaylistSong.objects.filter(playlist=playlist, order__gt=entry['order']).update(order=F('order') - 1)
+        Playlist.objects.filter(id=playlist.id).update(
+            song_count=F('song_count') - 1,
+            total_duration=Greatest(F('total_duration') - (entry['song__duration'] or 0), 0),
+        )
+    return True
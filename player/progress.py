@@ -0,0 +1,208 @@
+import json
+import time
+import redis
+from celery.result import AsyncResult
+from celery.signals import task_postrun
+from django.conf import settings
+
+# Minimum seconds between two progress updates of the same step; a new step
+# is always sent right away
+PROGRESS_MIN_INTERVAL = 1.0
+# Seconds an event stream waits for a message before sending a keep-alive
+# and reading the task state from the result backend
+PROGRESS_HEARTBEAT_SECONDS = 15
+# Celery states after which a task sends nothing else
+FINISHED_STATES = ('SUCCESS', 'FAILURE', 'REVOKED')
+# Seconds the counters shared by the subtasks of a task are kept in Redis
+TASK_COUNTS_TTL = 24 * 60 * 60
+
+_redis_client = None
+
+
+def get_redis_client():
+    """Redis client shared by the process; its connection pool is thread-safe."""
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(settings.PROGRESS_REDIS_URL)
+    return _redis_client
+
+
+def get_progress_channel(task_id):
+    """Name of the Redis pub/sub channel carrying a task's progress."""
+    return f'task-progress:{task_id}'
+
+
+def get_task_counts_key(task_id):
+    """Name of the Redis hash holding the counters shared by a task's subtasks."""
+    return f'task-counts:{task_id}'
+
+
+def add_task_counts(task_id, **increments):
+    """
+    Add to the counters that the subtasks of a task share, e.g. files processed
+    Used for live progress only; results that matter travel with the task results.
+
+    Args:
+        task_id (str): ID of the task the subtasks work for
+        **increments: Amount to add to each counter
+
+    Returns:
+        dict: Totals of every counter, or empty if Redis is unavailable
+    """
+    key = get_task_counts_key(task_id)
+    try:
+        pipeline = get_redis_client().pipeline()
+        for name, amount in increments.items():
+            pipeline.hincrby(key, name, amount)
+        pipeline.expire(key, TASK_COUNTS_TTL)
+        pipeline.hgetall(key)
+        totals = pipeline.execute()[-1]
+    except redis.RedisError as e:
+        print(f"Error actualizando los contadores de la tarea {task_id}: {e}")
+        return {}
+    return {name.decode(): int(value) for name, value in totals.items()}
+
+
+def clear_task_counts(task_id):
+    """Drop the shared counters of a finished task."""
+    try:
+        get_redis_client().delete(get_task_counts_key(task_id))
+    except redis.RedisError as e:
+        print(f"Error borrando los contadores de la tarea {task_id}: {e}")
+
+
+def get_task_state(task_id):
+    """
+    Current state of a task as stored in the result backend
+
+    Args:
+        task_id (str): Celery task ID
+
+    Returns:
+        dict: {'status', 'info'}, with failures described as exc_type and exc_message
+    """
+    task_result = AsyncResult(task_id)
+    info = task_result.info
+    if isinstance(info, BaseException):
+        info = {'exc_type': type(info).__name__, 'exc_message': str(info)}
+    return {'status': task_result.status, 'info': info}
+
+
+def publish_task_event(task_id, status, info):
+    """
+    Send a task state to whoever follows its progress channel
+    Progress is best effort: Redis errors are logged, never raised to the task.
+
+    Args:
+        task_id (str): Celery task ID
+        status (str): Celery state, e.g. PROGRESS or SUCCESS
+        info: JSON-serializable details (progress meta or task result)
+    """
+    try:
+        get_redis_client().publish(
+            get_progress_channel(task_id), json.dumps({'status': status, 'info': info}, default=str)
+        )
+    except redis.RedisError as e:
+        print(f"Error publicando el progreso de la tarea {task_id}: {e}")
+
+
+class ProgressReporter:
+    """
+    Reports a task's progress to the result backend and its event stream
+    Tasks may report on every item; updates of the same step are only sent
+    once per min_interval seconds, so the cost no longer grows with the library.
+    """
+
+    def __init__(self, task, min_interval=PROGRESS_MIN_INTERVAL, task_id=None):
+        """
+        Args:
+            task: Bound Celery task instance (self inside the task)
+            min_interval (float): Minimum seconds between updates of one step
+            task_id (str): Task the progress belongs to, when a subtask reports
+                for the task that started it; defaults to the running task
+        """
+        self.task = task
+        self.task_id = task_id or task.request.id
+        self.min_interval = min_interval
+        self.last_step = None
+        self.last_sent_at = 0.0
+
+    def report(self, step, **counts):
+        """
+        Report the current step, unless the same step was reported moments ago
+
+        Args:
+            step (str): Step identifier shown by the scan progress modal
+            **counts: Optional current and total item counts
+
+        Returns:
+            bool: True if the update was sent
+        """
+        now = time.monotonic()
+        if step == self.last_step and now - self.last_sent_at < self.min_interval:
+            return False
+
+        self.last_step = step
+        self.last_sent_at = now
+        meta = {'step': step, **counts}
+        self.task.update_state(task_id=self.task_id, state='PROGRESS', meta=meta)
+        if self.task_id:
+            publish_task_event(self.task_id, 'PROGRESS', meta)
+        return True
+
+
+@task_postrun.connect
+def publish_task_result(sender=None, task_id=None, state=None, retval=None, **kwargs):
+    """Send the final state of tasks declared with publishes_progress=True to their event stream."""
+    # Tasks replaced by a chord end as IGNORED; the chord callback reports for them
+    if not getattr(sender, 'publishes_progress', False) or not task_id or state not in FINISHED_STATES:
+        return
+    if isinstance(retval, BaseException):
+        retval = {'exc_type': type(retval).__name__, 'exc_message': str(retval)}
+    publish_task_event(task_id, state, retval)
+
+
+def format_event(data):
+    """Encode a message as one Server-Sent Event."""
+    return f"data: {json.dumps(data, default=str)}\n\n"
+
+
+def iter_task_events(task_id, heartbeat=PROGRESS_HEARTBEAT_SECONDS):
+    """
+    Server-Sent Events with the progress of a task, until it finishes
+    Starts with the stored state, then relays what the task publishes. The
+    result backend is only read again when the channel stays quiet for a
+    heartbeat, which also covers a final message published before subscribing.
+
+    Args:
+        task_id (str): Celery task ID
+        heartbeat (int): Seconds without messages before checking the task state
+
+    Yields:
+        str: Event stream chunks
+    """
+    pubsub = get_redis_client().pubsub(ignore_subscribe_messages=True)
+    try:
+        # Subscribe before reading the state, so no update falls in between
+        pubsub.subscribe(get_progress_channel(task_id))
+        state = get_task_state(task_id)
+        yield format_event(state)
+        if state['status'] in FINISHED_STATES:
+            return
+
+        while True:
+            message = pubsub.get_message(timeout=heartbeat)
+            if message is None:
+                state = get_task_state(task_id)
+                if state['status'] in FINISHED_STATES:
+                    yield format_event(state)
+                    return
+                yield ': keep-alive\n\n'
+                continue
+
+            data = json.loads(message['data'])
+            yield format_event(data)
+            if data.get('status') in FINISHED_STATES:
+                return
+    finally:
+        pubsub.close()
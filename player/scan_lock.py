@@ -0,0 +1,109 @@
+import redis
+from datetime import timedelta
+from celery.utils import uuid
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from .models import ScanRun
+from .progress import get_redis_client, get_task_state, FINISHED_STATES
+
+# Seconds a scan holds its lock at most, in case it dies without releasing it.
+# Scans with a ScanRun are taken for dead sooner, after settings.SCAN_STALE_SECONDS
+# without a checkpoint; this only bounds cover searches and tasks that never started
+SCAN_LOCK_TTL = 6 * 60 * 60
+
+# Deletes the lock only while it still belongs to the given task
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def get_scan_lock_key(user_id, scan_mode):
+    """Name of the Redis key holding the task ID of a user's scan of one mode."""
+    return f'scan-lock:{user_id}:{scan_mode}'
+
+
+def is_scan_abandoned(user_id, task_id):
+    """
+    Whether the scan followed by a task is over although the task never finished
+    A killed worker leaves its task in PROGRESS, and a failed chord subtask keeps
+    the chord callback from running; their ScanRun then stops getting checkpoints.
+
+    Args:
+        user_id (int): ID of the user whose library is scanned
+        task_id (str): Task holding the user's scan lock
+
+    Returns:
+        bool: True if the scan's ScanRun ended or is stale, the same threshold
+        get_resumable_scan_run uses to offer it for resuming
+    """
+    stale_before = timezone.now() - timedelta(seconds=settings.SCAN_STALE_SECONDS)
+    return ScanRun.objects.filter(user_id=user_id, task_id=task_id).filter(
+        ~Q(status='running') | Q(updated_at__lt=stale_before)
+    ).exists()
+
+
+def start_scan(task, user_id, scan_mode, **kwargs):
+    """
+    Start a scan unless the same kind of scan is already queued or running for the user
+    The lock is taken before the task is queued, so repeated requests are
+    coalesced into the first one instead of piling up in the queue. A lock
+    whose task already finished (e.g. it crashed before releasing it), or
+    whose scan was abandoned (see is_scan_abandoned), is taken over.
+
+    Args:
+        task: Celery task running the scan (scan_user_library)
+        user_id (int): ID of the user whose library to scan
+        scan_mode (str): Scanning mode, one lock per mode
+        **kwargs: Extra keyword arguments for the task
+
+    Returns:
+        tuple: (task ID to follow, True if a new scan was started)
+    """
+    key = get_scan_lock_key(user_id, scan_mode)
+    task_id = uuid()
+    try:
+        client = get_redis_client()
+        for _ in range(2):
+            if client.set(key, task_id, nx=True, ex=SCAN_LOCK_TTL):
+                break
+            running_id = client.get(key)
+            if running_id is None:
+                # Released in between, try again
+                continue
+            running_id = running_id.decode()
+            if get_task_state(running_id)['status'] not in FINISHED_STATES and not is_scan_abandoned(user_id, running_id):
+                return running_id, False
+            client.eval(RELEASE_SCRIPT, 1, key, running_id)
+        else:
+            # Another request took the lock in between, follow its scan
+            running_id = client.get(key)
+            if running_id is not None:
+                return running_id.decode(), False
+    except redis.RedisError as e:
+        # Without Redis there is nothing to coalesce with, start the scan anyway
+        print(f"Error comprobando los escaneos en curso del usuario {user_id}: {e}")
+
+    task.apply_async(args=(user_id,), kwargs={'scan_mode': scan_mode, **kwargs}, task_id=task_id)
+    return task_id, True
+
+
+def release_scan_lock(user_id, scan_mode, task_id):
+    """
+    Let the next scan of this mode start; called by the scan when it finishes
+    Best effort: a lock left behind expires or is taken over once its task is done.
+
+    Args:
+        user_id (int): ID of the user whose library was scanned
+        scan_mode (str): Mode the scan was requested with
+        task_id (str): ID of the finishing scan, only its own lock is released
+    """
+    if not task_id:
+        return
+    try:
+        get_redis_client().eval(RELEASE_SCRIPT, 1, get_scan_lock_key(user_id, scan_mode), task_id)
+    except redis.RedisError as e:
+        print(f"Error liberando el escaneo del usuario {user_id}: {e}")
@@ -0,0 +1,90 @@
+import re
+from django.db import connection
+from django.db.models import Q
+from .models import Song
+
+# FTS5 table created by migrations 0016 and 0022, kept in sync by triggers
+SEARCH_TABLE = 'player_song_search'
+# Songs returned per page of results
+SEARCH_PAGE_SIZE = 50
+# bm25 weights of the indexed columns: title, file name, artist, album and
+# owner, which only restricts the matches to one user
+SEARCH_RANK_WEIGHTS = (10.0, 1.0, 5.0, 3.0, 0.0)
+# Columns the words typed by the user are looked up in
+SEARCH_COLUMNS = ('title', 'name', 'artist', 'album')
+# Words of the query; punctuation never reaches the FTS5 query syntax
+SEARCH_TERM_PATTERN = re.compile(r'\w+')
+MAX_SEARCH_TERMS = 8
+
+
+def get_search_terms(text):
+    """Split a search box value into at most MAX_SEARCH_TERMS words."""
+    return SEARCH_TERM_PATTERN.findall(text or '')[:MAX_SEARCH_TERMS]
+
+
+def build_match_query(user, terms):
+    """
+    Build an FTS5 MATCH expression where every word must match as a prefix
+    The owner token comes first, so only the user's rows are read from the index.
+
+    Args:
+        user: Django User whose library is searched
+        terms (list): Words typed by the user
+
+    Returns:
+        str: Expression such as 'owner : "u1" AND {title name artist album} : ("the"* "beat"*)'
+    """
+    words = ' '.join(f'"{term}"*' for term in terms)
+    return f'owner : "u{user.id}" AND {{{" ".join(SEARCH_COLUMNS)}}} : ({words})'
+
+
+def get_rank_function():
+    """FTS5 rank function scoring matches with SEARCH_RANK_WEIGHTS."""
+    return f"bm25({', '.join(str(weight) for weight in SEARCH_RANK_WEIGHTS)})"
+
+
+def search_songs(user, text, page=1, page_size=SEARCH_PAGE_SIZE):
+    """
+    Search a user's songs by title, file name, artist and album
+
+    Args:
+        user: Django User whose library is searched
+        text (str): Raw search box value
+        page (int): 1-based page number
+        page_size (int): Songs per page
+
+    Returns:
+        tuple: (list of Song ordered by relevance, bool whether more pages exist)
+    """
+    terms = get_search_terms(text)
+    if not terms:
+        return [], False
+
+    offset = (page - 1) * page_size
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            # Every match of the user is ranked before the page is cut
+            cursor.execute(
+                f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s AND rank MATCH %s "
+                f"ORDER BY rank LIMIT %s OFFSET %s",
+                [build_match_query(user, terms), get_rank_function(), page_size + 1, offset]
+            )
+            song_ids = [row[0] for row in cursor.fetchall()]
+    else:
+        # Databases without the FTS5 index fall back to substring lookups
+        condition = Q()
+        for term in terms:
+            condition &= (
+                Q(title__icontains=term) | Q(name__icontains=term)
+                | Q(artist__name__icontains=term) | Q(album__name__icontains=term)
+            )
+        song_ids = list(
+            Song.objects.filter(condition, user=user)
+            .order_by('title', 'name')
+            .values_list('id', flat=True)[offset:offset + page_size + 1]
+        )
+
+    has_more = len(song_ids) > page_size
+    song_ids = song_ids[:page_size]
+    songs_by_id = Song.objects.select_related('artist', 'album').in_bulk(song_ids)
+    return [songs_by_id[song_id] for song_id in song_ids if song_id in songs_by_id], has_more
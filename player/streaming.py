@@ -0,0 +1,348 @@
+import os
+import re
+import asyncio
+import weakref
+import httpx
+import requests
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+
+# Size of each chunk read from local files while streaming (1MB)
+STREAM_CHUNK_SIZE = 1024 * 1024
+# Bytes read from the Google Drive socket at a time; small chunks keep memory
+# per listener low since nothing is accumulated between reads (64KB)
+UPSTREAM_READ_SIZE = 64 * 1024
+# Seconds to wait for Google Drive to connect and to send each chunk
+UPSTREAM_TIMEOUT = (10, 60)
+# Open Drive connections per process for async streaming; every listener
+# holds one for as long as its song downloads
+ASYNC_UPSTREAM_MAX_CONNECTIONS = 1000
+# Async HTTP clients keyed by the event loop they belong to
+_async_clients = weakref.WeakKeyDictionary()
+
+# Single byte range, e.g. "bytes=0-1023", "bytes=1024-" or "bytes=-500"
+RANGE_HEADER_PATTERN = re.compile(r'^\s*bytes\s*=\s*(\d*)\s*-\s*(\d*)\s*$')
+
+
+class RangeNotSatisfiable(Exception):
+    """Raised when a Range header cannot be served for the requested file."""
+    pass
+
+
+def parse_range_header(range_header, file_size):
+    """
+    Parse an HTTP Range header against a file of known size
+    Only single byte ranges are supported; anything else falls back to the full file
+
+    Args:
+        range_header (str): Raw value of the Range header, or None
+        file_size (int): Total size of the file in bytes
+
+    Returns:
+        tuple: (start, end) inclusive byte offsets, or None to serve the full file
+
+    Raises:
+        RangeNotSatisfiable: If the range lies outside the file
+    """
+    if not range_header:
+        return None
+
+    match = RANGE_HEADER_PATTERN.match(range_header)
+    if not match:
+        # Multi-range or malformed headers are ignored as allowed by RFC 9110
+        return None
+
+    start_text, end_text = match.groups()
+    if not start_text and not end_text:
+        return None
+
+    if not start_text:
+        # Suffix range: last N bytes of the file
+        suffix_length = int(end_text)
+        if suffix_length == 0 or file_size == 0:
+            raise RangeNotSatisfiable()
+        return max(file_size - suffix_length, 0), file_size - 1
+
+    start = int(start_text)
+    if end_text and int(end_text) < start:
+        # Syntactically invalid range, ignore it
+        return None
+    if start >= file_size:
+        raise RangeNotSatisfiable()
+
+    end = int(end_text) if end_text else file_size - 1
+
+    return start, min(end, file_size - 1)
+
+
+def get_response_file_size(response):
+    """
+    Size of the whole file behind a Google Drive media response
+    "bytes 0-65535/4718592" carries it on a partial response; a response that
+    ignored the range is the whole file
+
+    Args:
+        response: requests.Response of a media download
+
+    Returns:
+        int: Total file size in bytes, or None if Drive did not say
+    """
+    if response.status_code == 206:
+        total_size = response.headers.get('Content-Range', '').rsplit('/', 1)[-1]
+    else:
+        total_size = response.headers.get('Content-Length', '')
+    return int(total_size) if total_size.isdigit() else None
+
+
+def iter_drive_media(session, media_uri, start, end, chunk_size=UPSTREAM_READ_SIZE, file_size=None):
+    """
+    Stream a byte range of a Google Drive file over a single upstream request
+    The response socket is read incrementally and every chunk is handed to
+    the client as-is, without an intermediate buffer or per-chunk requests.
+
+    Args:
+        session: AuthorizedSession for the file owner's credentials
+        media_uri (str): Download URI from files().get_media(...).uri
+        start (int): First byte to fetch (inclusive)
+        end (int): Last byte to fetch (inclusive)
+        chunk_size (int): Maximum number of bytes read from the socket at once
+        file_size (int): Size the file is expected to have, or None to skip the check
+
+    Yields:
+        bytes: Consecutive pieces of the requested range
+
+    Raises:
+        requests.HTTPError: If Google Drive rejects the download or the file
+            no longer has the expected size
+    """
+    if end < start:
+        # Empty file, nothing to download
+        return
+
+    response = session.get(
+        media_uri,
+        headers={'Range': f'bytes={start}-{end}'},
+        stream=True,
+        timeout=UPSTREAM_TIMEOUT
+    )
+    try:
+        response.raise_for_status()
+        if start > 0 and response.status_code != 206:
+            # Upstream ignored the range, the bytes would not match the request
+            raise requests.HTTPError(f"Drive ignoró el rango solicitado ({response.status_code})", response=response)
+        if file_size is not None and get_response_file_size(response) not in (None, file_size):
+            # The byte offsets were computed from outdated metadata
+            raise requests.HTTPError("El archivo cambió de tamaño en Drive", response=response)
+
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            yield chunk
+    finally:
+        # Releases the connection, or drops it if the client went away early
+        response.close()
+
+
+def start_stream(chunks):
+    """
+    Start a chunk generator right away instead of when the response is sent
+    Upstream errors then surface while the view can still pick another response.
+
+    Args:
+        chunks: Generator of chunks, not started yet
+
+    Returns:
+        generator: The same chunks, the first one already fetched
+    """
+    first_chunk = next(chunks, None)
+
+    def resume():
+        try:
+            if first_chunk is not None:
+                yield first_chunk
+                yield from chunks
+        finally:
+            chunks.close()
+
+    return resume()
+
+
+def get_async_http_client():
+    """
+    Shared async HTTP client for Drive media downloads in the running event loop
+    One client per loop keeps connections pooled across listeners; httpx
+    clients cannot be shared between loops.
+
+    Returns:
+        httpx.AsyncClient: Client with streaming timeouts and a large connection pool
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(UPSTREAM_TIMEOUT[1], connect=UPSTREAM_TIMEOUT[0]),
+            limits=httpx.Limits(max_connections=ASYNC_UPSTREAM_MAX_CONNECTIONS),
+            follow_redirects=True,
+        )
+        _async_clients[loop] = client
+    return client
+
+
+async def aiter_drive_media(client, media_uri, access_token, start, end, chunk_size=UPSTREAM_READ_SIZE, file_size=None):
+    """
+    Async counterpart of iter_drive_media over an httpx client
+    Each chunk is read from the Drive socket only when the consumer asks for
+    it, so a slow listener slows the download instead of filling memory.
+
+    Args:
+        client: httpx.AsyncClient from get_async_http_client()
+        media_uri (str): Download URI from files().get_media(...).uri
+        access_token (str): OAuth access token of the file owner
+        start (int): First byte to fetch (inclusive)
+        end (int): Last byte to fetch (inclusive)
+        chunk_size (int): Maximum number of bytes read from the socket at once
+        file_size (int): Size the file is expected to have, or None to skip the check
+
+    Yields:
+        bytes: Consecutive pieces of the requested range
+
+    Raises:
+        httpx.HTTPStatusError: If Google Drive rejects the download or the file
+            no longer has the expected size
+    """
+    if end < start:
+        # Empty file, nothing to download
+        return
+
+    request = client.build_request(
+        'GET',
+        media_uri,
+        headers={'Range': f'bytes={start}-{end}', 'Authorization': f'Bearer {access_token}'}
+    )
+    response = await client.send(request, stream=True)
+    try:
+        response.raise_for_status()
+        if start > 0 and response.status_code != 206:
+            # Upstream ignored the range, the bytes would not match the request
+            raise httpx.HTTPStatusError(
+                f"Drive ignoró el rango solicitado ({response.status_code})", request=request, response=response
+            )
+        if file_size is not None and get_response_file_size(response) not in (None, file_size):
+            # The byte offsets were computed from outdated metadata
+            raise httpx.HTTPStatusError("El archivo cambió de tamaño en Drive", request=request, response=response)
+
+        async for chunk in response.aiter_bytes(chunk_size):
+            yield chunk
+    finally:
+        # Releases the connection, or drops it if the client went away early
+        await response.aclose()
+
+
+async def astart_stream(chunks):
+    """
+    Async counterpart of start_stream for async chunk generators
+
+    Args:
+        chunks: Async generator of chunks, not started yet
+
+    Returns:
+        async generator: The same chunks, the first one already fetched
+    """
+    first_chunk = await anext(chunks, None)
+
+    async def resume():
+        try:
+            if first_chunk is not None:
+                yield first_chunk
+                async for chunk in chunks:
+                    yield chunk
+        finally:
+            await chunks.aclose()
+
+    return resume()
+
+
+def iter_file_range(file_handle, start, end, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Stream a byte range of a local file and close it afterwards
+
+    Args:
+        file_handle: Binary file object opened for reading
+        start (int): First byte to read (inclusive)
+        end (int): Last byte to read (inclusive)
+        chunk_size (int): Maximum number of bytes per chunk
+
+    Yields:
+        bytes: Consecutive pieces of the requested range
+    """
+    try:
+        file_handle.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = file_handle.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        file_handle.close()
+
+
+def range_not_satisfiable_response(file_size):
+    """Build a 416 response advertising the real size of the file."""
+    response = HttpResponse(status=416)
+    response['Content-Range'] = f'bytes */{file_size}'
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def set_range_headers(response, byte_range, start, end, file_size):
+    """
+    Set Content-Length, Accept-Ranges and Content-Range on an audio response
+
+    Args:
+        response: Django response being returned
+        byte_range (tuple): Parsed range, or None for a full-file response
+        start (int): First byte served (inclusive)
+        end (int): Last byte served (inclusive)
+        file_size (int): Total size of the file
+    """
+    response['Content-Length'] = str(end - start + 1)
+    response['Accept-Ranges'] = 'bytes'
+    if byte_range:
+        response['Content-Range'] = f'bytes {start}-{end}/{file_size}'
+
+
+def build_file_response(range_header, file_handle, content_type):
+    """
+    Serve a local file honouring the Range header
+    Ranges that run to the end of the file use FileResponse so the server
+    can hand the file descriptor to sendfile() without copying in Python.
+
+    Args:
+        range_header (str): Raw value of the Range header, or None
+        file_handle: Binary file object opened for reading
+        content_type (str): MIME type of the file
+
+    Returns:
+        HttpResponse: 200, 206 or 416 response
+    """
+    file_size = os.fstat(file_handle.fileno()).st_size
+    try:
+        byte_range = parse_range_header(range_header, file_size)
+    except RangeNotSatisfiable:
+        file_handle.close()
+        return range_not_satisfiable_response(file_size)
+
+    start, end = byte_range if byte_range else (0, file_size - 1)
+    status = 206 if byte_range else 200
+
+    if end == file_size - 1:
+        file_handle.seek(start)
+        response = FileResponse(file_handle, content_type=content_type, status=status)
+    else:
+        response = StreamingHttpResponse(
+            iter_file_range(file_handle, start, end),
+            content_type=content_type,
+            status=status
+        )
+
+    set_range_headers(response, byte_range, start, end, file_size)
+    return response
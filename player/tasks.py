@@ -1,18 +1,51 @@
-import json
 import re
-from celery import shared_task
+from datetime import timedelta
+from celery import shared_task, chord
+from django.conf import settings
 from django.contrib.auth.models import User
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from .models import Song, Artist, Album, UserProfile, GoogleCredential
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from google.auth.exceptions import GoogleAuthError
+from .models import Song, Artist, Album, UserProfile, DriveFolder, PlaylistSong, ScanRun
+from .drive import get_drive_client, DriveFetcher
+from .metadata import read_audio_metadata
+from .streaming import iter_drive_media
+from . import audio_cache
+from .playlists import delete_songs, refresh_playlist_totals
+from .progress import ProgressReporter, add_task_counts, clear_task_counts
+from .scan_lock import release_scan_lock
+
+# Maximum number of rows sent in a single INSERT by the scanner
+INGEST_BATCH_SIZE = 500
+# Number of folders whose children are listed in a single Drive query
+CRAWL_FOLDERS_PER_QUERY = 20
+# Songs whose tags are read per round of the metadata stage
+METADATA_BATCH_SIZE = 200
+# Attempts given to a top-level folder of a scan after the first one fails,
+# and seconds before the first of them (doubled on each attempt)
+SCAN_FOLDER_MAX_RETRIES = 3
+SCAN_FOLDER_RETRY_SECONDS = 10
+# Song fields written by the metadata stage
+METADATA_FIELDS = (
+    'title', 'track_number', 'disc_number', 'year', 'duration', 'bitrate',
+    'tag_artist', 'tag_album', 'metadata_read_at',
+)
+# Drive metadata requested for every listed file; size, checksum and
+# modification time let playback start without asking Drive again
+DRIVE_FILE_FIELDS = 'id, name, mimeType, parents, size, md5Checksum, modifiedTime'
+# Song fields written from that metadata for songs already in the library
+SONG_FILE_FIELDS = ('mime_type', 'size', 'md5_checksum', 'drive_modified_at', 'metadata_read_at')
+# Song fields overwritten when a new file turns out to be imported already
+INGEST_CONFLICT_FIELDS = ('name', 'mime_type', 'size', 'md5_checksum', 'drive_modified_at')
+
+# MIME types treated as songs and folders by the scanner
+AUDIO_MIME_TYPES = ('audio/mpeg', 'audio/flac', 'audio/wav')
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+# Images considered as album covers, and the file names preferred among them
+IMAGE_MIME_TYPES = ('image/jpeg', 'image/png')
+COVER_FILE_NAMES = ('cover.jpg', 'cover.png', 'folder.jpg', 'albumart.jpg')
 
-import json
-import re
-from celery import shared_task
-from django.contrib.auth.models import User
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from .models import Song, Artist, Album, UserProfile, GoogleCredential
 
 def clean_and_extract_metadata(filename):
     """
@@ -111,9 +144,9 @@ def get_folder_path_from_root(service, folder_id, root_folder_id, folder_cache=N
     
     return path
 
-def create_hierarchical_structure(path_parts, user):
+def get_artist_album_names(path_parts):
     """
-    Create Artist and Album objects from folder path hierarchy
+    Derive artist and album names from a folder path hierarchy
     Implements intelligent mapping based on folder depth:
     - 1 folder: Use same name for both artist and album
     - 2 folders: First is artist, second is album
@@ -121,10 +154,9 @@ def create_hierarchical_structure(path_parts, user):
     
     Args:
         path_parts (list): List of folder names from root to song location
-        user: Django User instance for ownership
         
     Returns:
-        tuple: (Artist instance, Album instance) or (None, None) if creation fails
+        tuple: (artist_name, album_name) or (None, None) if the path is empty
     """
     if not path_parts:
         return None, None
@@ -136,16 +168,29 @@ def create_hierarchical_structure(path_parts, user):
         return None, None
     elif len(filtered_parts) == 1:
         # Single folder: use as both artist and album name
-        artist_name = filtered_parts[0]
-        album_name = filtered_parts[0]
+        return filtered_parts[0], filtered_parts[0]
     elif len(filtered_parts) == 2:
         # Two folders: first is artist, second is album
-        artist_name = filtered_parts[0]
-        album_name = filtered_parts[1]
+        return filtered_parts[0], filtered_parts[1]
     else:
         # Multiple folders: assume artist/album are the last two
-        artist_name = filtered_parts[-2]
-        album_name = filtered_parts[-1]
+        return filtered_parts[-2], filtered_parts[-1]
+
+def create_hierarchical_structure(path_parts, user):
+    """
+    Create Artist and Album objects from folder path hierarchy
+    See get_artist_album_names for how folders map to artist and album
+    
+    Args:
+        path_parts (list): List of folder names from root to song location
+        user: Django User instance for ownership
+        
+    Returns:
+        tuple: (Artist instance, Album instance) or (None, None) if creation fails
+    """
+    artist_name, album_name = get_artist_album_names(path_parts)
+    if not artist_name:
+        return None, None
     
     # Create or get existing Artist and Album instances
     artist_obj, _ = Artist.objects.get_or_create(name=artist_name, user=user)
@@ -153,211 +198,1000 @@ def create_hierarchical_structure(path_parts, user):
     
     return artist_obj, album_obj
 
-@shared_task(bind=True)
-def scan_user_library(self, user_id, scan_mode='full'):
+class LibraryIngestor:
+    """
+    Buffers new audio files found by the scanner and writes them in batches
+    Artists and albums are resolved through in-memory maps loaded once per
+    scan, and each flush runs in a single transaction, so a page of files
+    costs a handful of queries instead of several per track
+    """
+
+    def __init__(self, user):
+        self.user = user
+        # Artist name -> Artist ID
+        self.artist_ids = dict(Artist.objects.filter(user=user).values_list('name', 'id'))
+        # (Artist ID, album name) -> Album ID, keeping the oldest album on duplicates
+        self.album_ids = {}
+        for album_id, artist_id, name in Album.objects.filter(user=user).order_by('id').values_list('id', 'artist_id', 'name'):
+            self.album_ids.setdefault((artist_id, name), album_id)
+        # Google file ID -> (file metadata, artist name, album name, folder ID)
+        self.pending = {}
+
+    def add(self, file_data, folder_path):
+        """
+        Queue an audio file for the next flush
+        
+        Args:
+            file_data (dict): Drive metadata (id, name, mimeType, parents)
+            folder_path (list): Folder names from the library root to the file
+            
+        Returns:
+            bool: False if no artist/album could be derived from the path
+        """
+        artist_name, album_name = get_artist_album_names(folder_path)
+        if not artist_name:
+            return False
+        self.pending[file_data['id']] = (file_data, artist_name, album_name, file_data['parents'][0])
+        return True
+
+    def flush(self):
+        """
+        Write every queued file in one transaction
+        
+        Returns:
+            tuple: (number of songs created, dict of folder ID -> Album ID)
+        """
+        if not self.pending:
+            return 0, {}
+        
+        pending = list(self.pending.values())
+        self.pending = {}
+        
+        with transaction.atomic():
+            # The folders of a scan are written by parallel subtasks; locking the
+            # user's profile lets only one of them resolve artists and albums at once
+            UserProfile.objects.select_for_update().filter(user=self.user).exists()
+            
+            # Resolve artists, creating the missing ones in one statement
+            missing_artists = {artist_name for _, artist_name, _, _ in pending} - self.artist_ids.keys()
+            if missing_artists:
+                Artist.objects.bulk_create(
+                    [Artist(user=self.user, name=name) for name in missing_artists],
+                    ignore_conflicts=True
+                )
+                self.artist_ids.update(Artist.objects.filter(
+                    user=self.user, name__in=missing_artists
+                ).values_list('name', 'id'))
+            
+            # Resolve albums the same way
+            missing_albums = {
+                (self.artist_ids[artist_name], album_name) for _, artist_name, album_name, _ in pending
+            } - self.album_ids.keys()
+            if missing_albums:
+                # Another subtask of the scan may have created them since the maps were loaded
+                self._load_albums(missing_albums)
+                missing_albums -= self.album_ids.keys()
+            if missing_albums:
+                Album.objects.bulk_create([
+                    Album(user=self.user, artist_id=artist_id, name=name) for artist_id, name in missing_albums
+                ])
+                self._load_albums(missing_albums)
+            
+            songs = []
+            folder_albums = {}
+            for file_data, artist_name, album_name, folder_id in pending:
+                artist_id = self.artist_ids[artist_name]
+                album_id = self.album_ids[(artist_id, album_name)]
+                track_num, clean_title = clean_and_extract_metadata(file_data.get('name'))
+                songs.append(Song(
+                    user=self.user,
+                    google_file_id=file_data['id'],
+                    name=file_data.get('name'),
+                    title=clean_title,
+                    track_number=track_num,
+                    mime_type=file_data.get('mimeType', 'application/octet-stream'),
+                    artist_id=artist_id,
+                    album_id=album_id,
+                    **get_song_file_fields(file_data),
+                ))
+                folder_albums[folder_id] = album_id
+            
+            # Files imported meanwhile by another scan take this listing's Drive
+            # metadata in the same statement; their album and tags are kept.
+            # They are not counted as created; the profile lock keeps this exact
+            already_imported_count = Song.objects.filter(
+                user=self.user, google_file_id__in=[song.google_file_id for song in songs]
+            ).count()
+            Song.objects.bulk_create(
+                songs,
+                batch_size=INGEST_BATCH_SIZE,
+                update_conflicts=True,
+                unique_fields=['user', 'google_file_id'],
+                update_fields=INGEST_CONFLICT_FIELDS,
+            )
+        
+        return len(songs) - already_imported_count, folder_albums
+
+    def _load_albums(self, albums):
+        """Add the stored IDs of some (artist ID, album name) pairs to the album map."""
+        stored_albums = Album.objects.filter(
+            user=self.user,
+            artist_id__in={artist_id for artist_id, _ in albums},
+            name__in={name for _, name in albums}
+        ).order_by('id').values_list('id', 'artist_id', 'name')
+        for album_id, artist_id, name in stored_albums:
+            self.album_ids.setdefault((artist_id, name), album_id)
+
+def get_song_file_fields(file_data):
+    """
+    Song field values for the size, checksum and modification time of a Drive file
+    
+    Args:
+        file_data (dict): Drive metadata with size, md5Checksum and modifiedTime
+        
+    Returns:
+        dict: Values for size, md5_checksum and drive_modified_at
+    """
+    size = file_data.get('size')
+    modified_time = file_data.get('modifiedTime')
+    return {
+        'size': int(size) if size is not None else None,
+        'md5_checksum': file_data.get('md5Checksum'),
+        'drive_modified_at': parse_datetime(modified_time) if modified_time else None,
+    }
+
+def apply_song_file(song, file_data):
+    """
+    Copy a Drive file's MIME type, size, checksum and modification time onto its Song
+    When the checksum shows the content changed, the cached audio is dropped
+    and the tags are read again
+    
+    Args:
+        song: Song instance to update (not saved)
+        file_data (dict): Drive metadata of the file
+        
+    Returns:
+        bool: True if the content of the file changed
+    """
+    file_fields = get_song_file_fields(file_data)
+    content_changed = song.md5_checksum is not None and file_fields['md5_checksum'] != song.md5_checksum
+    song.mime_type = file_data.get('mimeType', song.mime_type)
+    for field, value in file_fields.items():
+        setattr(song, field, value)
+    if content_changed:
+        song.metadata_read_at = None
+        audio_cache.discard(song.google_file_id)
+    return content_changed
+
+def update_song_files(user, files):
+    """
+    Store the current Drive metadata of songs already in the library
+    Fills it in for songs imported before it was kept, and catches files
+    whose content was replaced without a new file ID
+    
+    Args:
+        user: Django User instance for ownership
+        files (list): Drive metadata of the files
+        
+    Returns:
+        int: Number of songs updated
+    """
+    files_by_id = {file_data['id']: file_data for file_data in files}
+    if not files_by_id:
+        return 0
+    songs = list(Song.objects.filter(user=user, google_file_id__in=files_by_id))
+    for song in songs:
+        apply_song_file(song, files_by_id[song.google_file_id])
+    Song.objects.bulk_update(songs, SONG_FILE_FIELDS, batch_size=INGEST_BATCH_SIZE)
+    return len(songs)
+
+def refresh_song_file(service, song):
+    """
+    Ask Drive again for a song's MIME type, size, checksum and modification time
+    Used when they were never stored or a download shows they are out of date
+    
+    Args:
+        service: Google Drive API service instance
+        song: Song instance, updated and saved in place
+    """
+    file_data = service.files().get(
+        fileId=song.google_file_id,
+        fields='mimeType, size, md5Checksum, modifiedTime'
+    ).execute()
+    apply_song_file(song, file_data)
+    song.save(update_fields=SONG_FILE_FIELDS)
+
+def apply_song_metadata(song, metadata):
+    """
+    Copy the values read from a file's headers onto its Song
+    Title and track number keep the ones parsed from the filename when the
+    file has no such tags
+    
+    Args:
+        song: Song instance to update (not saved)
+        metadata (dict): Values returned by read_audio_metadata
+    """
+    song.title = metadata.get('title', song.title)
+    song.track_number = metadata.get('track_number', song.track_number)
+    song.disc_number = metadata.get('disc_number')
+    song.year = metadata.get('year')
+    song.duration = metadata.get('duration')
+    song.bitrate = metadata.get('bitrate')
+    song.tag_artist = metadata.get('artist')
+    song.tag_album = metadata.get('album')
+    song.metadata_read_at = timezone.now()
+
+def list_children_of_folders(fetcher, service, folder_ids):
+    """
+    List the subfolders, audio files and images directly inside several folders
+    Runs on a DriveFetcher worker thread, so it only talks to Drive
+    
+    Args:
+        fetcher (DriveFetcher): Executes the requests within the rate limit
+        service: Google Drive API service instance used to build requests
+        folder_ids (tuple): Parent folder IDs combined in one query
+        
+    Returns:
+        list: Metadata (id, name, mimeType, parents) of every child, all pages included
+    """
+    parent_query = ' or '.join(f"'{folder_id}' in parents" for folder_id in folder_ids)
+    mime_types = (FOLDER_MIME_TYPE,) + AUDIO_MIME_TYPES + IMAGE_MIME_TYPES
+    mime_query = ' or '.join(f"mimeType='{mime_type}'" for mime_type in mime_types)
+    query = f"({parent_query}) and ({mime_query}) and trashed=false"
+    
+    children = []
+    page_token = None
+    while True:
+        results = fetcher.execute(service.files().list(
+            q=query,
+            pageSize=1000,
+            fields=f"nextPageToken, files({DRIVE_FILE_FIELDS})",
+            pageToken=page_token
+        ))
+        children.extend(results.get('files', []))
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            return children
+
+def crawl_library(fetcher, service, root_folder_id, folder_cache, folder_images=None,
+                  folders_per_query=CRAWL_FOLDERS_PER_QUERY, root_path=()):
+    """
+    Walk the library breadth-first starting at the root folder
+    Lists the children of several folders per request ('a' in parents or
+    'b' in parents), so API calls scale with the number of folders rather
+    than files, and nothing outside the root is ever fetched. All folder
+    batches of a level are listed concurrently on the fetcher's workers.
+    Images come back in the same listings, so covers need no extra requests
+    
+    Args:
+        fetcher (DriveFetcher): Runs the folder listings concurrently
+        service: Google Drive API service instance
+        root_folder_id (str): Library root folder ID
+        folder_cache (dict): Filled with metadata (id, name, parents) of every folder found
+        folder_images (dict): Optional, filled with folder ID -> image files (id, name)
+            for every folder listed, including folders without images
+        folders_per_query (int): Number of parent folders combined in one query
+        root_path (tuple): Folder names from the library root to root_folder_id,
+            when only a subtree of the library is crawled
+        
+    Yields:
+        tuple: (list of audio file metadata, dict of folder ID -> folder names from root)
+        for every folder batch; the audio files' first parent is always a crawled folder
+        
+    Raises:
+        HttpError: If a folder batch cannot be listed
+    """
+    folder_paths = {root_folder_id: list(root_path)}
+    pending_folder_ids = [root_folder_id]
+    
+    while pending_folder_ids:
+        batches = [
+            tuple(pending_folder_ids[index:index + folders_per_query])
+            for index in range(0, len(pending_folder_ids), folders_per_query)
+        ]
+        pending_folder_ids = []
+        
+        for batch_ids, children, error in fetcher.map(
+            lambda batch: list_children_of_folders(fetcher, service, batch), batches
+        ):
+            if error is not None:
+                raise error
+            
+            if folder_images is not None:
+                for folder_id in batch_ids:
+                    folder_images.setdefault(folder_id, [])
+            
+            audio_files = []
+            for file_data in children:
+                # Files can have several parents, keep the one inside this batch
+                parent_id = next((parent for parent in file_data.get('parents', []) if parent in batch_ids), None)
+                if parent_id is None:
+                    continue
+                file_data['parents'] = [parent_id]
+                
+                if file_data.get('mimeType') == FOLDER_MIME_TYPE:
+                    # Skip folders already reached through another parent
+                    if file_data['id'] in folder_paths:
+                        continue
+                    folder_cache[file_data['id']] = file_data
+                    folder_paths[file_data['id']] = folder_paths[parent_id] + [file_data.get('name', '')]
+                    pending_folder_ids.append(file_data['id'])
+                elif file_data.get('mimeType') in IMAGE_MIME_TYPES:
+                    if folder_images is not None:
+                        folder_images[parent_id].append({'id': file_data['id'], 'name': file_data.get('name', '')})
+                else:
+                    audio_files.append(file_data)
+            
+            yield audio_files, folder_paths
+
+def fetch_folder_images(fetcher, service, folder_ids, folder_cache):
+    """
+    List the images of many folders through Drive batch requests
+    Folders missing from folder_cache get their metadata in the same batches,
+    so thousands of album folders take a few dozen HTTP round trips
+    
+    Args:
+        fetcher (DriveFetcher): Executes the batches within the rate limit
+        service: Google Drive API service instance
+        folder_ids (list): Album folder IDs to look into
+        folder_cache (dict): Folder metadata cache, completed with the missing folders
+        
+    Returns:
+        dict: Folder ID -> list of image files (id, name); folders whose
+        listing failed are left out
+    """
+    image_mime_query = ' or '.join(f"mimeType='{mime_type}'" for mime_type in IMAGE_MIME_TYPES)
+    batch_requests = {}
+    for folder_id in folder_ids:
+        if folder_id not in folder_cache:
+            batch_requests[('folder', folder_id)] = service.files().get(fileId=folder_id, fields='id, name')
+        batch_requests[('images', folder_id)] = service.files().list(
+            q=f"'{folder_id}' in parents and ({image_mime_query}) and trashed=false",
+            pageSize=10,
+            fields="files(id, name)"
+        )
+    
+    folder_images = {}
+    for (kind, folder_id), result in fetcher.execute_batch(service, batch_requests).items():
+        if isinstance(result, Exception):
+            print(f"Error buscando portada en carpeta {folder_id}: {result}")
+        elif kind == 'folder':
+            folder_cache[folder_id] = result
+        else:
+            folder_images[folder_id] = result.get('files', [])
+    return folder_images
+
+def pick_cover_image(images):
+    """
+    Choose the cover among the images of an album folder
+    Prioritizes common cover art filenames, falling back to the first image
+    
+    Args:
+        images (list): Image files (id, name) found in the folder
+        
+    Returns:
+        dict: The chosen image file
+    """
+    return next((image for image in images if image.get('name', '').lower() in COVER_FILE_NAMES), images[0])
+
+def assign_folder_covers(user, album_folder_ids, folder_images, folder_cache, progress=None):
+    """
+    Give the albums of several folders the cover found among the folder's images
+    Albums are matched by the folder name, as the scanner names them
+    
+    Args:
+        user: Django User instance owning the albums
+        album_folder_ids (iterable): Folder IDs holding songs
+        folder_images (dict): Folder ID -> image files (id, name) listed in it
+        folder_cache (dict): Folder metadata (id, name, parents)
+        progress (ProgressReporter): Optional, receives the 'covers' step
+        
+    Returns:
+        int: Number of covers found
+    """
+    album_folder_ids = list(album_folder_ids)
+    covers_found_count = 0
+    for index, album_folder_id in enumerate(album_folder_ids):
+        if progress is not None:
+            progress.report('covers', current=index, total=len(album_folder_ids))
+        images = folder_images.get(album_folder_id)
+        if not images:
+            continue
+        
+        try:
+            cover_file = pick_cover_image(images)
+            album_meta = folder_cache.get(album_folder_id, {})
+            
+            # Update album with cover image ID
+            Album.objects.filter(user=user, name=album_meta.get('name')).update(cover_image_id=cover_file.get('id'))
+            covers_found_count += 1
+        except Exception as e:
+            print(f"Error buscando portada en carpeta {album_folder_id}: {e}")
+    return covers_found_count
+
+def sync_folder_mirror(user, root_folder, folder_cache, audio_folder_albums):
+    """
+    Store the scanned folder tree in DriveFolder so folder_browser can
+    render breadcrumbs, subfolders and albums without calling Google Drive
+    Only folders whose parent chain reaches the library root are mirrored
+    
+    Args:
+        user: Django User instance for ownership
+        root_folder (dict): Drive metadata (id, name) of the library root
+        folder_cache (dict): Folder metadata (id, name, parents) collected while scanning
+        audio_folder_albums (dict): Folder ID -> Album ID for folders containing songs
+        
+    Returns:
+        int: Number of folders written to the mirror
+    """
+    root_folder_id = root_folder['id']
+    parent_ids = {root_folder_id: None}
+    depths = {root_folder_id: 0}
+    names = {root_folder_id: root_folder.get('name', '')}
+    unreachable = set()
+    
+    # Resolve each cached folder's depth by walking up until a known folder
+    for folder_id in folder_cache:
+        chain = []
+        current_id = folder_id
+        while current_id not in depths and current_id not in unreachable:
+            folder_info = folder_cache.get(current_id)
+            parents = folder_info.get('parents', []) if folder_info else []
+            if not parents:
+                # Folder lives outside the library root
+                current_id = None
+                break
+            chain.append(current_id)
+            current_id = parents[0]
+        
+        if current_id is None or current_id in unreachable:
+            unreachable.update(chain)
+            continue
+        
+        for chained_id in reversed(chain):
+            parent_id = folder_cache[chained_id]['parents'][0]
+            parent_ids[chained_id] = parent_id
+            depths[chained_id] = depths[parent_id] + 1
+            names[chained_id] = folder_cache[chained_id].get('name', '')
+    
+    # Keep audio/album flags learned in earlier scans for folders not seen with songs now
+    existing_flags = {
+        folder_id: (has_audio, album_id)
+        for folder_id, has_audio, album_id in DriveFolder.objects.filter(user=user).values_list(
+            'google_folder_id', 'has_audio', 'album_id'
+        )
+    }
+    
+    # Write level by level so every parent row exists before its children
+    folder_pks = {}
+    for depth in sorted(set(depths.values())):
+        level_ids = [folder_id for folder_id, folder_depth in depths.items() if folder_depth == depth]
+        rows = []
+        for folder_id in level_ids:
+            has_audio, album_id = existing_flags.get(folder_id, (False, None))
+            if folder_id in audio_folder_albums:
+                has_audio = True
+                album_id = audio_folder_albums[folder_id] or album_id
+            rows.append(DriveFolder(
+                user=user,
+                google_folder_id=folder_id,
+                name=names[folder_id],
+                parent_id=folder_pks.get(parent_ids[folder_id]),
+                depth=depth,
+                has_audio=has_audio,
+                album_id=album_id,
+            ))
+        DriveFolder.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['user', 'google_folder_id'],
+            update_fields=['name', 'parent', 'depth', 'has_audio', 'album', 'updated_at'],
+        )
+        folder_pks.update(DriveFolder.objects.filter(
+            user=user, depth=depth, google_folder_id__in=level_ids
+        ).values_list('google_folder_id', 'id'))
+    
+    return len(depths)
+
+def get_changes_start_token(service):
+    """
+    Get a Drive Changes API token marking the current state of the user's Drive
+    Taken before a scan starts so changes made during the scan are not missed
+    
+    Args:
+        service: Google Drive API service instance
+        
+    Returns:
+        str: Start page token, or None if it could not be fetched
+    """
+    try:
+        return service.changes().getStartPageToken().execute().get('startPageToken')
+    except Exception as e:
+        print(f"Error obteniendo token de cambios: {e}")
+        return None
+
+def is_folder_in_library(folder_id, root_folder_id, folder_cache):
+    """
+    Check whether a folder sits below the library root using cached metadata
+    Call get_folder_path_from_root first so the parent chain is cached
+    
+    Args:
+        folder_id (str): Folder ID to check
+        root_folder_id (str): Library root folder ID
+        folder_cache (dict): Folder metadata (id, name, parents)
+        
+    Returns:
+        bool: True if the folder is the root or one of its descendants
+    """
+    current_folder_id = folder_id
+    visited = set()
+    while current_folder_id and current_folder_id not in visited:
+        if current_folder_id == root_folder_id:
+            return True
+        visited.add(current_folder_id)
+        parents = folder_cache.get(current_folder_id, {}).get('parents', [])
+        current_folder_id = parents[0] if parents else None
+    return False
+
+def get_mirror_subtree(user, google_folder_id):
+    """
+    Get a mirrored folder and all of its mirrored descendants
+    
+    Args:
+        user: Django User instance for ownership
+        google_folder_id (str): Google Drive folder ID at the top of the subtree
+        
+    Returns:
+        list: DriveFolder instances, top folder first (empty if not mirrored)
+    """
+    subtree = []
+    level = list(DriveFolder.objects.filter(user=user, google_folder_id=google_folder_id))
+    while level:
+        subtree.extend(level)
+        level = list(DriveFolder.objects.filter(user=user, parent__in=level))
+    return subtree
+
+def get_mirror_path(drive_folder):
+    """
+    Build the folder path from the library root to a mirrored folder
+    
+    Args:
+        drive_folder: DriveFolder instance
+        
+    Returns:
+        list: Folder names from root (excluded) to the given folder
+    """
+    path = []
+    node = drive_folder
+    while node is not None and node.parent_id is not None:
+        path.insert(0, node.name)
+        node = node.parent
+    return path
+
+def remove_library_item(user, file_id):
+    """
+    Remove a trashed, deleted or moved-out file or folder from the library
+    Folders take every song of the albums mirrored below them, unless another
+    folder outside the subtree still maps to the same album
+    
+    Args:
+        user: Django User instance for ownership
+        file_id (str): Google Drive ID of the removed file or folder
+        
+    Returns:
+        int: Number of songs removed
+    """
+    removed_count = delete_songs(Song.objects.filter(user=user, google_file_id=file_id))
+    if removed_count:
+        return removed_count
+    
+    subtree = get_mirror_subtree(user, file_id)
+    if not subtree:
+        return 0
+    
+    subtree_ids = [folder.id for folder in subtree]
+    album_ids = {folder.album_id for folder in subtree if folder.album_id}
+    shared_album_ids = set(DriveFolder.objects.filter(
+        user=user, album_id__in=album_ids
+    ).exclude(id__in=subtree_ids).values_list('album_id', flat=True))
+    
+    removed_count = delete_songs(Song.objects.filter(user=user, album_id__in=album_ids - shared_album_ids))
+    # Deleting the top folder cascades to its mirrored descendants
+    subtree[0].delete()
+    return removed_count
+
+def rehome_folder_albums(user, google_folder_id):
+    """
+    Re-derive artist and album for songs below a renamed or moved folder
+    Uses the already updated folder mirror, so no Drive calls are needed
+    
+    Args:
+        user: Django User instance for ownership
+        google_folder_id (str): Google Drive ID of the changed folder
+        
+    Returns:
+        int: Number of songs moved to a different album
+    """
+    moved_count = 0
+    for folder in get_mirror_subtree(user, google_folder_id):
+        if not folder.has_audio or not folder.album_id:
+            continue
+        
+        artist_obj, album_obj = create_hierarchical_structure(get_mirror_path(folder), user)
+        if not album_obj or album_obj.id == folder.album_id:
+            continue
+        
+        # Keep the cover found for the old album
+        old_cover_id = Album.objects.filter(id=folder.album_id).values_list('cover_image_id', flat=True).first()
+        if old_cover_id and not album_obj.cover_image_id:
+            album_obj.cover_image_id = old_cover_id
+            album_obj.save(update_fields=['cover_image_id'])
+        
+        moved_count += Song.objects.filter(user=user, album_id=folder.album_id).update(
+            album=album_obj, artist=artist_obj
+        )
+        DriveFolder.objects.filter(user=user, album_id=folder.album_id).update(album=album_obj)
+    return moved_count
+
+def remove_empty_albums_and_artists(user):
+    """Delete albums without songs and artists without albums or songs."""
+    Album.objects.filter(user=user, songs__isnull=True).delete()
+    Artist.objects.filter(user=user, albums__isnull=True, songs__isnull=True).delete()
+
+def list_folder_tree_audio(service, folder_id, folder_cache):
+    """
+    List every audio file below a folder, caching the subfolders found
+    Used when a whole folder is moved into the library, since Drive only
+    reports a change for the folder itself and not for its contents
+    
+    Args:
+        service: Google Drive API service instance
+        folder_id (str): Folder to crawl
+        folder_cache (dict): Cache for folder metadata, updated in place
+        
+    Returns:
+        list: Drive metadata (id, name, mimeType, parents) of the audio files
+    """
+    audio_files = []
+    pending_folder_ids = [folder_id]
+    while pending_folder_ids:
+        current_folder_id = pending_folder_ids.pop()
+        page_token = None
+        while True:
+            results = service.files().list(
+                q=f"'{current_folder_id}' in parents and trashed=false",
+                pageSize=1000,
+                fields=f"nextPageToken, files({DRIVE_FILE_FIELDS})",
+                pageToken=page_token
+            ).execute()
+            for file_data in results.get('files', []):
+                if file_data.get('mimeType') == FOLDER_MIME_TYPE:
+                    folder_cache[file_data['id']] = file_data
+                    pending_folder_ids.append(file_data['id'])
+                elif file_data.get('mimeType') in AUDIO_MIME_TYPES:
+                    audio_files.append(file_data)
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                break
+    return audio_files
+
+def import_song_file(service, user, file_data, root_folder_id, folder_cache):
+    """
+    Create or update a Song from Drive metadata, deriving artist and album
+    from the folder path between the library root and the file
+    
+    Args:
+        service: Google Drive API service instance
+        user: Django User instance for ownership
+        file_data (dict): Drive metadata (id, name, mimeType, parents)
+        root_folder_id (str): Library root folder ID
+        folder_cache (dict): Cache for folder metadata to reduce API calls
+        
+    Returns:
+        tuple: (Song instance, created) or (None, False) if the file is outside the library
+    """
+    parents = file_data.get('parents', [])
+    if not parents:
+        return None, False
+    
+    folder_path = get_folder_path_from_root(service, parents[0], root_folder_id, folder_cache)
+    if not folder_path or not is_folder_in_library(parents[0], root_folder_id, folder_cache):
+        return None, False
+    
+    artist_obj, album_obj = create_hierarchical_structure(folder_path, user)
+    if not artist_obj or not album_obj:
+        return None, False
+    
+    file_fields = get_song_file_fields(file_data)
+    defaults = {
+        'name': file_data.get('name'),
+        'mime_type': file_data.get('mimeType', 'application/octet-stream'),
+        'artist': artist_obj,
+        'album': album_obj,
+        **file_fields
+    }
+    previous_checksum, metadata_read_at = Song.objects.filter(
+        user=user, google_file_id=file_data.get('id')
+    ).values_list('md5_checksum', 'metadata_read_at').first() or (None, None)
+    if previous_checksum is None or previous_checksum != file_fields['md5_checksum']:
+        # The file may have changed, read its tags again
+        defaults['metadata_read_at'] = None
+        audio_cache.discard(file_data.get('id'))
+    if defaults.get('metadata_read_at', metadata_read_at) is None:
+        # Title and track come from the file name until the tags are read; a
+        # rename or move keeps the checksum and the values read from the tags
+        track_num, clean_title = clean_and_extract_metadata(file_data.get('name'))
+        defaults['title'] = clean_title
+        defaults['track_number'] = track_num
+    return Song.objects.update_or_create(
+        google_file_id=file_data.get('id'),
+        user=user,
+        defaults=defaults
+    )
+
+def record_scan_folder(scan_run_id, finished_folder_id=None, **counts):
+    """
+    Add a top-level folder's totals to its scan's checkpoint
+    Folder subtasks finish at the same time, so the row is locked while it changes
+    
+    Args:
+        scan_run_id (int): ScanRun of the scan
+        finished_folder_id (str): Folder to drop from the pending list, None
+            if it has to be scanned again when the scan is resumed
+        **counts: Amount to add to each ScanRun total
+    """
+    with transaction.atomic():
+        scan_run = ScanRun.objects.select_for_update().get(id=scan_run_id)
+        for field, amount in counts.items():
+            setattr(scan_run, field, getattr(scan_run, field) + amount)
+        if finished_folder_id is not None:
+            scan_run.pending_folders = [
+                folder for folder in scan_run.pending_folders or [] if folder['id'] != finished_folder_id
+            ]
+        scan_run.save()
+
+def get_resumable_scan_run(user):
+    """
+    Latest scan of a user, if it stopped before going through the whole library
+    A scan still marked as running counts once its last checkpoint is older
+    than settings.SCAN_STALE_SECONDS, as nothing is working on it anymore
+    
+    Args:
+        user: Django User instance
+        
+    Returns:
+        ScanRun: The scan to resume, or None
+    """
+    scan_run = ScanRun.objects.filter(user=user).order_by('-started_at').first()
+    if scan_run is None or scan_run.status == 'completed':
+        return None
+    if scan_run.status == 'running' and scan_run.updated_at > timezone.now() - timedelta(seconds=settings.SCAN_STALE_SECONDS):
+        return None
+    return scan_run
+
+@shared_task(bind=True, publishes_progress=True)
+def scan_user_library(self, user_id, scan_mode='full', scan_run_id=None):
     """
     Celery task to scan user's Google Drive library for music files
-    Supports multiple scan modes: full, quick, and covers_only
+    Supports multiple scan modes: full, quick, sync and covers_only
+    Full and quick scans are split into one scan_library_folder subtask per
+    top-level folder, run as a chord whose callback (finish_library_scan)
+    takes over this task's ID, so several workers can share a large library.
+    The sync mode applies only what changed since the last scan through
+    the Drive Changes API, falling back to quick mode without a stored token.
+    Full, quick and sync scans keep a ScanRun checkpoint, and passing its ID
+    resumes an interrupted scan where it stopped. Started through
+    scan_lock.start_scan, the scan releases its lock once it finishes
     
     Args:
         self: Celery task instance for state updates
         user_id (int): ID of the user whose library to scan
-        scan_mode (str): Scanning mode - 'full', 'quick', or 'covers_only'
+        scan_mode (str): Scanning mode - 'full', 'quick', 'sync' or 'covers_only'
+        scan_run_id (int): Optional, ScanRun of an interrupted scan to resume;
+            its own mode replaces scan_mode
         
     Returns:
         str: Success message with statistics about files processed
     """
+    # Mode the scan was requested with, which names its lock
+    lock_mode = scan_mode
     try:
         # Initialize user credentials and Google Drive service
         user = User.objects.get(id=user_id)
-        creds_model = GoogleCredential.objects.get(user=user)
-        creds = Credentials.from_authorized_user_info(json.loads(creds_model.token_json))
+        drive_client = get_drive_client(user)
+        service = drive_client.service
         profile = UserProfile.objects.get(user=user)
         root_folder_id = profile.google_drive_root_id
         if not root_folder_id:
+            release_scan_lock(user_id, lock_mode, self.request.id)
             return f"Error: El usuario {user.username} no tiene una carpeta raíz configurada."
+        scan_run = ScanRun.objects.get(id=scan_run_id, user=user) if scan_run_id is not None else None
     except Exception as e:
         self.update_state(state='FAILURE', meta={'exc_type': type(e).__name__, 'exc_message': str(e)})
+        release_scan_lock(user_id, lock_mode, self.request.id)
         return f"Error al iniciar: {e}"
 
-    service = build('drive', 'v3', credentials=creds)
-    folder_cache = {}
-    songs_created_count = 0
-    covers_found_count = 0
-    album_folders_with_songs = set()
+    # Progress is sent at most once per second per step, however many files there are
+    progress = ProgressReporter(self)
+    
+    if scan_run is not None:
+        scan_mode = scan_run.scan_mode
+        scan_run.status = 'running'
+        scan_run.task_id = self.request.id or ''
+        scan_run.save(update_fields=['status', 'task_id', 'updated_at'])
+    else:
+        # Without a stored changes token there is no baseline to sync against
+        if scan_mode == 'sync' and not profile.drive_changes_token:
+            scan_mode = 'quick'
+        if scan_mode in ('full', 'quick', 'sync'):
+            scan_run = ScanRun.objects.create(
+                user=user,
+                scan_mode=scan_mode,
+                task_id=self.request.id or '',
+                page_token=profile.drive_changes_token if scan_mode == 'sync' else None,
+            )
 
-    # FULL SCAN MODE: Complete library scan including all audio files
-    if scan_mode == 'full':
-        self.update_state(state='PROGRESS', meta={'step': 'searching_audio_files'})
+    # FULL AND QUICK SCAN MODES: Hand each top-level folder to its own subtask
+    if scan_mode in ('full', 'quick'):
+        progress.report('getting_existing_files' if scan_mode == 'quick' else 'searching_audio_files')
         
-        # Get existing file IDs to avoid duplicates
-        existing_file_ids = set(Song.objects.filter(user=user).values_list('google_file_id', flat=True))
+        if scan_run.root_folder is None:
+            try:
+                scan_run.root_folder = service.files().get(fileId=root_folder_id, fields='id, name').execute()
+            except Exception as e:
+                print(f"Error obteniendo la carpeta raíz: {e}")
         
-        # Query for all audio files in Google Drive
-        audio_query = f"(mimeType='audio/mpeg' or mimeType='audio/flac' or mimeType='audio/wav') and trashed=false"
+        # A resumed scan only goes through the folders it had not finished
+        if scan_run.pending_folders is None:
+            # Mark the Drive state before listing so later syncs start from here
+            scan_run.page_token = get_changes_start_token(service)
+            try:
+                with DriveFetcher(drive_client.credentials) as fetcher:
+                    # Songs must sit in a folder to get an artist, so loose files are skipped
+                    scan_run.pending_folders = [
+                        {'id': file_data['id'], 'name': file_data.get('name', ''), 'parents': [root_folder_id]}
+                        for file_data in list_children_of_folders(fetcher, service, (root_folder_id,))
+                        if file_data.get('mimeType') == FOLDER_MIME_TYPE
+                    ]
+            except Exception as e:
+                print(f"Error de API recorriendo la biblioteca: {e}")
+        scan_run.save()
         
-        page_token = None
-        files_processed = 0
+        pending_folders = scan_run.pending_folders or []
+        if self.request.id:
+            add_task_counts(self.request.id, folders_total=len(pending_folders))
+        if not pending_folders:
+            return self.replace(finish_library_scan.s([], scan_run.id, lock_mode))
+        return self.replace(chord(
+            [scan_library_folder.s(scan_run.id, folder) for folder in pending_folders],
+            finish_library_scan.s(scan_run.id, lock_mode),
+        ))
+
+    folder_cache = {}
+    # Folder ID -> images found in it, for cover art
+    folder_images = {}
+    # Totals start from the checkpoint when a sync is resumed
+    songs_created_count = scan_run.songs_created if scan_run else 0
+    songs_updated_count = scan_run.songs_updated if scan_run else 0
+    songs_removed_count = scan_run.songs_removed if scan_run else 0
+    covers_found_count = scan_run.covers_found if scan_run else 0
+    # Set when a Drive listing keeps failing, so the scan stops at a checkpoint
+    scan_interrupted = False
+    # Mirrored folders renamed or moved since the last sync
+    changed_folder_ids = set()
+    album_folders_with_songs = set()
+    # Folder ID -> Album ID for the local folder mirror
+    audio_folder_albums = {}
+    mirrored_folder_ids = set(DriveFolder.objects.filter(user=user).values_list('google_folder_id', flat=True))
+
+    # SYNC MODE: Apply only the changes reported by the Drive Changes API
+    if scan_mode == 'sync':
+        progress.report('syncing_changes')
+        root_folder = None
+        changes_processed = scan_run.files_processed
         
-        # Process files in paginated batches
-        while True:
-            try:
-                self.update_state(state='PROGRESS', meta={'step': 'processing_audio_files', 'current': files_processed})
-                
-                results = service.files().list(
-                    q=audio_query, 
-                    pageSize=500,
-                    fields="nextPageToken, files(id, name, mimeType, parents)", 
-                    pageToken=page_token
-                ).execute()
+        with DriveFetcher(drive_client.credentials) as fetcher:
+            while scan_run.page_token:
+                # Rate limits, server and network errors are retried with backoff
+                try:
+                    results = fetcher.execute(service.changes().list(
+                        pageToken=scan_run.page_token,
+                        pageSize=1000,
+                        spaces='drive',
+                        includeRemoved=True,
+                        fields=f"nextPageToken, newStartPageToken, changes(fileId, removed, file({DRIVE_FILE_FIELDS}, trashed))"
+                    ))
+                except Exception as e:
+                    print(f"Error de API en sincronización de cambios: {e}")
+                    scan_interrupted = True
+                    break
                 
-                for file_data in results.get('files', []):
-                    files_processed += 1
-                    
-                    # Skip files already in database
-                    if file_data.get('id') in existing_file_ids:
-                        continue
+                for change in results.get('changes', []):
+                    changes_processed += 1
+                    file_id = change.get('fileId')
+                    file_data = change.get('file') or {}
                     
                     try:
-                        parents = file_data.get('parents', [])
-                        if not parents:
+                        # Deleted or trashed files and folders leave the library
+                        if change.get('removed') or file_data.get('trashed'):
+                            songs_removed_count += remove_library_item(user, file_id)
                             continue
                         
-                        immediate_parent_id = parents[0]
-                        
-                        # Build folder path from root to file location
-                        folder_path = get_folder_path_from_root(
-                            service, immediate_parent_id, root_folder_id, folder_cache
-                        )
-                        
-                        if not folder_path:
-                            continue
-                        
-                        # Create artist and album from folder structure
-                        artist_obj, album_obj = create_hierarchical_structure(folder_path, user)
-                        
-                        if not artist_obj or not album_obj:
-                            print(f"No se pudo crear estructura para {file_data.get('name')} en ruta: {' / '.join(folder_path)}")
-                            continue
-                        
-                        # Track folders that contain songs for cover art search
-                        album_folders_with_songs.add(immediate_parent_id)
+                        parents = file_data.get('parents', [])
                         
-                        # Extract metadata from filename
-                        track_num, clean_title = clean_and_extract_metadata(file_data.get('name'))
-
-                        # Create or update song record
-                        _, created = Song.objects.update_or_create(
-                            google_file_id=file_data.get('id'), 
-                            user=user,
-                            defaults={
-                                'name': file_data.get('name'), 
-                                'title': clean_title, 
-                                'track_number': track_num, 
-                                'mime_type': file_data.get('mimeType', 'application/octet-stream'), 
-                                'artist': artist_obj, 
-                                'album': album_obj
-                            }
-                        )
+                        if file_data.get('mimeType') == FOLDER_MIME_TYPE:
+                            # Renamed or moved folder: refresh its cached metadata and ancestors
+                            folder_cache[file_id] = file_data
+                            if parents:
+                                get_folder_path_from_root(service, parents[0], root_folder_id, folder_cache)
+                            
+                            if not is_folder_in_library(file_id, root_folder_id, folder_cache):
+                                # Moved outside the library root
+                                folder_cache.pop(file_id, None)
+                                songs_removed_count += remove_library_item(user, file_id)
+                            elif file_id in mirrored_folder_ids:
+                                changed_folder_ids.add(file_id)
+                            else:
+                                # Folder new to the library, Drive does not report its contents
+                                for audio_file in list_folder_tree_audio(service, file_id, folder_cache):
+                                    song, created = import_song_file(service, user, audio_file, root_folder_id, folder_cache)
+                                    if song:
+                                        album_folders_with_songs.add(audio_file['parents'][0])
+                                        audio_folder_albums[audio_file['parents'][0]] = song.album_id
+                                        songs_created_count += int(created)
                         
-                        if created:
-                            songs_created_count += 1
+                        elif file_data.get('mimeType') in AUDIO_MIME_TYPES:
+                            # Added, renamed or moved song
+                            song, created = import_song_file(service, user, file_data, root_folder_id, folder_cache)
+                            if not song:
+                                # Moved outside the library root
+                                songs_removed_count += remove_library_item(user, file_id)
+                                continue
                             
+                            album_folders_with_songs.add(parents[0])
+                            audio_folder_albums[parents[0]] = song.album_id
+                            if created:
+                                songs_created_count += 1
+                            else:
+                                songs_updated_count += 1
+                                
                     except Exception as e:
-                        print(f"Error procesando archivo {file_data.get('name')}: {e}")
-                
-                page_token = results.get('nextPageToken', None)
-                if not page_token: 
-                    break
-                    
-            except Exception as e:
-                print(f"Error de API en búsqueda de archivos: {e}")
-                break
+                        print(f"Error aplicando cambio de {file_data.get('name', file_id)}: {e}")
                 
-    # QUICK SCAN MODE: Only scan for new files not in database
-    elif scan_mode == 'quick':
-        self.update_state(state='PROGRESS', meta={'step': 'getting_existing_files'})
-        existing_file_ids = set(Song.objects.filter(user=user).values_list('google_file_id', flat=True))
-        
-        self.update_state(state='PROGRESS', meta={'step': 'searching_new_files'})
-        
-        # Same audio query but with smaller page size for faster processing
-        audio_query = f"(mimeType='audio/mpeg' or mimeType='audio/flac' or mimeType='audio/wav') and trashed=false"
-        
-        page_token = None
-        files_processed = 0
-        
-        while True:
-            try:
-                results = service.files().list(
-                    q=audio_query, 
-                    pageSize=200,  # Smaller batch size for quicker response
-                    fields="nextPageToken, files(id, name, mimeType, parents)", 
-                    pageToken=page_token
-                ).execute()
+                # FOLDER MIRROR: Store the changed folders for folder_browser. Done
+                # page by page, so the checkpoint below never skips a folder change
+                if folder_cache:
+                    try:
+                        if root_folder is None:
+                            root_folder = fetcher.execute(service.files().get(fileId=root_folder_id, fields='id, name'))
+                        sync_folder_mirror(user, root_folder, folder_cache, audio_folder_albums)
+                    except Exception as e:
+                        print(f"Error guardando estructura de carpetas: {e}")
                 
-                for file_data in results.get('files', []):
-                    files_processed += 1
-                    if files_processed % 100 == 0:
-                        self.update_state(state='PROGRESS', meta={'step': 'processing_new_files', 'current': files_processed})
-                    
-                    # Skip existing files (main difference from full scan)
-                    if file_data.get('id') in existing_file_ids:
-                        continue
-                        
+                # Folder renames and moves change the artist/album of everything below them
+                for changed_folder_id in changed_folder_ids:
                     try:
-                        parents = file_data.get('parents', [])
-                        if not parents:
-                            continue
-                        
-                        immediate_parent_id = parents[0]
-                        
-                        folder_path = get_folder_path_from_root(
-                            service, immediate_parent_id, root_folder_id, folder_cache
-                        )
-                        
-                        if not folder_path:
-                            continue
-                        
-                        artist_obj, album_obj = create_hierarchical_structure(folder_path, user)
-                        
-                        if not artist_obj or not album_obj:
-                            continue
-                        
-                        album_folders_with_songs.add(immediate_parent_id)
-                        
-                        track_num, clean_title = clean_and_extract_metadata(file_data.get('name'))
-
-                        _, created = Song.objects.update_or_create(
-                            google_file_id=file_data.get('id'), 
-                            user=user,
-                            defaults={
-                                'name': file_data.get('name'), 
-                                'title': clean_title, 
-                                'track_number': track_num, 
-                                'mime_type': file_data.get('mimeType', 'application/octet-stream'), 
-                                'artist': artist_obj, 
-                                'album': album_obj
-                            }
-                        )
-                        
-                        if created:
-                            songs_created_count += 1
-                            
+                        songs_updated_count += rehome_folder_albums(user, changed_folder_id)
                     except Exception as e:
-                        print(f"Error procesando archivo {file_data.get('name')}: {e}")
+                        print(f"Error actualizando carpeta modificada {changed_folder_id}: {e}")
+                changed_folder_ids.clear()
                 
-                page_token = results.get('nextPageToken', None)
-                if not page_token: 
+                # Checkpoint: a resumed sync continues with the next page
+                scan_run.page_token = results.get('nextPageToken') or results.get('newStartPageToken', scan_run.page_token)
+                scan_run.files_processed = changes_processed
+                scan_run.songs_created = songs_created_count
+                scan_run.songs_updated = songs_updated_count
+                scan_run.songs_removed = songs_removed_count
+                scan_run.save()
+                progress.report('syncing_changes', current=changes_processed)
+                if not results.get('nextPageToken'):
                     break
-                    
-            except Exception as e:
-                print(f"Error de API en búsqueda rápida: {e}")
-                break
-                
+        
+        remove_empty_albums_and_artists(user)
+
     # COVERS ONLY MODE: Only scan for album cover images
     elif scan_mode == 'covers_only':
-        self.update_state(state='PROGRESS', meta={'step': 'getting_existing_albums'})
+        progress.report('getting_existing_albums')
         albums_without_covers = Album.objects.filter(user=user, cover_image_id__isnull=True)
         
         # Create mapping of album names to album objects
@@ -369,65 +1203,373 @@ def scan_user_library(self, user_id, scan_mode='full'):
         album_folder_ids = []
         album_names = list(album_name_mapping.keys())
         
-        # Process album names in batches to avoid query length limits
+        # Album names are searched 10 per query to avoid query length limits,
+        # and the queries are sent together in Drive batch requests
+        name_search_requests = {}
         for i in range(0, len(album_names), 10):
             batch_names = album_names[i:i + 10]
             # Escape single quotes in album names for Google Drive query
             name_queries = ' or '.join([f"name='{name.replace(chr(39), chr(39)+chr(39))}'" for name in batch_names])
             folder_query = f"mimeType='application/vnd.google-apps.folder' and ({name_queries}) and trashed=false"
-            
-            try:
-                results = service.files().list(q=folder_query, pageSize=100, fields="files(id, name)").execute()
-                for folder in results.get('files', []):
-                    if folder['name'] in album_name_mapping:
-                        album_folder_ids.append(folder['id'])
-                        folder_cache[folder['id']] = folder
-            except Exception as e:
-                print(f"Error buscando carpetas de álbumes: {e}")
+            name_search_requests[i] = service.files().list(q=folder_query, pageSize=100, fields="files(id, name)")
+        
+        try:
+            with DriveFetcher(drive_client.credentials) as fetcher:
+                name_search_results = fetcher.execute_batch(service, name_search_requests)
+        except Exception as e:
+            print(f"Error buscando carpetas de álbumes: {e}")
+            name_search_results = {}
+        
+        for results in name_search_results.values():
+            if isinstance(results, Exception):
+                print(f"Error buscando carpetas de álbumes: {results}")
+                continue
+            for folder in results.get('files', []):
+                if folder['name'] in album_name_mapping:
+                    album_folder_ids.append(folder['id'])
+                    folder_cache[folder['id']] = folder
         
         album_folders_with_songs = set(album_folder_ids)
 
     # COVER ART SEARCH: Search for album cover images in album folders
     if album_folders_with_songs:
-        total_album_folders = len(album_folders_with_songs)
-        
-        for index, album_folder_id in enumerate(list(album_folders_with_songs)):
-            self.update_state(state='PROGRESS', meta={'step': 'covers', 'current': index + 1, 'total': total_album_folders})
-            try:
-                # Get folder metadata if not cached
-                if album_folder_id not in folder_cache:
-                    folder_cache[album_folder_id] = service.files().get(fileId=album_folder_id, fields='id, name').execute()
-
-                # Search for image files in the album folder
-                image_query = f"'{album_folder_id}' in parents and (mimeType='image/jpeg' or mimeType='image/png') and trashed=false"
-                results = service.files().list(q=image_query, pageSize=10, fields="files(id, name)").execute()
-                images = results.get('files', [])
-                
-                if images:
-                    # Prioritize common cover art filenames, fallback to first image found
-                    cover_file = next((f for f in images if f.get('name', '').lower() in ['cover.jpg', 'cover.png', 'folder.jpg', 'albumart.jpg']), images[0])
-                    album_meta = folder_cache.get(album_folder_id, {})
-                    
-                    # Update album with cover image ID
-                    Album.objects.filter(user=user, name=album_meta.get('name')).update(cover_image_id=cover_file.get('id'))
-                    covers_found_count += 1
-            except Exception as e:
-                print(f"Error buscando portada en carpeta {album_folder_id}: {e}")
+        progress.report('covers', current=0, total=len(album_folders_with_songs))
+        try:
+            with DriveFetcher(drive_client.credentials) as fetcher:
+                folder_images.update(fetch_folder_images(fetcher, service, list(album_folders_with_songs), folder_cache))
+        except Exception as e:
+            print(f"Error buscando portadas: {e}")
+        covers_found_count += assign_folder_covers(user, album_folders_with_songs, folder_images, folder_cache, progress)
+    
+    # Read tags of new and changed songs in the background
+    if scan_mode != 'covers_only':
+        try:
+            read_library_metadata.delay(user.id)
+        except Exception as e:
+            print(f"Error programando la lectura de metadatos: {e}")
+    
+    if scan_run is not None:
+        scan_run.covers_found = covers_found_count
+        scan_run.status = 'interrupted' if scan_interrupted else 'completed'
+        scan_run.finished_at = None if scan_interrupted else timezone.now()
+        scan_run.save()
+        # Store the changes token so the next sync only sees newer changes;
+        # after a failed page it is the token of that page, so any sync resumes there
+        if scan_run.page_token:
+            profile.drive_changes_token = scan_run.page_token
+            profile.save(update_fields=['drive_changes_token'])
+    
+    release_scan_lock(user_id, lock_mode, self.request.id)
+    return build_scan_message(
+        scan_mode, songs_created_count, songs_updated_count, songs_removed_count, covers_found_count, scan_interrupted
+    )
+
+def build_scan_message(scan_mode, songs_created_count, songs_updated_count, songs_removed_count, covers_found_count,
+                       interrupted=False):
+    """
+    Message shown to the user when a scan finishes
     
-    # Return appropriate success message based on scan mode
-    if scan_mode == 'quick':
+    Args:
+        scan_mode (str): Mode the scan ran in
+        songs_created_count (int): Songs added to the library
+        songs_updated_count (int): Songs whose file or location changed
+        songs_removed_count (int): Songs removed from the library
+        covers_found_count (int): Album covers found
+        interrupted (bool): Whether the scan stopped before going through the whole library
+        
+    Returns:
+        str: Success message with statistics for that mode
+    """
+    if scan_mode == 'sync':
+        songs_text = "canción nueva" if songs_created_count == 1 else "canciones nuevas"
+        songs_verb = "añadió" if songs_created_count == 1 else "añadieron"
+        updated_text = "actualizó 1 canción" if songs_updated_count == 1 else f"actualizaron {songs_updated_count} canciones"
+        removed_text = "eliminó 1 canción" if songs_removed_count == 1 else f"eliminaron {songs_removed_count} canciones"
+        message = f"¡Sincronización completada! Se {songs_verb} {songs_created_count} {songs_text}, se {updated_text} y se {removed_text}."
+    elif scan_mode == 'quick':
         songs_text = "canción nueva" if songs_created_count == 1 else "canciones nuevas"
         songs_verb = "añadió" if songs_created_count == 1 else "añadieron"
         covers_text = "portada nueva" if covers_found_count == 1 else "portadas nuevas"
         covers_verb = "encontró" if covers_found_count == 1 else "encontraron"
-        return f"¡Búsqueda rápida completada! Se {songs_verb} {songs_created_count} {songs_text} y se {covers_verb} {covers_found_count} {covers_text}."
+        message = f"¡Búsqueda rápida completada! Se {songs_verb} {songs_created_count} {songs_text} y se {covers_verb} {covers_found_count} {covers_text}."
     elif scan_mode == 'covers_only':
         covers_text = "portada nueva" if covers_found_count == 1 else "portadas nuevas"
         covers_verb = "encontró" if covers_found_count == 1 else "encontraron"
-        return f"¡Búsqueda de portadas completada! Se {covers_verb} {covers_found_count} {covers_text}."
+        message = f"¡Búsqueda de portadas completada! Se {covers_verb} {covers_found_count} {covers_text}."
     else:
         songs_text = "canción nueva" if songs_created_count == 1 else "canciones nuevas"
         songs_verb = "añadió" if songs_created_count == 1 else "añadieron"
         covers_text = "portada nueva" if covers_found_count == 1 else "portadas nuevas"
         covers_verb = "encontró" if covers_found_count == 1 else "encontraron"
-        return f"¡Escaneo completo! Se {songs_verb} {songs_created_count} {songs_text} y se {covers_verb} {covers_found_count} {covers_text}."
\ No newline at end of file
+        message = f"¡Escaneo completo! Se {songs_verb} {songs_created_count} {songs_text} y se {covers_verb} {covers_found_count} {covers_text}."
+    
+    if interrupted:
+        message += " El escaneo se interrumpió antes de terminar; puedes reanudarlo desde la página de escaneo."
+    return message
+
+@shared_task(bind=True, max_retries=SCAN_FOLDER_MAX_RETRIES)
+def scan_library_folder(self, scan_run_id, folder, counts=None):
+    """
+    Celery task scanning one top-level folder of the library, part of a full or quick scan
+    Songs already in the library are skipped, so a failed attempt is simply
+    retried from the start; once the retries run out the folder stays pending
+    in the scan's checkpoint and the rest of the scan carries on. The folder's
+    part of the folder mirror is written here, so a resumed scan needs
+    nothing from the folders it already finished
+    
+    Args:
+        self: Celery task instance for retries
+        scan_run_id (int): ScanRun of the scan this folder belongs to
+        folder (dict): Drive metadata (id, name, parents) of the top-level folder
+        counts (dict): Songs created and updated by earlier attempts, with
+            files_processed and covers_found at zero
+        
+    Returns:
+        dict: Totals of the folder (see counts) and interrupted, set if the
+        folder could not be listed completely
+    """
+    scan_run = ScanRun.objects.select_related('user').get(id=scan_run_id)
+    user = scan_run.user
+    counts = dict(counts or {'files_processed': 0, 'songs_created': 0, 'songs_updated': 0, 'covers_found': 0})
+    progress = ProgressReporter(self, task_id=scan_run.task_id)
+    progress_step = 'processing_new_files' if scan_run.scan_mode == 'quick' else 'processing_audio_files'
+    folder_cache = {folder['id']: folder}
+    # Folder ID -> images found in it, filled by the crawl for cover art
+    folder_images = {}
+    album_folders_with_songs = set()
+    # Folder ID -> Album ID for the local folder mirror
+    audio_folder_albums = {}
+    scan_interrupted = False
+    
+    try:
+        drive_client = get_drive_client(user)
+        service = drive_client.service
+        ingestor = LibraryIngestor(user)
+        
+        with DriveFetcher(drive_client.credentials) as fetcher:
+            for audio_files, folder_paths in crawl_library(
+                fetcher, service, folder['id'], folder_cache, folder_images, root_path=(folder['name'],)
+            ):
+                # Existing songs are not imported again (file ID -> (album ID, checksum))
+                existing_songs = {
+                    file_id: (album_id, checksum)
+                    for file_id, album_id, checksum in Song.objects.filter(
+                        user=user, google_file_id__in=[file_data['id'] for file_data in audio_files]
+                    ).values_list('google_file_id', 'album_id', 'md5_checksum')
+                }
+                # Existing songs whose Drive metadata differs from the stored one
+                changed_files = []
+                
+                for file_data in audio_files:
+                    counts['files_processed'] += 1
+                    folder_id = file_data['parents'][0]
+                    
+                    # Skip files already in database, but keep their folder in the mirror
+                    if file_data['id'] in existing_songs:
+                        album_id, checksum = existing_songs[file_data['id']]
+                        audio_folder_albums.setdefault(folder_id, album_id)
+                        if checksum is None or checksum != file_data.get('md5Checksum'):
+                            changed_files.append(file_data)
+                        continue
+                    
+                    # Artist and album come from the folder path found by the crawl
+                    folder_path = folder_paths[folder_id]
+                    if not ingestor.add(file_data, folder_path):
+                        print(f"No se pudo crear estructura para {file_data.get('name')} en ruta: {' / '.join(folder_path)}")
+                
+                # Write the page's new songs in one transaction
+                try:
+                    created_count, folder_albums = ingestor.flush()
+                    counts['songs_created'] += created_count
+                    counts['songs_updated'] += update_song_files(user, changed_files)
+                    # Track folders that contain songs for cover art search
+                    album_folders_with_songs.update(folder_albums.keys())
+                    audio_folder_albums.update(folder_albums)
+                except Exception as e:
+                    print(f"Error guardando canciones del lote: {e}")
+                
+                totals = add_task_counts(scan_run.task_id, files=len(audio_files))
+                progress.report(
+                    progress_step,
+                    current=totals.get('files'),
+                    folders_done=totals.get('folders_done', 0),
+                    folders_total=totals.get('folders_total'),
+                )
+    except Exception as e:
+        if self.request.retries < self.max_retries:
+            print(f"Error de API recorriendo la carpeta {folder['name']}, se reintentará: {e}")
+            # The retry lists the folder from the start, so its files are counted
+            # again; songs written so far stay counted, as the retry skips them
+            add_task_counts(scan_run.task_id, files=-counts['files_processed'])
+            raise self.retry(
+                exc=e,
+                countdown=SCAN_FOLDER_RETRY_SECONDS * 2 ** self.request.retries,
+                kwargs={'counts': {**counts, 'files_processed': 0}},
+            )
+        print(f"Error de API recorriendo la carpeta {folder['name']}: {e}")
+        scan_interrupted = True
+    
+    # The crawl listed every folder's images, so covers need no extra requests
+    counts['covers_found'] += assign_folder_covers(user, album_folders_with_songs, folder_images, folder_cache)
+    
+    # FOLDER MIRROR: Store this folder's tree for folder_browser
+    if scan_run.root_folder:
+        try:
+            sync_folder_mirror(user, scan_run.root_folder, folder_cache, audio_folder_albums)
+        except Exception as e:
+            print(f"Error guardando estructura de carpetas: {e}")
+    
+    # Checkpoint: a finished folder leaves the pending list, an interrupted one stays
+    record_scan_folder(scan_run.id, None if scan_interrupted else folder['id'], **counts)
+    add_task_counts(scan_run.task_id, folders_done=1)
+    return {**counts, 'interrupted': scan_interrupted}
+
+@shared_task(bind=True, publishes_progress=True)
+def finish_library_scan(self, folder_results, scan_run_id, lock_mode=None):
+    """
+    Celery chord callback completing a full or quick scan once every top-level folder is done
+    Runs under the ID of the scan_user_library task it replaced, so whoever
+    follows the scan receives its result. Totals come from the ScanRun, so a
+    resumed scan also counts what was done before it stopped
+    
+    Args:
+        self: Celery task instance for state updates
+        folder_results (list): Results of scan_library_folder, one per top-level folder
+        scan_run_id (int): ScanRun of the scan
+        lock_mode (str): Mode the scan was requested with, whose lock is released;
+            defaults to the scan's own mode
+        
+    Returns:
+        str: Success message with statistics about files processed
+    """
+    scan_run = ScanRun.objects.select_related('user').get(id=scan_run_id)
+    user = scan_run.user
+    progress = ProgressReporter(self)
+    # Folders still pending could not be listed, and neither could the root if none is known
+    scan_interrupted = scan_run.pending_folders is None or bool(scan_run.pending_folders)
+    
+    # A complete scan rewrote every mirrored folder it saw, drop the ones removed from Drive
+    if scan_run.root_folder and not scan_interrupted:
+        progress.report('saving_folders')
+        try:
+            DriveFolder.objects.filter(user=user, updated_at__lt=scan_run.started_at).exclude(
+                google_folder_id=scan_run.root_folder['id']
+            ).delete()
+        except Exception as e:
+            print(f"Error guardando estructura de carpetas: {e}")
+    
+    # Read tags of new and changed songs in the background
+    try:
+        read_library_metadata.delay(user.id)
+    except Exception as e:
+        print(f"Error programando la lectura de metadatos: {e}")
+    
+    # Store the changes token so the next sync only sees newer changes.
+    # An interrupted scan keeps the previous token so nothing is skipped.
+    if scan_run.page_token and not scan_interrupted:
+        UserProfile.objects.filter(user=user).update(drive_changes_token=scan_run.page_token)
+    
+    ScanRun.objects.filter(id=scan_run.id).update(
+        status='interrupted' if scan_interrupted else 'completed',
+        finished_at=None if scan_interrupted else timezone.now(),
+        updated_at=timezone.now(),
+    )
+    if self.request.id:
+        clear_task_counts(self.request.id)
+    release_scan_lock(user.id, lock_mode or scan_run.scan_mode, self.request.id)
+    return build_scan_message(
+        scan_run.scan_mode, scan_run.songs_created, scan_run.songs_updated, 0, scan_run.covers_found, scan_interrupted
+    )
+
+@shared_task(bind=True)
+def read_library_metadata(self, user_id):
+    """
+    Celery task filling song metadata from the audio files themselves
+    Reads duration, bitrate and tags of every song not read yet, downloading
+    only the file headers through ranged requests (see player.metadata)
+    
+    Args:
+        self: Celery task instance for state updates
+        user_id (int): ID of the user whose songs to read
+        
+    Returns:
+        str: Message with the number of songs read
+    """
+    user = User.objects.get(id=user_id)
+    drive_client = get_drive_client(user)
+    service = drive_client.service
+    songs_read_count = 0
+    last_song_id = 0
+    progress = ProgressReporter(self)
+    
+    with DriveFetcher(drive_client.credentials) as fetcher:
+        def read_song(song):
+            return read_audio_metadata(fetcher, service, song.google_file_id, song.name)
+        
+        while True:
+            songs = list(Song.objects.filter(
+                user=user, metadata_read_at__isnull=True, id__gt=last_song_id
+            ).order_by('id')[:METADATA_BATCH_SIZE])
+            if not songs:
+                break
+            last_song_id = songs[-1].id
+            
+            read_songs = []
+            for song, metadata, error in fetcher.map(read_song, songs):
+                # Only a read that ended is stored; unrecognised formats end
+                # with empty metadata. Failed songs are read again on the next run
+                if isinstance(error, (OSError, GoogleAuthError)):
+                    print(f"Error descargando cabeceras de {song.name}: {error}")
+                    continue
+                if error is not None:
+                    print(f"Error leyendo metadatos de {song.name}: {error}")
+                    continue
+                apply_song_metadata(song, metadata)
+                read_songs.append(song)
+            
+            with transaction.atomic():
+                Song.objects.bulk_update(read_songs, METADATA_FIELDS, batch_size=INGEST_BATCH_SIZE)
+                # Playlist durations include the songs just read
+                refresh_playlist_totals(set(PlaylistSong.objects.filter(
+                    song__in=read_songs
+                ).values_list('playlist_id', flat=True)))
+            
+            songs_read_count += len(read_songs)
+            progress.report('reading_metadata', current=songs_read_count)
+    
+    songs_text = "canción" if songs_read_count == 1 else "canciones"
+    return f"Se leyeron los metadatos de {songs_read_count} {songs_text}."
+
+@shared_task
+def prefetch_song(user_id, file_id):
+    """
+    Celery task downloading a queued song into the local audio cache
+    Started while the previous track is still playing, so the next /play/
+    request is served from disk without waiting on Drive
+    
+    Args:
+        user_id (int): ID of the user who queued the song
+        file_id (str): Google Drive file ID of the song
+        
+    Returns:
+        str: What was done, for the task result
+    """
+    if not audio_cache.is_cache_enabled() or audio_cache.is_cached(file_id):
+        return f"{file_id} ya está en caché."
+    
+    song = Song.objects.select_related('user').filter(user_id=user_id, google_file_id=file_id).first()
+    if song is None:
+        return f"{file_id} no pertenece a la biblioteca."
+    
+    drive_client = get_drive_client(song.user)
+    service = drive_client.service
+    if song.size is None:
+        refresh_song_file(service, song)
+    file_size = song.size
+    media_uri = service.files().get_media(fileId=file_id).uri
+    
+    # Consuming the stream is what writes the cache entry
+    chunks = iter_drive_media(drive_client.session, media_uri, 0, file_size - 1, file_size=file_size)
+    for _ in audio_cache.stream_into_cache(file_id, chunks, file_size):
+        pass
+    return f"{file_id} precargada ({file_size} bytes)."
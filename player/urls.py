@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
@@ -23,30 +24,42 @@ urlpatterns = [
 
     path('album/<int:album_id>/cover/', views.album_cover, name='album_cover'),
     path('liked/', views.liked_songs, name='liked_songs'),
+    path('search/', views.search, name='search'),
     
     path('playlists/', views.playlist_list, name='playlist_list'),
     path('playlist/<int:playlist_id>/', views.playlist_detail, name='playlist_detail'),
     path('playlist/create/', views.create_playlist, name='create_playlist'),
     path('edit-playlist/<int:playlist_id>/', views.edit_playlist, name='edit_playlist'),
     path('reorder-playlist/<int:playlist_id>/', views.reorder_playlist, name='reorder_playlist'),
+    path('move-playlist-song/<int:playlist_id>/', views.move_playlist_song, name='move_playlist_song'),
     path('remove-from-playlist/<int:playlist_id>/<str:song_id>/', views.remove_from_playlist, name='remove_from_playlist'),
     path('get-user-playlists/', views.get_user_playlists, name='get_user_playlists'),
     path('add-to-playlist/<str:song_id>/<int:playlist_id>/', views.add_to_playlist, name='add_to_playlist'),
+    path('add-songs-to-playlist/<int:playlist_id>/', views.add_songs_to_playlist, name='add_songs_to_playlist'),
     path('delete-playlist/<int:playlist_id>/', views.delete_playlist, name='delete_playlist'),
 
     
     
-    path('play/<str:file_id>/', views.play_song, name='play_song'),
+    path('play/<str:file_id>/', views.play_song_async if settings.ASYNC_AUDIO_STREAMING else views.play_song, name='play_song'),
+    path('queue/', views.queue, name='queue'),
+    path('queue/add/', views.queue_add, name='queue_add'),
+    path('queue/next/', views.queue_next, name='queue_next'),
+    path('queue/clear/', views.queue_clear, name='queue_clear'),
+    path('queue/progress/', views.queue_progress, name='queue_progress'),
     
 
     path('start-scan/', views.start_scan_task, name='start_scan_task'),
     path('start-quick-scan/', views.start_quick_scan_task, name='start_quick_scan_task'),
+    path('start-sync/', views.start_sync_task, name='start_sync_task'),
     path('start-cover-scan/', views.start_cover_scan_task, name='start_cover_scan_task'),
+    path('resume-scan/', views.resume_scan_task, name='resume_scan_task'),
     path('task-status/<str:task_id>/', views.task_status, name='task_status'),
+    path('task-events/<str:task_id>/', views.task_events, name='task_events'),
     
 
     path('account/', views.account, name='account'),
     path('upload-avatar/', views.upload_avatar, name='upload_avatar'),
     path('unlink-service/', views.unlink_service, name='unlink_service'),
     path('toggle-like/<str:song_id>/', views.toggle_like_song, name='toggle_like_song'),
+    path('like-songs/', views.like_songs, name='like_songs'),
 ]
\ No newline at end of file
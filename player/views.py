@@ -1,32 +1,44 @@
 # Django core imports
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import StreamingHttpResponse, JsonResponse, HttpResponse, Http404
+from django.http import StreamingHttpResponse, JsonResponse, HttpResponse, Http404, FileResponse
 from django.contrib.auth.decorators import login_required
 # Google OAuth and Drive API imports
 from google_auth_oauthlib.flow import Flow
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload
 # Local model imports
-from .models import UserProfile, GoogleCredential, Artist, Album, Song, LikedSong, Playlist, PlaylistSong
+from .models import UserProfile, GoogleCredential, Artist, Album, Song, LikedSong, Playlist, PlaylistSong, DriveFolder, QueueEntry
+# Pooled Drive clients and audio streaming helpers
+from .streaming import (
+    parse_range_header, iter_drive_media, start_stream, build_file_response,
+    range_not_satisfiable_response, set_range_headers, RangeNotSatisfiable,
+    get_async_http_client, aiter_drive_media, astart_stream
+)
+from .drive import get_drive_client, get_drive_service, discard_drive_clients
+from . import audio_cache, cover_store
+from .search import search_songs
+from .pagination import paginate_keyset
+from .playlists import append_playlist_songs, reorder_playlist_songs, move_playlist_entry, remove_playlist_entry
+from .play_queue import get_queue, enqueue_songs, pop_next_song, should_prefetch, claim_next_prefetch
+from .progress import get_task_state, iter_task_events
+from .scan_lock import start_scan
 # Celery task imports for background processing
-from .tasks import scan_user_library
-from celery.result import AsyncResult
+from .tasks import scan_user_library, prefetch_song, refresh_song_file, get_resumable_scan_run
 from django.templatetags.static import static
 import os
-import io
-import json
-import requests
+import httpx
 import requests
+from asgiref.sync import sync_to_async
 from django.utils import timezone
-from django.db import models
+from django.db.models.functions import Lower
 from django.conf import settings 
 from django.urls import reverse
+from django.utils.http import parse_etags, quote_etag
 
 # Google OAuth configuration
 CLIENT_SECRETS_FILE = os.path.join(os.path.dirname(__file__), '..', 'credentials', 'client_secret.json')
 # Read-only access to Google Drive files
 SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
+# Songs per page in the liked songs and playlist views
+SONG_PAGE_SIZE = 100
 # Allow insecure transport for development (localhost)
 os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
 
@@ -133,12 +145,14 @@ def unlink_service(request):
         print(f"Error eliminando playlists del usuario durante unlink_service: {e}")
 
     # Delete all user's music library data
+    DriveFolder.objects.filter(user=user).delete()
     Song.objects.filter(user=user).delete()
     Album.objects.filter(user=user).delete()
     Artist.objects.filter(user=user).delete()
     
-    # Remove Google credentials
+    # Remove Google credentials and any pooled Drive clients using them
     GoogleCredential.objects.filter(user=user).delete()
+    discard_drive_clients(user)
     
     # Reset Google Drive root folder ID
     try:
@@ -186,13 +200,10 @@ def select_folder(request):
     Shows both regular folders and shortcuts to folders.
     """
     try:
-        # Get user's Google Drive credentials
-        creds_model = GoogleCredential.objects.get(user=request.user)
-        creds = Credentials.from_authorized_user_info(json.loads(creds_model.token_json))
+        # Get the pooled Drive service for the user's credentials
+        service = get_drive_service(request.user)
     except GoogleCredential.DoesNotExist:
         return redirect('google_login')
-        
-    service = build('drive', 'v3', credentials=creds)
     
     # Query for regular folders in root directory
     folder_query = "mimeType='application/vnd.google-apps.folder' and 'root' in parents and trashed=false"
@@ -252,28 +263,59 @@ def set_folder(request, folder_id):
 def scan_prompt(request):
     """
     Displays the scan prompt page with options for different scan types.
-    Shows whether user already has songs in their library.
+    Shows whether user already has songs in their library, and offers to
+    resume the last scan if it stopped before finishing.
     """
     has_songs = Song.objects.filter(user=request.user).exists()
-    return render(request, 'player/scan_prompt.html', {'has_songs': has_songs})
+    return render(request, 'player/scan_prompt.html', {
+        'has_songs': has_songs,
+        'resumable_scan': get_resumable_scan_run(request.user),
+    })
 
 @login_required
 def start_quick_scan_task(request):
     """
     Starts a quick scan task that only processes new songs.
-    Returns task ID for status monitoring.
+    Returns task ID for status monitoring, the running scan's if there is one.
+    """
+    task_id, created = start_scan(scan_user_library, request.user.id, 'quick')
+    return JsonResponse({'task_id': task_id, 'already_running': not created})
+
+@login_required
+def start_sync_task(request):
+    """
+    Starts an incremental sync task that applies only the Drive changes
+    made since the last scan (additions, renames, moves and deletions).
+    Without a stored changes token there is nothing to sync against, so a
+    quick scan runs instead, under the quick scan's lock.
+    Returns task ID for status monitoring, the running scan's if there is one.
+    """
+    has_changes_token = UserProfile.objects.filter(
+        user=request.user, drive_changes_token__isnull=False
+    ).exclude(drive_changes_token='').exists()
+    task_id, created = start_scan(scan_user_library, request.user.id, 'sync' if has_changes_token else 'quick')
+    return JsonResponse({'task_id': task_id, 'already_running': not created})
+
+@login_required
+def resume_scan_task(request):
+    """
+    Resumes the user's last scan from its checkpoint, if it was interrupted.
+    Returns task ID for status monitoring, the running scan's if there is one.
     """
-    task = scan_user_library.delay(request.user.id, scan_mode='quick')
-    return JsonResponse({'task_id': task.id})
+    scan_run = get_resumable_scan_run(request.user)
+    if scan_run is None:
+        return JsonResponse({'error': 'No hay ningún escaneo interrumpido que reanudar.'}, status=404)
+    task_id, created = start_scan(scan_user_library, request.user.id, scan_run.scan_mode, scan_run_id=scan_run.id)
+    return JsonResponse({'task_id': task_id, 'already_running': not created})
 
 @login_required
 def start_cover_scan_task(request):
     """
     Starts a scan task that only looks for album cover images.
-    Returns task ID for status monitoring.
+    Returns task ID for status monitoring, the running search's if there is one.
     """
-    task = scan_user_library.delay(request.user.id, scan_mode='covers_only')
-    return JsonResponse({'task_id': task.id})
+    task_id, created = start_scan(scan_user_library, request.user.id, 'covers_only')
+    return JsonResponse({'task_id': task_id, 'already_running': not created})
 
 @login_required
 def artist_list(request):
@@ -291,23 +333,73 @@ def folder_browser(request, folder_id=None):
     and displays songs with metadata if available.
     """
     try:
-        # Get user's Google Drive credentials and root folder
-        creds_model = GoogleCredential.objects.get(user=request.user)
-        creds = Credentials.from_authorized_user_info(json.loads(creds_model.token_json))
+        # Get user's root folder
         profile = UserProfile.objects.get(user=request.user)
         root_folder_id = profile.google_drive_root_id
         
         if not root_folder_id:
             return redirect('select_folder')
             
-    except (GoogleCredential.DoesNotExist, UserProfile.DoesNotExist):
+    except UserProfile.DoesNotExist:
         return redirect('google_login')
     
-    service = build('drive', 'v3', credentials=creds)
-    
     # Use provided folder_id or default to root
     current_folder_id = folder_id or root_folder_id
     
+    # Render from the local folder mirror when the scanner already stored this folder
+    mirrored_folder = DriveFolder.objects.filter(
+        user=request.user, google_folder_id=current_folder_id
+    ).select_related('album__artist').first()
+    
+    if mirrored_folder:
+        # Build breadcrumb from the stored parent chain, loading the user's
+        # folders in one query and walking them in memory
+        ancestors = {
+            folder_pk: (parent_pk, google_folder_id, name)
+            for folder_pk, parent_pk, google_folder_id, name in DriveFolder.objects.filter(
+                user=request.user
+            ).values_list('id', 'parent_id', 'google_folder_id', 'name')
+        }
+        breadcrumb = []
+        folder_node = (mirrored_folder.parent_id, mirrored_folder.google_folder_id, mirrored_folder.name)
+        while folder_node and folder_node[1] != root_folder_id:
+            breadcrumb.insert(0, {'id': folder_node[1], 'name': folder_node[2]})
+            folder_node = ancestors.get(folder_node[0])
+        
+        subfolders = [
+            {'id': google_folder_id, 'name': name}
+            for google_folder_id, name in mirrored_folder.subfolders.order_by(Lower('name')).values_list('google_folder_id', 'name')
+        ]
+        
+        album = mirrored_folder.album if mirrored_folder.has_audio else None
+        songs = []
+        liked_songs_ids = set()
+        if album:
+            songs = Song.objects.filter(album=album, user=request.user).order_by('track_number', 'name')
+            liked_songs_ids = set(LikedSong.objects.filter(
+                user=request.user, 
+                song__in=songs
+            ).values_list('song_id', flat=True))
+        
+        context = {
+            'current_folder': {'id': mirrored_folder.google_folder_id, 'name': mirrored_folder.name},
+            'subfolders': subfolders,
+            'breadcrumb': breadcrumb,
+            'has_songs': mirrored_folder.has_audio,
+            'album': album,
+            'songs': songs,
+            'liked_songs_ids': liked_songs_ids,
+            'is_root': current_folder_id == root_folder_id,
+            'playlists': Playlist.objects.filter(user=request.user),
+        }
+        return render(request, 'player/folder_browser.html', context)
+    
+    # Folder not scanned yet, browse it live on Google Drive
+    try:
+        service = get_drive_service(request.user)
+    except GoogleCredential.DoesNotExist:
+        return redirect('google_login')
+    
     # Get current folder information
     try:
         current_folder = service.files().get(fileId=current_folder_id, fields='id, name, parents').execute()
@@ -382,7 +474,6 @@ def folder_browser(request, folder_id=None):
                 songs = Song.objects.filter(album=album, user=request.user).order_by('track_number', 'name')
                 
                 # Get IDs of songs that user has liked
-                from .models import LikedSong
                 liked_songs_ids = set(LikedSong.objects.filter(
                     user=request.user, 
                     song__in=songs
@@ -419,7 +510,10 @@ def artist_detail(request, artist_id):
 @login_required
 def album_cover(request, album_id):
     """
-    Serves album cover images from Google Drive.
+    Serves album cover images from the local cover store.
+    Each cover is fetched from Google Drive once, in every size variant,
+    and then served from disk with a content-hash ETag. URLs versioned
+    with the current cover ID (?v=) are cached by the browser for good.
     Falls back to default cover if no image is available.
     """
     album = get_object_or_404(Album, id=album_id, user=request.user)
@@ -428,114 +522,327 @@ def album_cover(request, album_id):
     if not album.cover_image_id:
         return redirect(static('images/default_cover.png'))
 
-    try:
-        # Get user's Google Drive credentials
-        creds_model = GoogleCredential.objects.get(user=request.user)
-        creds = Credentials.from_authorized_user_info(json.loads(creds_model.token_json))
-        service = build('drive', 'v3', credentials=creds)
-        
-        # Get file metadata to check for thumbnail
-        file_metadata = service.files().get(
-            fileId=album.cover_image_id, 
-            fields='thumbnailLink'
-        ).execute()
+    size = cover_store.normalize_size(request.GET.get('size'))
+    cover = cover_store.open_cover(album.cover_image_id, size)
 
-        thumbnail_link = file_metadata.get('thumbnailLink')
-        
-        # Use Google's thumbnail if available (faster)
-        if thumbnail_link:
-            return redirect(thumbnail_link)
-        else:
-            # Download full image if no thumbnail available
-            request_download = service.files().get_media(fileId=album.cover_image_id)
-            fh = io.BytesIO()
-            downloader = MediaIoBaseDownload(fh, request_download)
-            done = False
-            while not done:
-                status, done = downloader.next_chunk()
-            fh.seek(0)
-            return HttpResponse(fh.read(), content_type='image/jpeg')
-
-    except Exception:
-        # Return default cover on any error
-        return redirect(static('images/default_cover.png'))
+    if cover is None:
+        try:
+            # First request for this cover: store all its variants locally
+            drive_client = get_drive_client(request.user)
+            if cover_store.fetch_cover(drive_client, album.cover_image_id):
+                cover = cover_store.open_cover(album.cover_image_id, size)
+        except Exception as e:
+            print(f"Error obteniendo portada del álbum {album_id}: {e}")
+        if cover is None:
+            # Return default cover on any error, or while Drive has no thumbnail
+            return redirect(static('images/default_cover.png'))
+
+    cover_file, etag, content_type = cover
+    if request.GET.get('v') == album.cover_image_id:
+        # The URL changes whenever the album gets a new cover
+        cache_control = 'private, max-age=31536000, immutable'
+    else:
+        cache_control = 'private, no-cache'
+
+    etag = quote_etag(etag)
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        cover_file.close()
+        response = HttpResponse(status=304)
+    else:
+        response = FileResponse(cover_file, content_type=content_type)
+    response['ETag'] = etag
+    response['Cache-Control'] = cache_control
+    return response
 
 
 @login_required
 def play_song(request, file_id):
     """
     Streams audio files from Google Drive.
-    Validates user permissions and provides chunked streaming for large files.
+    Validates user permissions and honours HTTP Range requests so the
+    browser can seek without downloading the whole file.
+    Songs already in the local audio cache are served from disk.
     """
     try:
-        # Verify song belongs to user and get credentials
+        # Verify song belongs to user
         song = Song.objects.get(google_file_id=file_id, user=request.user)
-        creds_model = GoogleCredential.objects.get(user=request.user)
-        creds = Credentials.from_authorized_user_info(json.loads(creds_model.token_json))
-    except (Song.DoesNotExist, GoogleCredential.DoesNotExist):
+    except Song.DoesNotExist:
+        raise Http404("No se encontró la canción o las credenciales.")
+
+    range_header = request.headers.get('Range')
+
+    # Serve repeat plays from the local cache without touching Drive
+    cached_file = audio_cache.open_cached_file(file_id)
+    if cached_file:
+        return build_file_response(range_header, cached_file, song.mime_type or 'audio/mpeg')
+
+    try:
+        drive_client = get_drive_client(request.user)
+    except GoogleCredential.DoesNotExist:
         raise Http404("No se encontró la canción o las credenciales.")
         
-    service = build('drive', 'v3', credentials=creds)
-    # Get file metadata for proper MIME type and size
-    file_metadata = service.files().get(fileId=file_id, fields='mimeType, size').execute()
-    mime_type = file_metadata.get('mimeType', 'audio/mpeg')
-    request_download = service.files().get_media(fileId=file_id)
-    fh = io.BytesIO()
-    # Use 1MB chunks for efficient streaming
-    downloader = MediaIoBaseDownload(fh, request_download, chunksize=1024*1024)
-
-    def stream_content_generator():
-        """Generator function for streaming audio data in chunks."""
-        done = False
-        while not done:
-            status, done = downloader.next_chunk()
-            chunk = fh.getvalue()
-            fh.seek(0)
-            fh.truncate(0)
-            yield chunk
-
-    # Return streaming response with proper headers
-    response = StreamingHttpResponse(stream_content_generator(), content_type=mime_type)
-    response['Content-Length'] = file_metadata.get('size')
+    service = drive_client.service
+    media_uri = service.files().get_media(fileId=file_id).uri
+
+    # Size and MIME type come from the last scan; Drive is only asked again when
+    # they are missing or the download shows they are out of date
+    revalidated = song.size is None
+    if revalidated:
+        refresh_song_file(service, song)
+
+    while True:
+        try:
+            # Resolve the requested byte range (None means the whole file)
+            byte_range = parse_range_header(range_header, song.size)
+            start, end = byte_range if byte_range else (0, song.size - 1)
+            # Only the requested bytes are fetched, streamed straight from the Drive socket.
+            # The first chunk is fetched now so a stale size is caught before answering
+            content = start_stream(iter_drive_media(drive_client.session, media_uri, start, end, file_size=song.size))
+            break
+        except RangeNotSatisfiable:
+            if revalidated:
+                return range_not_satisfiable_response(song.size)
+        except requests.HTTPError:
+            if revalidated:
+                raise
+        refresh_song_file(service, song)
+        revalidated = True
+
+    file_size = song.size
+    mime_type = song.mime_type or 'audio/mpeg'
+    if start == 0 and end == file_size - 1:
+        # Whole file requested, keep a copy on disk for the next play
+        content = audio_cache.stream_into_cache(file_id, content, file_size)
+
+    response = StreamingHttpResponse(
+        content,
+        content_type=mime_type,
+        status=206 if byte_range else 200
+    )
+    set_range_headers(response, byte_range, start, end, file_size)
+    return response
+
+@login_required
+async def play_song_async(request, file_id):
+    """
+    Asynchronous version of play_song for ASGI servers (ASYNC_AUDIO_STREAMING).
+    Drive media is relayed from an async generator over a shared async HTTP
+    client, so a listener holds no worker thread while the song plays. Each
+    chunk is only read from Drive once the previous one was sent to the browser.
+    """
+    user = await request.auser()
+    song = await Song.objects.filter(google_file_id=file_id, user=user).afirst()
+    if song is None:
+        raise Http404("No se encontró la canción o las credenciales.")
+
+    range_header = request.headers.get('Range')
+
+    # Serve repeat plays from the local cache without touching Drive
+    cached_file = audio_cache.open_cached_file(file_id)
+    if cached_file:
+        return build_file_response(range_header, cached_file, song.mime_type or 'audio/mpeg')
+
+    try:
+        drive_client = await sync_to_async(get_drive_client)(user)
+    except GoogleCredential.DoesNotExist:
+        raise Http404("No se encontró la canción o las credenciales.")
+
+    service = drive_client.service
+    media_uri = service.files().get_media(fileId=file_id).uri
+
+    # Same revalidation as play_song: Drive is only asked for the file's
+    # details when they are missing or the download shows they are stale
+    revalidated = song.size is None
+    if revalidated:
+        await sync_to_async(refresh_song_file)(service, song)
+
+    while True:
+        try:
+            byte_range = parse_range_header(range_header, song.size)
+            start, end = byte_range if byte_range else (0, song.size - 1)
+            content = await astart_stream(aiter_drive_media(
+                get_async_http_client(), media_uri, drive_client.credentials.token, start, end, file_size=song.size
+            ))
+            break
+        except RangeNotSatisfiable:
+            if revalidated:
+                return range_not_satisfiable_response(song.size)
+        except httpx.HTTPStatusError:
+            if revalidated:
+                raise
+        # Also refreshes an access token that expired since the client was fetched
+        await sync_to_async(refresh_song_file)(service, song)
+        revalidated = True
+
+    file_size = song.size
+    if start == 0 and end == file_size - 1:
+        # Whole file requested, keep a copy on disk for the next play
+        content = audio_cache.astream_into_cache(file_id, content, file_size)
+
+    response = StreamingHttpResponse(
+        content,
+        content_type=song.mime_type or 'audio/mpeg',
+        status=206 if byte_range else 200
+    )
+    set_range_headers(response, byte_range, start, end, file_size)
     return response
 
+@login_required
+def queue(request):
+    """
+    Returns JSON data of the songs waiting in the user's playback queue.
+    """
+    return JsonResponse({'songs': get_queue(request.user)})
+
+@login_required
+def queue_add(request):
+    """
+    Adds songs to the end of the user's playback queue.
+    """
+    if request.method == 'POST':
+        song_ids = request.POST.getlist('song_ids[]')
+        if not song_ids:
+            return JsonResponse({'error': 'No se indicaron pistas'}, status=400)
+        
+        added = enqueue_songs(request.user, song_ids)
+        return JsonResponse({'success': True, 'added': added})
+    return JsonResponse({'error': 'Método no permitido'}, status=405)
+
+@login_required
+def queue_next(request):
+    """
+    Takes the next song off the user's playback queue.
+    Returns it as {'song': {'id', 'name'}}, or {'song': None} when the queue is empty.
+    """
+    if request.method == 'POST':
+        return JsonResponse({'song': pop_next_song(request.user)})
+    return JsonResponse({'error': 'Método no permitido'}, status=405)
+
+@login_required
+def queue_clear(request):
+    """
+    Empties the user's playback queue.
+    """
+    if request.method == 'POST':
+        QueueEntry.objects.filter(user=request.user).delete()
+        return JsonResponse({'success': True})
+    return JsonResponse({'error': 'Método no permitido'}, status=405)
+
+@login_required
+def queue_progress(request):
+    """
+    Receives the playback position of the current track.
+    Once it passes the prefetch threshold, the next queued song is downloaded
+    into the audio cache in the background so it starts without a gap.
+    """
+    if request.method == 'POST':
+        try:
+            position = float(request.POST.get('position', 0))
+            duration = float(request.POST.get('duration', 0))
+        except ValueError:
+            return JsonResponse({'error': 'Posición no válida'}, status=400)
+        
+        prefetching = None
+        if audio_cache.is_cache_enabled() and should_prefetch(position, duration):
+            prefetching = claim_next_prefetch(request.user)
+            if prefetching and not audio_cache.is_cached(prefetching):
+                try:
+                    prefetch_song.delay(request.user.id, prefetching)
+                except Exception as e:
+                    print(f"Error programando la precarga de {prefetching}: {e}")
+        return JsonResponse({'success': True, 'prefetching': prefetching})
+    return JsonResponse({'error': 'Método no permitido'}, status=405)
+
 @login_required
 def liked_songs(request):
     """
-    Displays all songs that the user has liked.
-    Ordered by most recently liked first.
+    Displays the songs that the user has liked, one page at a time.
+    Ordered by most recently liked first; further pages are requested
+    with the cursor of the previous one as the list scrolls.
     """
-    liked_songs_through = LikedSong.objects.filter(user=request.user).order_by('-created_at')
-    songs = [liked.song for liked in liked_songs_through]
+    cursor = request.GET.get('cursor')
+    likes = LikedSong.objects.filter(user=request.user).select_related('song__artist', 'song__album')
+    try:
+        likes_page, next_cursor = paginate_keyset(likes, ('created_at', 'id'), cursor, SONG_PAGE_SIZE, descending=True)
+    except ValueError:
+        raise Http404("Página no encontrada.")
+    songs = [liked.song for liked in likes_page]
+    
+    context = {'songs': songs, 'next_cursor': next_cursor}
+    if cursor:
+        return render(request, 'player/partials/liked_song_items.html', context)
     
     # Choose appropriate base template for HTMX requests
     base_template = "base.html" if not request.htmx or request.htmx.history_restore_request else "_base_empty.html"
     
-    context = {'songs': songs, 'base_template': base_template}
+    context.update({
+        'base_template': base_template,
+        'total_songs': LikedSong.objects.filter(user=request.user).count(),
+    })
     return render(request, 'player/liked_songs.html', context)
 
+@login_required
+def search(request):
+    """
+    Searches the user's library by song title, file name, artist and album.
+    HTMX requests from the search box get only the ranked results, and
+    further pages are appended as the list scrolls into view.
+    """
+    query = request.GET.get('q', '').strip()
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+
+    songs, has_more = search_songs(request.user, query, page)
+    liked_songs_ids = set(LikedSong.objects.filter(
+        user=request.user, song__in=songs
+    ).values_list('song_id', flat=True))
+
+    context = {
+        'query': query,
+        'songs': songs,
+        'liked_songs_ids': liked_songs_ids,
+        'has_more': has_more,
+        'next_page': page + 1,
+    }
+
+    # Next page of an existing result list
+    if request.htmx and page > 1:
+        return render(request, 'player/partials/search_result_items.html', context)
+    # Results for a new query typed in the search box
+    if request.htmx and request.htmx.target == 'search-results':
+        return render(request, 'player/partials/search_results.html', context)
+    return render(request, 'player/search.html', context)
+
 @login_required
 def start_scan_task(request):
     """
     Starts a full library scan task that processes all music files.
-    Returns task ID for status monitoring.
+    Returns task ID for status monitoring, the running scan's if there is one.
     """
-    task = scan_user_library.delay(request.user.id, scan_mode='full')
-    return JsonResponse({'task_id': task.id})
+    task_id, created = start_scan(scan_user_library, request.user.id, 'full')
+    return JsonResponse({'task_id': task_id, 'already_running': not created})
 
 @login_required
 def task_status(request, task_id):
     """
     Returns the current status of a Celery background task.
-    Used for monitoring scan progress via AJAX.
+    Fallback for browsers that cannot open the task_events stream.
     """
-    task_result = AsyncResult(task_id)
-    result = {
-        'task_id': task_id,
-        'status': task_result.status,
-        'info': task_result.info,
-    }
-    return JsonResponse(result)
+    return JsonResponse({'task_id': task_id, **get_task_state(task_id)})
+
+@login_required
+def task_events(request, task_id):
+    """
+    Streams the progress of a Celery background task as Server-Sent Events.
+    The task pushes its updates through Redis, so nothing is polled while it runs.
+    """
+    response = StreamingHttpResponse(iter_task_events(task_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Keeps reverse proxies from buffering the events
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 @login_required
 def toggle_like_song(request, song_id):
@@ -586,37 +893,72 @@ def toggle_like_song(request, song_id):
     
     return JsonResponse({'error': 'Método no permitido'}, status=405)
 
+@login_required
+def like_songs(request):
+    """
+    Likes several songs in one request, e.g. a whole album.
+    Songs the user already likes keep their original like date.
+    """
+    if request.method == 'POST':
+        song_ids = request.POST.getlist('song_ids[]')
+        if not song_ids:
+            return JsonResponse({'error': 'No se indicaron pistas'}, status=400)
+        
+        song_pks = list(Song.objects.filter(user=request.user, google_file_id__in=song_ids).values_list('id', flat=True))
+        already_liked = set(LikedSong.objects.filter(user=request.user, song_id__in=song_pks).values_list('song_id', flat=True))
+        LikedSong.objects.bulk_create(
+            [LikedSong(user=request.user, song_id=song_pk) for song_pk in song_pks if song_pk not in already_liked],
+            ignore_conflicts=True
+        )
+        return JsonResponse({'success': True, 'liked': len(song_pks) - len(already_liked)})
+    
+    return JsonResponse({'error': 'Método no permitido'}, status=405)
+
 @login_required
 def playlist_list(request):
     """
     Displays all playlists belonging to the current user.
-    Includes song count for each playlist.
+    Includes the stored song count of each playlist.
     """
-    playlists = Playlist.objects.filter(user=request.user).prefetch_related('songs')
+    playlists = Playlist.objects.filter(user=request.user)
     return render(request, 'player/playlist_list.html', {'playlists': playlists})
 
 @login_required
 def playlist_detail(request, playlist_id):
     """
-    Displays detailed view of a specific playlist with all its songs.
-    Shows which songs are liked by the user.
+    Displays detailed view of a specific playlist, one page of songs at a time.
+    Shows which songs are liked by the user. Further pages are requested
+    with the cursor of the previous one as the list scrolls.
     """
     playlist = get_object_or_404(Playlist, id=playlist_id, user=request.user)
+    cursor = request.GET.get('cursor')
 
     # Get playlist songs in proper order
-    playlist_songs = PlaylistSong.objects.filter(playlist=playlist).order_by('order', 'date_added')
+    playlist_songs = PlaylistSong.objects.filter(playlist=playlist).select_related('song__artist', 'song__album')
+    try:
+        playlist_songs, next_cursor = paginate_keyset(
+            playlist_songs, ('order', 'date_added', 'id'), cursor, SONG_PAGE_SIZE
+        )
+    except ValueError:
+        raise Http404("Página no encontrada.")
     
-    # Get IDs of songs that user has liked
+    # Get IDs of songs on this page that user has liked
     liked_songs_ids = set(LikedSong.objects.filter(
         user=request.user, 
-        song__in=[ps.song for ps in playlist_songs]
+        song_id__in=[ps.song_id for ps in playlist_songs]
     ).values_list('song_id', flat=True))
     
-    return render(request, 'player/playlist_detail.html', {
+    context = {
         'playlist': playlist,
         'playlist_songs': playlist_songs,
-        'liked_songs_ids': liked_songs_ids
-    })
+        'liked_songs_ids': liked_songs_ids,
+        'next_cursor': next_cursor,
+    }
+    if cursor:
+        return render(request, 'player/partials/playlist_song_items.html', context)
+    
+    context['total_songs'] = playlist.song_count
+    return render(request, 'player/playlist_detail.html', context)
 
 @login_required
 def create_playlist(request):
@@ -705,23 +1047,12 @@ def add_to_playlist(request, song_id, playlist_id):
     if request.method == 'POST':
         try:
             playlist = Playlist.objects.get(id=playlist_id, user=request.user)
-            song = Song.objects.get(google_file_id=song_id)
+            song = Song.objects.get(google_file_id=song_id, user=request.user)
             
-            # Check if song is already in playlist
-            if PlaylistSong.objects.filter(playlist=playlist, song=song).exists():
+            # Add song to end of playlist, updating its song count; nothing is
+            # added if the song is already in the playlist
+            if not append_playlist_songs(playlist, [song.google_file_id]):
                 return JsonResponse({'error': 'La canción ya está en esta playlist'}, status=400)
-            
-            # Get the highest order number and add 1
-            last_order = PlaylistSong.objects.filter(playlist=playlist).aggregate(
-                max_order=models.Max('order')
-            )['max_order'] or 0
-            
-            # Add song to end of playlist
-            PlaylistSong.objects.create(
-                playlist=playlist, 
-                song=song, 
-                order=last_order + 1
-            )
             return JsonResponse({'success': True})
         except Playlist.DoesNotExist:
             return JsonResponse({'error': 'Playlist no encontrada'}, status=404)
@@ -729,29 +1060,57 @@ def add_to_playlist(request, song_id, playlist_id):
             return JsonResponse({'error': 'Canción no encontrada'}, status=404)
     return JsonResponse({'error': 'Método no permitido'}, status=405)
 
+@login_required
+def add_songs_to_playlist(request, playlist_id):
+    """
+    Adds several songs to a playlist in one request, e.g. a whole album or the queue.
+    Songs already in the playlist are skipped; the rest go to the end in the order given.
+    """
+    if request.method == 'POST':
+        playlist = get_object_or_404(Playlist, id=playlist_id, user=request.user)
+        song_ids = request.POST.getlist('song_ids[]')
+        if not song_ids:
+            return JsonResponse({'error': 'No se indicaron pistas'}, status=400)
+        
+        added = append_playlist_songs(playlist, song_ids)
+        return JsonResponse({'success': True, 'added': added})
+    return JsonResponse({'error': 'Método no permitido'}, status=405)
+
 @login_required
 def reorder_playlist(request, playlist_id):
     """
     Reorders songs in a playlist based on new order array.
-    Updates the order field for all songs in the playlist.
+    Updates the order field of all posted songs in a single statement.
     """
     if request.method == 'POST':
         try:
             playlist = get_object_or_404(Playlist, id=playlist_id, user=request.user)
             song_orders = request.POST.getlist('song_orders[]')
             
-            # Update order for each song based on new position
-            for index, song_id in enumerate(song_orders):
-                PlaylistSong.objects.filter(
-                    playlist=playlist, 
-                    song__google_file_id=song_id
-                ).update(order=index + 1)
-            
+            reorder_playlist_songs(playlist, song_orders)
             return JsonResponse({'success': True})
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=400)
     return JsonResponse({'error': 'Método no permitido'}, status=405)
 
+@login_required
+def move_playlist_song(request, playlist_id):
+    """
+    Moves one song of a playlist to the position of another song.
+    Only the songs between both positions are renumbered.
+    """
+    if request.method == 'POST':
+        playlist = get_object_or_404(Playlist, id=playlist_id, user=request.user)
+        song_id = request.POST.get('song_id')
+        target_song_id = request.POST.get('target_song_id')
+        if not song_id or not target_song_id:
+            return JsonResponse({'error': 'Faltan las pistas a mover'}, status=400)
+        
+        if not move_playlist_entry(playlist, song_id, target_song_id):
+            return JsonResponse({'error': 'Canción no encontrada en la playlist'}, status=404)
+        return JsonResponse({'success': True})
+    return JsonResponse({'error': 'Método no permitido'}, status=405)
+
 @login_required
 def remove_from_playlist(request, playlist_id, song_id):
     """
@@ -761,16 +1120,10 @@ def remove_from_playlist(request, playlist_id, song_id):
     if request.method == 'POST':
         try:
             playlist = get_object_or_404(Playlist, id=playlist_id, user=request.user)
-            song = get_object_or_404(Song, google_file_id=song_id)
             
-            # Remove the song from playlist
-            PlaylistSong.objects.filter(playlist=playlist, song=song).delete()
-            
-            # Reorder remaining songs to maintain sequential numbering
-            remaining_songs = PlaylistSong.objects.filter(playlist=playlist).order_by('order')
-            for index, playlist_song in enumerate(remaining_songs):
-                playlist_song.order = index + 1
-                playlist_song.save()
+            # Remove the song and shift the songs after it up one place
+            if not remove_playlist_entry(playlist, song_id):
+                return JsonResponse({'error': 'Canción no encontrada en la playlist'}, status=404)
             
             return JsonResponse({'success': True})
         except Exception as e:
@@ -785,10 +1138,10 @@ def get_user_playlists(request):
     """
 
     try:
-        # Get playlists with song count annotation
-        playlists = Playlist.objects.filter(user=request.user).annotate(
-            song_count=models.Count('songs')
-        ).values('id', 'name', 'cover_image_url', 'song_count')
+        # Song counts are stored on the playlist, so no join is needed
+        playlists = Playlist.objects.filter(user=request.user).values(
+            'id', 'name', 'cover_image_url', 'song_count', 'total_duration'
+        )
         
         # Format playlist data for JSON response
         playlists_list = []
@@ -797,7 +1150,8 @@ def get_user_playlists(request):
                 'id': playlist['id'],
                 'name': playlist['name'],
                 'cover_image_url': playlist['cover_image_url'] or '',
-                'song_count': playlist['song_count']
+                'song_count': playlist['song_count'],
+                'total_duration': playlist['total_duration']
             })
         
         return JsonResponse({'playlists': playlists_list})
@@ -1,5 +1,7 @@
 // Global variables for music playback functionality
-let songQueue = [];  // Array to store queued songs for continuous playback
+// The playback queue itself lives on the server (/queue/)
+const PROGRESS_REPORT_INTERVAL_MS = 10000;  // How often playback position is sent to the server
+let lastProgressReport = 0;  // Time of the last position report
 let songMenuListenersInitialized = false;  // Flag to prevent duplicate event listener initialization
 
 
@@ -24,6 +26,78 @@ function playSong(songId, songName) {
 }
 
 
+/**
+ * Sends a POST request with the CSRF token and optional song IDs to a queue endpoint
+ * @param {string} url - Queue endpoint to call
+ * @param {string[]} songIds - Song IDs to send as song_ids[]
+ * @param {Object} fields - Extra form fields
+ * @returns {Promise<Object>} Decoded JSON response
+ */
+function postToQueue(url, songIds = [], fields = {}) {
+    const formData = new FormData();
+    formData.append('csrfmiddlewaretoken', getCsrfToken());
+    songIds.forEach(songId => formData.append('song_ids[]', songId));
+    Object.entries(fields).forEach(([name, value]) => formData.append(name, value));
+
+    return fetch(url, { method: 'POST', body: formData }).then(response => {
+        if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+        return response.json();
+    });
+}
+
+/**
+ * Adds songs to the end of the server-side playback queue
+ * @param {string[]} songIds - The IDs of the songs to queue
+ * @param {string} label - Display name shown in the confirmation toast
+ */
+function addToQueue(songIds, label) {
+    postToQueue('/queue/add/', songIds)
+        .then(() => {
+            const Toast = Swal.mixin({
+                toast: true, position: 'top-end', showConfirmButton: false, timer: 3500, timerProgressBar: true,
+                didOpen: (toast) => {
+                    toast.onmouseenter = Swal.stopTimer;
+                    toast.onmouseleave = Swal.resumeTimer;
+                }
+            });
+            Toast.fire({ icon: 'success', title: `'${label}' añadida a la cola` });
+        })
+        .catch(error => {
+            console.error('Error añadiendo a la cola:', error);
+            Swal.fire({ icon: 'error', title: 'Error', text: 'No se pudo añadir la pista a la cola' });
+        });
+}
+
+/**
+ * Fetches the songs waiting in the server-side playback queue
+ * @returns {Promise<Array>} Songs as {id, name}, in playback order
+ */
+function fetchQueue() {
+    return fetch('/queue/')
+        .then(response => {
+            if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+            return response.json();
+        })
+        .then(data => data.songs || []);
+}
+
+/**
+ * Reports the playback position so the server can warm the next queued song
+ * Throttled to one report every PROGRESS_REPORT_INTERVAL_MS
+ * @param {HTMLAudioElement} audioPlayer - The main audio player
+ */
+function reportPlaybackProgress(audioPlayer) {
+    const now = Date.now();
+    if (now - lastProgressReport < PROGRESS_REPORT_INTERVAL_MS || !isFinite(audioPlayer.duration)) return;
+    lastProgressReport = now;
+
+    postToQueue('/queue/progress/', [], {
+        position: audioPlayer.currentTime,
+        duration: audioPlayer.duration
+    }).catch(error => console.error('Error enviando progreso:', error));
+}
+
+
 /**
  * Initializes avatar upload functionality with file validation and preview
  * Handles image upload to Imgur service with user confirmation dialog
@@ -250,8 +324,8 @@ function initializeAccountButtonListener() {
 /**
  * Opens a modal dialog to select a playlist for adding a song
  * Fetches user's playlists and displays them in a selectable format
- * @param {string} songId - The ID of the song to add to playlist
- * @param {string} songName - The display name of the song
+ * @param {string|string[]} songId - The ID of the song to add, or the IDs of several songs
+ * @param {string} songName - The display name of the song, or a label for the songs
  */
 function openPlaylistModal(songId, songName) {
     console.log('Abriendo modal para pista:', songId, songName);
@@ -303,7 +377,7 @@ function openPlaylistModal(songId, songName) {
                 title: 'Añadir a playlist',
                 html: `
                     <div style="text-align: left;">
-                        <p style="margin-bottom: 15px; color: #e0e0e0; font-size: 1rem;">Selecciona una playlist para "${songName}":</p>
+                        <p style="margin-bottom: 15px; color: #e0e0e0; font-size: 1rem;">Selecciona una playlist para ${Array.isArray(songId) ? songName : `"${songName}"`}:</p>
                         <div style="max-height: 300px; overflow-y: auto; background-color: #1a1a1a; border-radius: 8px; padding: 10px;">
                             ${playlistOptions}
                         </div>
@@ -328,7 +402,11 @@ function openPlaylistModal(songId, songName) {
                             const playlistId = this.dataset.playlistId;
                             const playlistName = this.querySelector('div div').textContent;
                             
-                            addSongToPlaylist(songId, playlistId, songName, playlistName);
+                            if (Array.isArray(songId)) {
+                                addSongsToPlaylist(songId, playlistId, playlistName);
+                            } else {
+                                addSongToPlaylist(songId, playlistId, songName, playlistName);
+                            }
                             Swal.close();
                         });
                     });
@@ -392,6 +470,78 @@ function addSongToPlaylist(songId, playlistId, songName, playlistName) {
     });
 }
 
+/**
+ * Adds several songs to the specified playlist in a single request
+ * @param {string[]} songIds - The IDs of the songs to add, in order
+ * @param {string} playlistId - The ID of the target playlist
+ * @param {string} playlistName - The display name of the playlist
+ */
+function addSongsToPlaylist(songIds, playlistId, playlistName) {
+    const formData = new FormData();
+    formData.append('csrfmiddlewaretoken', getCsrfToken());
+    songIds.forEach(songId => formData.append('song_ids[]', songId));
+
+    fetch(`/add-songs-to-playlist/${playlistId}/`, {
+        method: 'POST',
+        body: formData
+    })
+    .then(response => {
+        if (!response.ok) throw new Error('Error al añadir a playlist');
+        return response.json();
+    })
+    .then(data => {
+        const Toast = Swal.mixin({ toast: true, position: 'top-end', showConfirmButton: false, timer: 3000, timerProgressBar: true });
+        Toast.fire({
+            icon: 'success',
+            title: data.added > 0
+                ? `${data.added} pista${data.added !== 1 ? 's' : ''} añadida${data.added !== 1 ? 's' : ''} a "${playlistName}"`
+                : `Las pistas ya estaban en "${playlistName}"`
+        });
+    })
+    .catch(error => {
+        console.error('Error:', error);
+        Swal.fire({
+            icon: 'error',
+            title: 'Error',
+            text: 'No se pudieron añadir las pistas a la playlist'
+        });
+    });
+}
+
+/**
+ * Likes several songs in a single request and marks their like buttons
+ * @param {string[]} songIds - The IDs of the songs to like
+ */
+function likeSongs(songIds) {
+    const formData = new FormData();
+    formData.append('csrfmiddlewaretoken', getCsrfToken());
+    songIds.forEach(songId => formData.append('song_ids[]', songId));
+
+    fetch('/like-songs/', {
+        method: 'POST',
+        body: formData
+    })
+    .then(response => {
+        if (!response.ok) throw new Error('Error al marcar Me Gusta');
+        return response.json();
+    })
+    .then(data => {
+        songIds.forEach(songId => {
+            document.querySelectorAll(`.like-btn[data-song-id="${CSS.escape(songId)}"]`)
+                .forEach(button => button.classList.add('liked'));
+        });
+        const Toast = Swal.mixin({ toast: true, position: 'top-end', showConfirmButton: false, timer: 3000, timerProgressBar: true });
+        Toast.fire({
+            icon: 'success',
+            title: `${data.liked} pista${data.liked !== 1 ? 's' : ''} añadida${data.liked !== 1 ? 's' : ''} a tus Me Gusta`
+        });
+    })
+    .catch(error => {
+        console.error('Error:', error);
+        Swal.fire({ icon: 'error', title: 'Error', text: 'No se pudieron marcar las pistas como Me Gusta' });
+    });
+}
+
 
 /**
  * Handles song like/unlike functionality with undo support
@@ -646,19 +796,25 @@ document.addEventListener('DOMContentLoaded', function() {
             if (songList) songList.classList.remove('playback-active');
         });
 
+        // Let the server prefetch the next queued song while this one plays
+        audioPlayer.addEventListener('timeupdate', () => reportPlaybackProgress(audioPlayer));
+
         // Auto-play next song when current song ends
         audioPlayer.addEventListener('ended', () => {
-            console.log('pista terminada. Cola actual:', songQueue.map(song => song.name));
-            if (songQueue.length > 0) {
-                const nextSong = songQueue.shift();
-                console.log('Reproduciendo siguiente:', nextSong.name);
-                playSong(nextSong.id, nextSong.name);
-            } else {
-                // No more songs in queue - reset UI
-                const songList = document.getElementById('song-list');
-                if (songList) songList.classList.remove('playbook-active');
-                nowPlayingElem.textContent = 'Selecciona una pista';
-            }
+            lastProgressReport = 0;
+            postToQueue('/queue/next/')
+                .then(data => {
+                    if (data.song) {
+                        console.log('Reproduciendo siguiente:', data.song.name);
+                        playSong(data.song.id, data.song.name);
+                    } else {
+                        // No more songs in queue - reset UI
+                        const songList = document.getElementById('song-list');
+                        if (songList) songList.classList.remove('playbook-active');
+                        nowPlayingElem.textContent = 'Selecciona una pista';
+                    }
+                })
+                .catch(error => console.error('Error obteniendo la siguiente pista:', error));
         });
     }
 
@@ -674,10 +830,12 @@ document.addEventListener('DOMContentLoaded', function() {
 
 /**
  * HTMX beforeRequest event handler
- * Shows loading spinner for non-scan button requests
+ * Shows loading spinner for non-scan button and non-search requests
  */
 document.body.addEventListener('htmx:beforeRequest', function(event) {
-    if (event.detail.elt.id !== 'scan-button' && event.detail.elt.id !== 'quick-scan-button' && event.detail.elt.id !== 'cover-scan-button') {
+    // Type-ahead search and further result pages load silently
+    if (event.detail.elt.id === 'search-input' || event.detail.elt.classList.contains('load-more')) return;
+    if (event.detail.elt.id !== 'scan-button' && event.detail.elt.id !== 'quick-scan-button' && event.detail.elt.id !== 'sync-scan-button' && event.detail.elt.id !== 'cover-scan-button' && event.detail.elt.id !== 'resume-scan-button') {
         Swal.fire({
             title: 'Cargando...',
             allowOutsideClick: false,
@@ -704,7 +862,7 @@ document.body.addEventListener('htmx:afterRequest', function(event) {
         if (!srcEl || !srcEl.id) return;
         
         // Handle scan button responses
-        const scanButtons = new Set(['scan-button', 'quick-scan-button', 'cover-scan-button']);
+        const scanButtons = new Set(['scan-button', 'quick-scan-button', 'sync-scan-button', 'cover-scan-button', 'resume-scan-button']);
         if (!scanButtons.has(srcEl.id)) return;
 
         const xhr = event?.detail?.xhr;
@@ -730,11 +888,14 @@ document.body.addEventListener('htmx:afterRequest', function(event) {
         const scanLabels = {
             'scan-button': 'Escaneo completo de librería',
             'quick-scan-button': 'Búsqueda rápida de nuevas pistas',
-            'cover-scan-button': 'Búsqueda de portadas'
+            'sync-scan-button': 'Sincronización de cambios',
+            'cover-scan-button': 'Búsqueda de portadas',
+            'resume-scan-button': 'Reanudación del escaneo'
         };
 
-        // Start monitoring the scan progress
-        showScanProgress(taskId, scanLabels[srcEl.id] || 'Proceso en ejecución');
+        // Start monitoring the scan progress; a repeated request follows the scan already running
+        const label = scanLabels[srcEl.id] || 'Proceso en ejecución';
+        showScanProgress(taskId, data.already_running ? `${label} (ya en curso)` : label);
     } catch (e) {
         console.error('Error gestionando progreso de escaneo:', e);
     }
@@ -744,11 +905,11 @@ document.body.addEventListener('htmx:afterRequest', function(event) {
  * Debug function to show current song queue
  */
 window.showQueue = function() {
-    console.log('Cola actual:', songQueue.map(song => song.name));
+    fetchQueue().then(songs => console.log('Cola actual:', songs.map(song => song.name)));
 };
 
 /**
- * Shows scan progress modal and starts polling for task status
+ * Shows scan progress modal and starts following the task status
  * @param {string} taskId - The Celery task ID to monitor
  * @param {string} title - The title to display in the progress modal
  */
@@ -759,7 +920,7 @@ function showScanProgress(taskId, title) {
         allowOutsideClick: false,
         showConfirmButton: false,
         didOpen: () => {
-            pollTaskUntilDone(taskId, title);
+            watchTaskUntilDone(taskId, title);
         }
     });
 }
@@ -781,11 +942,15 @@ function renderScanHtml(payload) {
         const current = info.current;
         const total = info.total;
 
-        lines.push(formatStep(step, current, total));
+        lines.push(formatStep(step, current, total, info));
+        
+        // Scans split by top-level folder measure their progress in folders done
+        const barCurrent = typeof info.folders_total === 'number' ? info.folders_done : current;
+        const barTotal = typeof info.folders_total === 'number' ? info.folders_total : total;
         
         // Show progress bar if we have current/total numbers
-        if (typeof current === 'number' && typeof total === 'number' && total > 0) {
-            const pct = Math.max(0, Math.min(100, Math.round((current / total) * 100)));
+        if (typeof barCurrent === 'number' && typeof barTotal === 'number' && barTotal > 0) {
+            const pct = Math.max(0, Math.min(100, Math.round((barCurrent / barTotal) * 100)));
             lines.push(`<div style="margin:8px auto 0; height:8px; width:80%; background:#333; border-radius:4px; overflow:hidden;">
                 <div style="height:100%; width:${pct}%; background:#bb86fc;"></div>
             </div>`);
@@ -827,16 +992,23 @@ function renderScanHtml(payload) {
  * @param {string} step - The current step identifier
  * @param {number} current - Current progress count
  * @param {number} total - Total items to process
+ * @param {Object} info - Full progress payload, for folder counts
  * @returns {string} Formatted step message
  */
-function formatStep(step, current, total) {
+function formatStep(step, current, total, info = {}) {
+    const folders = typeof info.folders_total === 'number'
+        ? `, carpetas: ${info.folders_done || 0} de ${info.folders_total}`
+        : '';
     // Map of step identifiers to user-friendly messages
     const map = {
         searching_audio_files: 'Buscando archivos de audio en tu Drive...',
-        processing_audio_files: (c) => `Procesando archivos de audio${typeof c === 'number' ? ` (procesados: ${c})` : ''}...`,
+        processing_audio_files: (c) => `Procesando archivos de audio${typeof c === 'number' ? ` (procesados: ${c}${folders})` : ''}...`,
+        processing_new_files: (c) => `Buscando nuevas pistas${typeof c === 'number' ? ` (revisadas: ${c}${folders})` : ''}...`,
         getting_existing_files: 'Consultando pistas existentes...',
         searching_new_files: 'Buscando nuevas pistas...',
         getting_existing_albums: 'Buscando álbumes sin portada...',
+        syncing_changes: (c) => `Aplicando cambios de tu Drive${typeof c === 'number' ? ` (procesados: ${c})` : ''}...`,
+        saving_folders: 'Guardando estructura de carpetas...',
         covers: (c, t) => `Buscando portadas${typeof c === 'number' && typeof t === 'number' ? ` (${c} de ${t})` : ''}...`,
         queued: 'En cola...'
     };
@@ -848,6 +1020,86 @@ function formatStep(step, current, total) {
     return step ? `Procesando: ${step} ${typeof current === 'number' && typeof total === 'number' ? `(${current}/${total})` : ''}` : 'Procesando...';
 }
 
+/**
+ * Updates the progress modal with a task status payload
+ * @param {Object} data - Task status payload with status and info
+ * @param {string} title - The title for the progress modal
+ * @returns {boolean} True if the task has finished
+ */
+function applyTaskUpdate(data, title) {
+    const status = data?.status;
+    const info = data?.info;
+
+    if (status === 'SUCCESS') {
+        // Task completed successfully
+        Swal.update({
+            title: title,
+            html: renderScanHtml({ status, info }),
+            showConfirmButton: true,
+            confirmButtonText: 'Ir a inicio',
+            confirmButtonColor: '#bb86fc',
+            showCancelButton: false,
+            allowOutsideClick: true,
+            icon: 'success'
+        });
+        // Navigate to home page when user clicks confirm
+        Swal.getConfirmButton()?.addEventListener('click', () => {
+            window.location.href = 'http://localhost:8000/';
+        });
+        return true;
+    }
+    if (status === 'FAILURE' || status === 'REVOKED') {
+        // Task failed
+        Swal.update({
+            title: 'Error en el proceso',
+            html: renderScanHtml({ status: 'FAILURE', info }),
+            showConfirmButton: true,
+            confirmButtonText: 'Cerrar',
+            confirmButtonColor: '#d33',
+            icon: 'error'
+        });
+        return true;
+    }
+
+    // Task still in progress - update display
+    Swal.update({
+        title: title,
+        html: renderScanHtml({ status: status || 'PROGRESS', info })
+    });
+    return false;
+}
+
+/**
+ * Follows task progress pushed by the server until completion
+ * Uses the /task-events/ stream, and falls back to polling when the
+ * browser has no EventSource or the stream cannot be opened
+ * @param {string} taskId - The Celery task ID to monitor
+ * @param {string} title - The title for the progress modal
+ */
+function watchTaskUntilDone(taskId, title) {
+    if (!window.EventSource) {
+        pollTaskUntilDone(taskId, title);
+        return;
+    }
+
+    const source = new EventSource(`/task-events/${taskId}/`);
+    let received = false;
+
+    source.onmessage = (event) => {
+        received = true;
+        let data = null;
+        try { data = JSON.parse(event.data); } catch (_) { return; }
+        if (applyTaskUpdate(data, title)) source.close();
+    };
+
+    source.onerror = () => {
+        // The browser reconnects on its own once the stream was working
+        if (received && source.readyState !== EventSource.CLOSED) return;
+        source.close();
+        pollTaskUntilDone(taskId, title);
+    };
+}
+
 /**
  * Polls task status until completion and updates the progress modal
  * @param {string} taskId - The Celery task ID to monitor
@@ -855,54 +1107,17 @@ function formatStep(step, current, total) {
  */
 function pollTaskUntilDone(taskId, title) {
     let stopped = false;
-    const controller = new AbortController();
 
     const tick = () => {
         if (stopped) return;
         
         // Fetch current task status
-        fetch(`/task-status/${taskId}/`, { signal: controller.signal })
+        fetch(`/task-status/${taskId}/`)
             .then(r => r.json())
             .then(data => {
-                const status = data?.status;
-                const info = data?.info;
-
-                if (status === 'SUCCESS') {
-                    // Task completed successfully
-                    Swal.update({
-                        title: title,
-                        html: renderScanHtml({ status, info }),
-                        showConfirmButton: true,
-                        confirmButtonText: 'Ir a inicio',
-                        confirmButtonColor: '#bb86fc',
-                        showCancelButton: false,
-                        allowOutsideClick: true,
-                        icon: 'success'
-                    });
-                    stopped = true;
-                    // Navigate to home page when user clicks confirm
-                    Swal.getConfirmButton()?.addEventListener('click', () => {
-                        window.location.href = 'http://localhost:8000/';
-                    });
-                } else if (status === 'FAILURE') {
-                    // Task failed
-                    Swal.update({
-                        title: 'Error en el proceso',
-                        html: renderScanHtml({ status, info }),
-                        showConfirmButton: true,
-                        confirmButtonText: 'Cerrar',
-                        confirmButtonColor: '#d33',
-                        icon: 'error'
-                    });
-                    stopped = true;
-                } else {
-                    // Task still in progress - update display and poll again
-                    Swal.update({
-                        title: title,
-                        html: renderScanHtml({ status: status || 'PROGRESS', info })
-                    });
-                    setTimeout(tick, 2000);
-                }
+                stopped = applyTaskUpdate(data, title);
+                // Task still in progress - poll again
+                if (!stopped) setTimeout(tick, 2000);
             })
             .catch(err => {
                 console.error('Error consultando estado de tarea:', err);
@@ -27,22 +27,29 @@ async function initializePlaylistSorting() {
         ghostClass: 'sortable-ghost', // Class for drag preview
         chosenClass: 'sortable-chosen', // Class for selected item
         dragClass: 'sortable-drag',     // Class while dragging
-        onEnd: function() {
-            // Save new order to server when drag ends
+        draggable: '.sortable-song-item', // The "load more" row stays in place
+        onEnd: function(evt) {
+            if (evt.oldIndex === evt.newIndex) return;
+
+            // Save the move to the server when drag ends: the dragged song takes
+            // the place of the song it was dropped next to
             const playlistId = sortableList.dataset.playlistId;
-            const songOrders = Array.from(sortableList.children).map(li => li.dataset.songId);
+            const songItem = evt.item;
+            const targetItem = evt.newIndex > evt.oldIndex ? songItem.previousElementSibling : songItem.nextElementSibling;
+            if (!targetItem || !targetItem.classList.contains('sortable-song-item')) return;
 
             // Show saving notification
             const Toast = Swal.mixin({ toast: true, position: 'top-end', showConfirmButton: false, timer: 2000, timerProgressBar: true });
             Toast.fire({ icon: 'info', title: 'Guardando nuevo orden...' });
 
-            // Prepare form data with new order
+            // Prepare form data with the moved song and its new position
             const formData = new FormData();
             formData.append('csrfmiddlewaretoken', getCsrfToken());
-            songOrders.forEach(songId => formData.append('song_orders[]', songId));
+            formData.append('song_id', songItem.dataset.songId);
+            formData.append('target_song_id', targetItem.dataset.songId);
 
-            // Send new order to server
-            fetch(`/reorder-playlist/${playlistId}/`, { method: 'POST', body: formData })
+            // Send the move to server
+            fetch(`/move-playlist-song/${playlistId}/`, { method: 'POST', body: formData })
                 .then((r) => {
                     if (r.ok) {
                         Toast.fire({ icon: 'success', title: 'Orden actualizado' });
@@ -99,10 +106,10 @@ function handleRemoveFromPlaylist(buttonEl) {
                 songItem.style.transform = 'translateX(-20px)';
                 setTimeout(() => {
                     songItem.remove();
-                    // Update song count in header
+                    // Update song count in header; only part of the playlist may be loaded
                     const countElement = document.querySelector('h2');
                     if (countElement) {
-                        const currentCount = document.querySelectorAll('.sortable-song-item').length;
+                        const currentCount = Math.max((parseInt(countElement.textContent, 10) || 1) - 1, 0);
                         countElement.textContent = `${currentCount} pistas`;
                     }
                     // Show success notification
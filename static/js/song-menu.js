@@ -79,6 +79,39 @@ function initializeSongMenuListeners() {
             openPlaylistModal(songId, songName);
         }
 
+        // Handle whole-album and queue actions, sent to the server in one request each
+        const albumPlaylistButton = event.target.closest('#album-add-to-playlist-btn');
+        if (albumPlaylistButton) {
+            event.stopPropagation();
+            const songIds = Array.from(document.querySelectorAll('#song-list li[data-song-id]')).map(li => li.dataset.songId);
+            if (songIds.length) openPlaylistModal(songIds, `el álbum "${albumPlaylistButton.dataset.albumName}"`);
+            return;
+        }
+
+        const albumLikeButton = event.target.closest('#album-like-all-btn');
+        if (albumLikeButton) {
+            event.stopPropagation();
+            const songIds = Array.from(document.querySelectorAll('#song-list li[data-song-id]')).map(li => li.dataset.songId);
+            if (songIds.length) likeSongs(songIds);
+            return;
+        }
+
+        const queuePlaylistButton = event.target.closest('#queue-to-playlist-btn');
+        if (queuePlaylistButton) {
+            event.stopPropagation();
+            fetchQueue()
+                .then(songs => {
+                    if (songs.length) {
+                        openPlaylistModal(songs.map(song => song.id), 'la cola');
+                    } else {
+                        const Toast = Swal.mixin({ toast: true, position: 'top-end', showConfirmButton: false, timer: 2500 });
+                        Toast.fire({ icon: 'info', title: 'La cola está vacía' });
+                    }
+                })
+                .catch(error => console.error('Error obteniendo la cola:', error));
+            return;
+        }
+
         // Handle add to queue button clicks
         const queueButton = event.target.closest('.queue-add-btn');
         if (queueButton) {
@@ -86,18 +119,9 @@ function initializeSongMenuListeners() {
             const songId = queueButton.dataset.songId;
             const songName = queueButton.dataset.songName;
 
-            // Add song to the global queue and show confirmation toast
+            // Add song to the server-side queue and show confirmation toast
             if (songId && songName) {
-                window.songQueue.push({ id: songId, name: songName });
-
-                const Toast = Swal.mixin({
-                    toast: true, position: 'top-end', showConfirmButton: false, timer: 3500, timerProgressBar: true,
-                    didOpen: (toast) => {
-                        toast.onmouseenter = Swal.stopTimer;
-                        toast.onmouseleave = Swal.resumeTimer;
-                    }
-                });
-                Toast.fire({ icon: 'success', title: `'${songName}' añadida a la cola` });
+                addToQueue([songId], songName);
             }
             return;
         }